@@ -0,0 +1,410 @@
+"""Admin console for the hosted game: inspect and change live sessions.
+
+The debug menu in main.py is a blocking input() loop that only edits the
+player's own game.  A hosted server instead listens for admins on a local
+Unix socket (`server.py --admin-socket`), served by the same asyncio loop as
+the players.  Each admin command is one line and gets one line of JSON back.
+Commands that touch many sessions work through them in batches of
+ADMIN_BATCH and let players' turns run in between, so an edit across
+thousands of sessions never stalls a game.  Hibernated sessions are read, and
+written back, in the save store without being brought into memory.
+
+Commands (SELECTOR is `all`, session ids separated by commas, `at=<location>`,
+`has=<item>`, `ip=<address>` or `idle><seconds>`):
+
+    list [SELECTOR]                  sessions with location, money, turns and turn latency
+    show ID                          one session's full state
+    set SELECTOR ITEM VALUE          set an inventory item (VALUE is JSON, e.g. 100 or true; `-` removes it)
+    move SELECTOR LOCATION           move players to a location
+    sweet SELECTOR on|off            toggle sweet+ mode (not for restricted sessions)
+    say SELECTOR MESSAGE...          show a message to players
+    kick SELECTOR                    disconnect players
+    latency [SELECTOR]               turn latency across sessions, with the slowest ones
+    fork ID BRANCH...                play what-if branches ("cmd1; cmd2") on copies of a session and compare them
+    stats                            the server's summary line
+
+Sessions in the middle of a prompt (the debug menu, Alex's questions) are
+skipped by set, move and sweet, since their turn is replayed when it finishes.
+
+With server.py --workers or supervisor.py, worker or shard i listens on
+<socket>.<i>; the client sends each command to all of them.
+
+Usage:
+    python server.py --admin-socket /tmp/cn_tower_admin.sock
+    python admin.py list at=glass_floor
+    python admin.py set all money 500
+    python admin.py fork 3-9f1c "tell truth" "bribe" "lie"
+    python admin.py                  (interactive)
+"""
+
+import argparse  # Used for the command-line options
+import asyncio  # Used for serving admins on the game's event loop
+import glob  # Used for finding every worker's socket
+import inspect  # Used for checking a command's arguments before running it
+import json  # Used for command results
+import os  # Used for the socket file
+import shlex  # Used for splitting admin commands
+import socket  # Used for the client side of the socket
+import statistics  # Used for turn latency medians
+import tempfile  # Used for the default socket path
+import time  # Used for idle times
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "cn_tower_admin.sock")
+ADMIN_BATCH = 200  # Sessions handled between yields to the players' turns
+SLOWEST = 10  # Sessions listed by `latency`
+
+
+class AdminError(Exception):
+    """A command the console can't run; its message is sent back to the admin."""
+
+
+def worker_socket(path, index):
+    """Returns the admin socket path of worker or shard `index` (None if there is no admin socket)."""
+    return f"{path}.{index}" if path is not None else None
+
+
+def _milliseconds(times):
+    return round(statistics.median(times) * 1000, 3) if times else None
+
+
+def _p99(times):
+    return round(sorted(times)[min(len(times) - 1, int(0.99 * len(times)))] * 1000, 3) if times else None
+
+
+class AdminConsole:
+    """Serves admin commands for one GameServer on a Unix socket.
+
+    Args:
+        server (GameServer): The server whose sessions are managed.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.path = None
+        self._listener = None
+        self._inode = None
+
+    async def start(self, path):
+        """Starts listening on `path` (readable by this user only) and returns self."""
+        if os.path.exists(path):
+            os.remove(path)  # Left behind by a server that didn't shut down cleanly
+        umask = os.umask(0o177)  # The socket is created 0600, with no moment when others could connect
+        try:
+            self._listener = await asyncio.start_unix_server(self._handle, path)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self._inode = os.stat(path).st_ino
+        return self
+
+    def close(self):
+        """Stops accepting admins and removes the socket file."""
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                if os.stat(self.path).st_ino == self._inode:  # Not yet taken over by a replacement worker
+                    os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    result = {"ok": True, **await self.run(line.decode("utf-8", "replace").strip())}
+                except AdminError as e:
+                    result = {"ok": False, "error": str(e)}
+                except Exception as e:  # Keep the console (and the game) running whatever happens
+                    result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(result).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # --- selecting sessions ---------------------------------------------------
+
+    def _matches(self, session_id, selector):
+        connection = self.server.connections.get(session_id)
+        key, _, value = selector.partition("=")
+        if selector == "all":
+            return True
+        if key == "ip":
+            return connection is not None and connection.ip == value
+        if selector.startswith("idle>"):
+            return connection is not None and time.monotonic() - connection.last_turn > float(selector[5:])
+        if key in ("at", "has"):
+            game = self.server.store.peek(session_id)
+            return game.location == value if key == "at" else value in game.inventory
+        raise AdminError(f"Unknown selector {selector!r}.")
+
+    async def select(self, selector):
+        """Returns the ids of the sessions a selector picks."""
+        store = self.server.store
+        if selector not in ("all",) and "=" not in selector and not selector.startswith("idle>"):
+            ids = [session_id for session_id in selector.split(",") if session_id]
+            unknown = [session_id for session_id in ids if session_id not in store]
+            if unknown:
+                raise AdminError(f"No such session: {', '.join(unknown)}.")
+            return ids
+        chosen = []
+        for i, session_id in enumerate(store.ids()):
+            if session_id in store and self._matches(session_id, selector):
+                chosen.append(session_id)
+            if i % ADMIN_BATCH == ADMIN_BATCH - 1:
+                await asyncio.sleep(0)
+        return chosen
+
+    async def _each(self, ids, change):
+        """Applies change(game, session_id) to each session in batches; returns (changed, skipped) counts."""
+        changed = skipped = 0
+        for i, session_id in enumerate(ids):
+            if session_id in self.server.store:
+                with self.server.store.edit(session_id) as game:
+                    if game.awaiting_input or game.finished:
+                        skipped += 1
+                    elif change(game, session_id) is not False:
+                        changed += 1
+                    else:
+                        skipped += 1
+            if i % ADMIN_BATCH == ADMIN_BATCH - 1:
+                await asyncio.sleep(0)  # Players' turns run here
+        return changed, skipped
+
+    # --- commands -------------------------------------------------------------
+
+    def _row(self, session_id):
+        store = self.server.store
+        game = store.peek(session_id)
+        connection = self.server.connections.get(session_id)
+        times = list(connection.turn_times) if connection is not None else []
+        return {
+            "id": session_id,
+            "ip": connection.ip if connection is not None else None,
+            "connected": round(connection.connected) if connection is not None else None,
+            "location": game.location,
+            "money": game.inventory.get("money", 0),
+            "turns": game.turns,
+            "sweet_mode": game.sweet_mode,
+            "hibernated": store.is_hibernated(session_id),
+            "in_prompt": game.awaiting_input,
+            "idle_s": round(time.monotonic() - connection.last_turn, 1) if connection is not None else None,
+            "turn_p50_ms": _milliseconds(times),
+            "turn_p99_ms": _p99(times),
+        }
+
+    async def run(self, line):
+        """Runs one admin command and returns its result (a dict).
+
+        Raises:
+            AdminError: If the command is unknown or malformed.
+        """
+        try:
+            words = shlex.split(line)
+        except ValueError as e:
+            raise AdminError(str(e)) from None
+        if not words:
+            raise AdminError("Empty command. Try 'help'.")
+        command, args = words[0].lower(), words[1:]
+        handler = getattr(self, "cmd_" + command, None)
+        if handler is None:
+            raise AdminError(f"Unknown command {command!r}. Try 'help'.")
+        try:
+            inspect.signature(handler).bind(*args)
+        except TypeError:
+            raise AdminError(f"Wrong arguments for {command!r}. Try 'help'.") from None
+        return await handler(*args)
+
+    async def cmd_help(self):
+        return {"help": "Commands (" + __doc__.split("Commands (", 1)[1].split("Sessions in the middle", 1)[0].strip()}
+
+    async def cmd_list(self, selector="all"):
+        rows = []
+        for i, session_id in enumerate(await self.select(selector)):
+            rows.append(self._row(session_id))
+            if i % ADMIN_BATCH == ADMIN_BATCH - 1:
+                await asyncio.sleep(0)
+        return {"sessions": rows}
+
+    async def cmd_show(self, session_id):
+        (session_id,) = await self.select(session_id)
+        game = self.server.store.peek(session_id)
+        return {"session": self._row(session_id), "state": game.state(),
+                "saves": self.server.store.saves.slots(session_id)}
+
+    async def cmd_set(self, selector, item, value):
+        if value == "-":
+            if item == "money":
+                raise AdminError("Money can't be removed; set it to 0 instead.")
+            change = lambda game, _: game.inventory.pop(item, None) is not None or False
+        else:
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                raise AdminError(f"VALUE must be JSON (e.g. 100, true or '\"text\"'), not {value!r}.") from None
+            if item == "money" and (isinstance(parsed, bool) or not isinstance(parsed, int)):
+                raise AdminError("Money must be a whole number.")
+            change = lambda game, _: game.inventory.__setitem__(item, parsed)
+        changed, skipped = await self._each(await self.select(selector), change)
+        return {"changed": changed, "skipped": skipped}
+
+    async def cmd_move(self, selector, location):
+        import headless
+
+        if location not in headless.display_locations():
+            raise AdminError(f"Unknown location {location!r}.")
+        changed, skipped = await self._each(await self.select(selector),
+                                            lambda game, _: setattr(game, "location", location))
+        return {"changed": changed, "skipped": skipped}
+
+    async def cmd_sweet(self, selector, state):
+        if state not in ("on", "off"):
+            raise AdminError("Use 'on' or 'off'.")
+
+        def toggle(game, _):
+            if game.is_restricted and state == "on":
+                return False  # Sweet+ is unavailable in restricted countries
+            game.sweet_mode = state == "on"
+
+        changed, skipped = await self._each(await self.select(selector), toggle)
+        return {"changed": changed, "skipped": skipped}
+
+    async def cmd_say(self, selector, *message):
+        if not message:
+            raise AdminError("Nothing to say.")
+        frame = ("\r\n*** " + " ".join(message) + " ***\r\n").encode("utf-8")  # Encoded once for everybody
+        sent = 0
+        for i, session_id in enumerate(await self.select(selector)):
+            connection = self.server.connections.get(session_id)
+            if connection is not None and not connection.writer.transport.is_closing():
+                connection.writer.write(frame)
+                sent += 1
+            if i % ADMIN_BATCH == ADMIN_BATCH - 1:
+                await asyncio.sleep(0)
+        return {"sent": sent}
+
+    async def cmd_kick(self, selector):
+        kicked = 0
+        for session_id in await self.select(selector):
+            connection = self.server.connections.get(session_id)
+            if connection is not None:
+                connection.writer.close()  # The session ends as if the player had left
+                kicked += 1
+        return {"kicked": kicked}
+
+    async def cmd_latency(self, selector="all"):
+        per_session = []
+        every_turn = []
+        for session_id in await self.select(selector):
+            connection = self.server.connections.get(session_id)
+            if connection is not None and connection.turn_times:
+                times = list(connection.turn_times)
+                every_turn.extend(times)
+                per_session.append({"id": session_id, "turns": len(times), "turn_p50_ms": _milliseconds(times),
+                                    "turn_p99_ms": _p99(times)})
+        per_session.sort(key=lambda row: -row["turn_p99_ms"])
+        return {"sessions": len(per_session), "turn_p50_ms": _milliseconds(every_turn),
+                "turn_p99_ms": _p99(every_turn), "slowest": per_session[:SLOWEST]}
+
+    async def cmd_fork(self, session_id, *branch_lines):
+        if not branch_lines:
+            raise AdminError('Give the branches to try, e.g. fork ID "tell truth" "bribe".')
+        import branches
+
+        (session_id,) = await self.select(session_id)
+        game = self.server.store.peek(session_id)
+        results = []
+        for lines in branch_lines:
+            results.append(branches.play(game, branches.split_branch(lines)))  # The session itself is untouched
+            await asyncio.sleep(0)  # Players' turns run between branches
+        results = branches.differences(results)
+        return {"branches": results, "report": branches.report(results)}
+
+    async def cmd_stats(self):
+        return {"summary": self.server.summary()}
+
+
+# --- client -------------------------------------------------------------------
+
+def sockets(path):
+    """Returns the admin sockets for a path: the path itself, or every worker's <path>.<i>."""
+    found = [path] if os.path.exists(path) else []
+    found += sorted(glob.glob(glob.escape(path) + ".*"), key=lambda name: name.rsplit(".", 1)[-1].zfill(6))
+    return found
+
+
+def send(path, line):
+    """Sends one command to one admin socket and returns the parsed reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(line.encode("utf-8") + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+
+def show(reply, label=""):
+    """Prints a reply readably."""
+    prefix = f"[{label}] " if label else ""
+    if not reply.get("ok"):
+        print(f"{prefix}error: {reply.get('error')}")
+    elif "help" in reply:
+        print(reply["help"])
+    elif "summary" in reply:
+        print(prefix + reply["summary"])
+    elif "report" in reply:
+        print(prefix + reply["report"])
+    elif "sessions" in reply and isinstance(reply["sessions"], list):
+        print(f"{prefix}{len(reply['sessions'])} sessions")
+        for row in reply["sessions"]:
+            flags = ("cold " if row["hibernated"] else "") + ("prompt " if row["in_prompt"] else "")
+            flags += "sweet+" if row["sweet_mode"] else ""
+            print(f"  {row['id']:<36} {row['location']:<24} ${row['money']:<6} {row['turns']:>5} turns  "
+                  f"p50 {row['turn_p50_ms'] or '-'} ms  p99 {row['turn_p99_ms'] or '-'} ms  "
+                  f"{row['ip'] or '-'}  {flags}")
+    else:
+        reply = {key: value for key, value in reply.items() if key != "ok"}
+        print(prefix + json.dumps(reply, indent=2))
+
+
+def run_command(path, line):
+    """Sends a command to every worker's socket and prints the replies."""
+    targets = sockets(path)
+    if not targets:
+        print(f"No admin socket at {path} (start the server with --admin-socket {path}).")
+        return False
+    if line.split()[0].lower() == "help":
+        targets = targets[:1]  # Every worker has the same commands
+    for target in targets:
+        label = os.path.basename(target) if len(targets) > 1 else ""
+        try:
+            show(send(target, line), label)
+        except OSError as e:  # A worker that has exited (or is still starting)
+            show({"ok": False, "error": f"not answering ({e.strerror or e})"}, label)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Admin console for the hosted CN Tower game.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"the server's admin socket (default: {DEFAULT_SOCKET})")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="command to run (default: interactive)")
+    options = parser.parse_args()
+    if options.command:
+        raise SystemExit(0 if run_command(options.socket, shlex.join(options.command)) else 1)
+    print("CN Tower admin console. Type 'help' for commands, Ctrl+D to leave.")
+    while True:
+        try:
+            line = input("admin> ").strip()
+        except EOFError:
+            break
+        if line:
+            run_command(options.socket, line)
@@ -0,0 +1,382 @@
+"""HTTP JSON API for the CN Tower game.
+
+Web and mobile clients play over plain HTTP instead of a terminal.  Every
+session is a HeadlessGame, so the text returned is exactly what
+display_location/process_command print for a console player.  The server is
+stdlib only (http.server), speaks HTTP/1.1 with keep-alive, and shares the
+SessionStore of server.py, so idle sessions are hibernated to disk.
+
+Endpoints (request and response bodies are JSON):
+    POST   /sessions                {"age": 20, "sweet_mode": false}
+           -> 201 {"session": id, "text": ..., "state": {...}}
+    GET    /sessions/<id>           -> {"session": id, "state": {...}}
+    POST   /sessions/<id>/command   {"command": "go north"}
+           -> {"text": ..., "state": {...}}
+    POST   /sessions/<id>/batch     {"commands": ["go east", "buy souvenir"]}
+           -> {"results": [{"command": ..., "text": ..., "state": {...}}, ...], "state": {...}}
+    DELETE /sessions/<id>           -> 204
+    GET    /health                  -> {"status": "ok", "sessions": n}
+
+While state.awaiting_input is true the game is inside an input() prompt (the
+debug menu, Alex's support options) and the next command answers it.
+Errors come back as {"error": message} with a 4xx/5xx status.
+
+Usage:
+    python api.py --port 8080
+    curl -X POST localhost:8080/sessions -d '{"age": 20}'
+    python api.py --benchmark --clients 8 --seconds 5
+"""
+
+import argparse  # Used for the command-line options
+import http.client  # Used by the benchmark client
+import http.server  # Used for the HTTP server itself
+import json  # Used for request and response bodies
+import re  # Used for routing request paths
+import threading  # Used for the session lock, the sweeper and the benchmark clients
+import time  # Used for the hibernation sweep and benchmark timings
+import traceback  # Used for logging game errors without killing the server
+
+import main
+from server import DEFAULT_HIBERNATE_DIR, MIN_AGE, GameContent, SessionStore, percentile
+
+DEFAULT_PORT = 8080
+MAX_BODY = 64 * 1024  # Largest request body accepted, in bytes
+MAX_BATCH = 100  # Most commands one batch request may run
+SESSION_PATH = re.compile(r"^/sessions/([0-9a-f]{32})(?:/(command|batch))?$")
+
+
+class ApiError(Exception):
+    """An error reported to the client as {"error": message} with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GameApi:
+    """The game operations behind the HTTP endpoints, independent of HTTP.
+
+    The SessionStore is not thread-safe, so every operation holds one lock; the
+    turns themselves are serialised by HeadlessGame anyway.
+
+    Args:
+        content (GameContent): The shared content.
+        store (SessionStore, optional): Where sessions are kept. Defaults to an in-memory-first store.
+    """
+
+    def __init__(self, content, store=None):
+        self.content = content
+        self.store = store if store is not None else SessionStore(content)
+        self.lock = threading.Lock()
+        self.turns = 0
+
+    def _game(self, session_id):
+        try:
+            return self.store.get(session_id)
+        except KeyError:
+            raise ApiError(404, "No such session.") from None
+
+    def create(self, age, sweet_mode=False, ip=None):
+        """Starts a session for a player of the given age.
+
+        Args:
+            age (int): The player's age.
+            sweet_mode (bool, optional): Turn sweet mode on, where it's allowed. Defaults to False.
+            ip (str, optional): The player's address, for the country check. Defaults to None.
+
+        Returns:
+            dict: The session id, the welcome text and the state.
+        """
+        if isinstance(age, bool) or not isinstance(age, int):
+            raise ApiError(400, "age must be a whole number.")
+        if age < MIN_AGE:
+            raise ApiError(403, f"Sorry, you must be {MIN_AGE} or older to play this game.")
+        game = self.content.new_game(ip)
+        game.sweet_mode = bool(sweet_mode) and not game.is_restricted
+        text = game.start()
+        with self.lock:
+            session_id = self.store.add(game)
+        return {"session": session_id, "text": text, "state": game.state()}
+
+    def state(self, session_id):
+        """Returns a session's state without playing a turn."""
+        with self.lock:
+            return {"session": session_id, "state": self._game(session_id).state()}
+
+    def _send(self, game, command):
+        if not isinstance(command, str):
+            raise ApiError(400, "commands must be strings.")
+        if game.finished:
+            raise ApiError(409, "This game has ended. Start a new session.")
+        text = game.send(command)
+        self.turns += 1
+        return text
+
+    def command(self, session_id, command):
+        """Plays one command (or answers the prompt the game is waiting on).
+
+        Returns:
+            dict: The text printed and the new state.
+        """
+        with self.lock:
+            game = self._game(session_id)
+            text = self._send(game, command)
+            return {"text": text, "state": game.state()}
+
+    def batch(self, session_id, commands):
+        """Plays several commands in order, stopping early if the game ends.
+
+        Returns:
+            dict: Per-command text and state, and the final state.
+        """
+        if not isinstance(commands, list) or not commands:
+            raise ApiError(400, "commands must be a non-empty list.")
+        if len(commands) > MAX_BATCH:
+            raise ApiError(413, f"At most {MAX_BATCH} commands per batch.")
+        results = []
+        with self.lock:
+            game = self._game(session_id)
+            for command in commands:
+                if game.finished:
+                    break
+                text = self._send(game, command)
+                results.append({"command": command, "text": text, "state": game.state()})
+            return {"results": results, "state": game.state()}
+
+    def delete(self, session_id):
+        """Ends a session."""
+        with self.lock:
+            if session_id not in self.store:
+                raise ApiError(404, "No such session.")
+            self.store.discard(session_id)
+
+    def health(self):
+        with self.lock:
+            return {"status": "ok", "sessions": len(self.store), "turns": self.turns,
+                    "render_cache": main.display_location.stats()}
+
+    def sweep_forever(self):
+        """Hibernates idle sessions now and then (run in a daemon thread)."""
+        interval = max(0.5, min(self.store.idle_timeout / 4, 30))
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                self.store.hibernate_idle()
+
+
+class ApiHandler(http.server.BaseHTTPRequestHandler):
+    """Maps HTTP requests onto a GameApi (set as the `api` attribute of the server)."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive: clients can reuse one connection for a whole game
+    disable_nagle_algorithm = True  # Headers and body are written separately; don't let them wait on ACKs
+    server_version = "CNTowerAPI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _body(self):
+        length = self._unread
+        if length > MAX_BODY:
+            raise ApiError(413, "Request body too large.")
+        if not length:
+            return {}
+        self._unread = 0
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Body must be JSON.") from None
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object.")
+        return data
+
+    def _reply(self, status, data=None):
+        body = b"" if data is None else json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        if data is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        api = self.server.api
+        self._unread = 0  # Body bytes still on the stream
+        try:
+            self._unread = int(self.headers.get("Content-Length") or 0)
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/health" and method == "GET":
+                return self._reply(200, api.health())
+            if path == "/sessions" and method == "POST":
+                body = self._body()
+                return self._reply(201, api.create(body.get("age"), body.get("sweet_mode", False),
+                                                       self.client_address[0]))
+            match = SESSION_PATH.match(path)
+            if match is None:
+                raise ApiError(404, "Not found.")
+            session_id, action = match.groups()
+            if action is None and method == "GET":
+                return self._reply(200, api.state(session_id))
+            if action is None and method == "DELETE":
+                api.delete(session_id)
+                return self._reply(204)
+            if action == "command" and method == "POST":
+                return self._reply(200, api.command(session_id, self._body().get("command")))
+            if action == "batch" and method == "POST":
+                return self._reply(200, api.batch(session_id, self._body().get("commands")))
+            raise ApiError(405, "Method not allowed.")
+        except ApiError as e:
+            if self._unread:
+                self.close_connection = True  # The unread body would be taken for the next request
+            self._reply(e.status, {"error": str(e)})
+        except Exception:
+            traceback.print_exc()
+            if self._unread:
+                self.close_connection = True
+            self._reply(500, {"error": "The game hit an error."})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class ApiServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server (one thread per connection) serving a GameApi."""
+
+    daemon_threads = True
+
+    def __init__(self, address, api, verbose=False):
+        super().__init__(address, ApiHandler)
+        self.api = api
+        self.verbose = verbose
+
+
+def serve(host, port, store_options, verbose=False):
+    """Loads the content and serves the API until interrupted."""
+    content = GameContent.load()
+    content.warm_up()
+    api = GameApi(content, SessionStore(content, **store_options))
+    api.store.saves.start_collector()
+    threading.Thread(target=api.sweep_forever, daemon=True).start()
+    server = ApiServer((host, port), api, verbose)
+    print(f"Serving the JSON API on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(api.store.summary())
+    finally:
+        server.server_close()
+
+
+# --- benchmark --------------------------------------------------------------
+
+BENCH_COMMANDS = ["go east", "buy souvenir", "back", "go north", "back", "look around"]
+
+
+def _request(connection, method, path, data=None):
+    body = json.dumps(data) if data is not None else None
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    payload = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"{method} {path} -> {response.status}: {payload[:200]!r}")
+    return json.loads(payload) if payload else None
+
+
+def _bench_client(port, deadline, mode, batch_size, latencies, counts):
+    """Plays games until the deadline, timing every request."""
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    requests = commands = 0
+    i = 0
+    session = None
+    while time.monotonic() < deadline:
+        if mode == "new connection":
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+        started = time.perf_counter()
+        if session is None:
+            session = _request(connection, "POST", "/sessions", {"age": 20})["session"]
+        elif mode == "batch":
+            batch = [BENCH_COMMANDS[(i + n) % len(BENCH_COMMANDS)] for n in range(batch_size)]
+            _request(connection, "POST", f"/sessions/{session}/batch", {"commands": batch})
+            i += batch_size
+            commands += batch_size
+        else:
+            _request(connection, "POST", f"/sessions/{session}/command",
+                     {"command": BENCH_COMMANDS[i % len(BENCH_COMMANDS)]})
+            i += 1
+            commands += 1
+        latencies.append(time.perf_counter() - started)
+        requests += 1
+    connection.close()
+    counts.append((requests, commands))
+
+
+def benchmark(clients=8, seconds=5.0, batch_size=10):
+    """Measures requests per second and latency with local clients.
+
+    Runs the API on a free port in this process (bundled content, no network)
+    and compares keep-alive, a new connection per request and batched commands.
+
+    Args:
+        clients (int, optional): Concurrent client threads. Defaults to 8.
+        seconds (float, optional): Length of each scenario. Defaults to 5.
+        batch_size (int, optional): Commands per batch request. Defaults to 10.
+    """
+    content = GameContent.local()
+    content.warm_up()
+    api = GameApi(content)
+    server = ApiServer(("127.0.0.1", 0), api)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    print(f"{'scenario':<18} {'requests/s':>11} {'commands/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    try:
+        for mode in ("keep-alive", "new connection", "batch"):
+            latencies, counts = [], []
+            deadline = time.monotonic() + seconds
+            started = time.perf_counter()
+            threads = [threading.Thread(target=_bench_client,
+                                        args=(port, deadline, mode, batch_size, latencies, counts))
+                       for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            requests = sum(r for r, _ in counts)
+            commands = sum(c for _, c in counts)
+            label = f"batch of {batch_size}" if mode == "batch" else mode
+            print(f"{label:<18} {requests / elapsed:>11,.0f} {commands / elapsed:>11,.0f} "
+                  f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the CN Tower game as a JSON API over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--max-hot", type=int, default=1000,
+                        help="sessions kept in memory; the rest are hibernated to disk (default: 1000)")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="seconds of inactivity before a session is hibernated (default: 300)")
+    parser.add_argument("--hibernate-dir", default=DEFAULT_HIBERNATE_DIR,
+                        help=f"folder for hibernated sessions (default: {DEFAULT_HIBERNATE_DIR})")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="measure throughput and latency with local clients instead of serving")
+    parser.add_argument("--clients", type=int, default=8, help="benchmark client threads (default: 8)")
+    parser.add_argument("--seconds", type=float, default=5, help="length of each benchmark scenario (default: 5)")
+    options = parser.parse_args()
+    if options.benchmark:
+        benchmark(options.clients, options.seconds)
+    else:
+        serve(options.host, options.port, {"directory": options.hibernate_dir, "max_hot": options.max_hot,
+                                           "idle_timeout": options.idle_timeout}, options.verbose)
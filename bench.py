@@ -0,0 +1,369 @@
+"""Microbenchmarks for the game code, with a stored baseline and regression gating.
+
+Covers sweet_dialogue for every location, process_command for every command
+of every location, save_game/load_game round trips, parsing dialogue.json
+and an end-to-end main() startup.  Network fetches, pauses, prompts and
+console clearing are stubbed, so only the game's own code is timed.
+
+Each benchmark is timed as several samples (each a loop calibrated to about
+SAMPLE_SECONDS), split over a few fresh worker processes, and every sample is
+paired with a sample of a fixed reference workload so a machine that is busier
+or slower as a whole doesn't count.  `--save` stores the samples as the
+baseline; later runs are compared with it using a one-sided Mann-Whitney U test
+plus the change in median, and the run fails (exit status 1) when a benchmark is
+both significantly and more than `--threshold` slower.
+
+Baselines are machine specific: save one on the machine you compare on.
+
+Usage:
+    python bench.py --save
+    python bench.py
+    python bench.py --filter process_command --threshold 0.05
+    python bench.py --processes 1 --samples 10
+"""
+
+import argparse  # Used for the command-line options
+import contextlib  # Used for silencing output and applying stubs
+import io  # Used for discarding printed text
+import json  # Used for the baseline file and the dialogue parse benchmark
+import math  # Used for the normal approximation in the Mann-Whitney U test
+import os  # Used for temporary save files and the default baseline path
+import platform  # Used for recording where a baseline was measured
+import subprocess  # Used for running the benchmarks in fresh worker processes
+import sys  # Used for the exit status
+import tempfile  # Used for save/load round trip files
+import time  # Used for timing
+
+import headless
+import main
+
+DEFAULT_BASELINE = os.path.join(headless.HERE, "bench_baseline.json")
+SAMPLE_SECONDS = 0.01  # Target duration of one sample
+SAMPLES = 30  # Samples per benchmark, split over the worker processes
+PROCESSES = 5
+DEFAULT_THRESHOLD = 0.15  # Slowdown (fraction of the baseline median) that counts as a regression
+SIGNIFICANCE = 0.01  # p-value below which a slowdown is not noise
+RICH_INVENTORY = {"money": 1000, "ticket": True, "mask": True, "bible": True, "edgewalk_ticket": True,
+                  "met_alex": True, "met_Patrick": True, "worker_task": True}
+
+
+# --- benchmarks ---------------------------------------------------------------
+
+def sweet_dialogue_benchmarks(dialogue):
+    """One benchmark per location: translating a line that uses every phrase of that location."""
+    benchmarks = {}
+    for location, phrases in dialogue.items():
+        text = " ".join(phrases)
+
+        def run(location=location, text=text):
+            main.sweet_dialogue(text, location, True, dialogue)
+        benchmarks[f"sweet_dialogue/{location}"] = run
+    return benchmarks
+
+
+def process_command_benchmarks(dialogue):
+    """One benchmark per location: every command process_command knows there, once each.
+
+    Commands that stop for input() (the debug menu) are left out.
+    """
+    game = headless.HeadlessGame(dialogue_data=dialogue, capture=False)
+    game._interactive = False
+    benchmarks = {}
+    for location, commands in sorted(headless.command_table().items()):
+        usable = []
+        with game._patched(headless._NullOutput()):
+            for command in commands:
+                game._lines, game._cursor = [], 0
+                try:
+                    main.process_command(command, location, dict(RICH_INVENTORY), False, dialogue, False)
+                except EOFError:
+                    continue
+                usable.append(command)
+        if not usable:
+            continue
+
+        def run(location=location, usable=usable):
+            with game._patched(headless._NullOutput()):
+                for command in usable:
+                    main.process_command(command, location, dict(RICH_INVENTORY), False, dialogue, False)
+        benchmarks[f"process_command/{location}"] = run
+    return benchmarks
+
+
+def save_load_benchmark(folder):
+    path = os.path.join(folder, "bench_save.json")
+    inventory = dict(RICH_INVENTORY)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.save_game("lookout", inventory, path)
+            main.load_game(path)
+    return {"save_load/round_trip": run}
+
+
+def dialogue_parse_benchmark():
+    with open(headless.DIALOGUE_FILE, "r", encoding="utf-8") as f:
+        text = f.read()
+    return {"dialogue/json_parse": lambda: json.loads(text)}
+
+
+@contextlib.contextmanager
+def stubbed_startup(folder, dialogue):
+    """Stubs out everything main() waits on: network, pauses, prompts, console clearing and the age file."""
+    age_file = os.path.join(folder, "age.json")
+    load_age, save_age = main.load_age, main.save_age
+    stubs = {
+        "check_libraries": lambda: None,
+        "load_dialogue": lambda: dialogue,
+        "get_user_country": lambda: "Canada",
+        "clear_console": lambda: None,
+        "pause": lambda seconds: None,
+        "input": lambda prompt="": "20",
+        "get_player_input": lambda on_idle=None: "exit",
+        "load_age": lambda filename=None: load_age(age_file),
+        "save_age": lambda age, filename=None: save_age(age, age_file),
+    }
+    with headless._TURN_LOCK:
+        saved = {name: main.__dict__.get(name, headless._MISSING) for name in stubs}
+        main.__dict__.update(stubs)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is headless._MISSING:
+                    del main.__dict__[name]
+                else:
+                    main.__dict__[name] = value
+
+
+def startup_benchmark(folder, dialogue):
+    """main() from the first line to "Thanks for playing!", with a saved age and no network."""
+    def run():
+        with stubbed_startup(folder, dialogue), contextlib.redirect_stdout(io.StringIO()):
+            main.main()
+    return {"startup/main": run}
+
+
+def collect(folder):
+    """Builds every benchmark, keyed by name."""
+    dialogue = headless.load_local_dialogue()
+    benchmarks = {}
+    benchmarks.update(sweet_dialogue_benchmarks(dialogue))
+    benchmarks.update(process_command_benchmarks(dialogue))
+    benchmarks.update(save_load_benchmark(folder))
+    benchmarks.update(dialogue_parse_benchmark())
+    benchmarks.update(startup_benchmark(folder, dialogue))
+    return benchmarks
+
+
+# --- timing and statistics ------------------------------------------------------
+
+def reference_workload():
+    """Fixed pure-Python work (string replaces, dict lookups, a loop) that never changes.
+
+    Timed next to every sample, it tracks how fast the machine is running at
+    that moment, so comparisons survive CPU frequency changes and busy neighbours.
+    """
+    text = "the quick brown fox jumps over the lazy dog " * 4
+    table = {word: word.upper() for word in text.split()}
+    total = 0
+    for word in text.split():
+        text = text.replace(word, table[word], 1)
+        total += len(table.get(word, ""))
+    return total
+
+
+def calibrate(function):
+    """Returns how many calls of `function` take about SAMPLE_SECONDS."""
+    function()  # Warm up (caches, first-call imports)
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= SAMPLE_SECONDS or loops >= 1 << 20:
+            return loops
+        loops *= 2 if elapsed < SAMPLE_SECONDS / 4 else 1 + int(SAMPLE_SECONDS / max(elapsed, 1e-9))
+
+
+def _time(function, loops):
+    started = time.perf_counter()
+    for _ in range(loops):
+        function()
+    return (time.perf_counter() - started) / loops
+
+
+def measure(function, samples=SAMPLES):
+    """Times a function, pairing every sample with a sample of the reference workload.
+
+    Args:
+        function (callable): What to time (no arguments).
+        samples (int, optional): Number of samples. Defaults to SAMPLES.
+
+    Returns:
+        list: (seconds per call, seconds per reference call) for each sample.
+    """
+    loops, reference_loops = calibrate(function), calibrate(reference_workload)
+    return [(_time(function, loops), _time(reference_workload, reference_loops)) for _ in range(samples)]
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def mann_whitney_greater(new, old):
+    """One-sided Mann-Whitney U test that `new` tends to be larger than `old`.
+
+    Uses the normal approximation with a tie correction, which is fine for the
+    ten-plus samples per side used here.
+
+    Returns:
+        float: The p-value.
+    """
+    n1, n2 = len(new), len(old)
+    combined = sorted([(value, 0) for value in new] + [(value, 1) for value in old])
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        size = j - i + 1
+        ties += size ** 3 - size
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)  # Continuity correction
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compares a run with the baseline.
+
+    The test and the change use each sample's time divided by its reference
+    time, so a machine that is slower as a whole doesn't read as a regression.
+
+    Returns:
+        list: (name, baseline median, new median, change, p-value, verdict) per benchmark,
+        with medians in seconds per call.
+    """
+    rows = []
+    for name, samples in results.items():
+        new_median = median([seconds for seconds, _ in samples])
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            rows.append((name, None, new_median, None, None, "new"))
+            continue
+        old_median = median([seconds for seconds, _ in old])
+        new_relative = [seconds / reference for seconds, reference in samples]
+        old_relative = [seconds / reference for seconds, reference in old]
+        change = median(new_relative) / median(old_relative) - 1
+        p_slower = mann_whitney_greater(new_relative, old_relative)
+        p_faster = mann_whitney_greater(old_relative, new_relative)
+        if change > threshold and p_slower < SIGNIFICANCE:
+            verdict = "REGRESSION"
+        elif change < -threshold and p_faster < SIGNIFICANCE:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append((name, old_median, new_median, change, min(p_slower, p_faster), verdict))
+    return rows
+
+
+def measure_all(name_filter=None, samples=SAMPLES):
+    """Times every benchmark in this process.
+
+    Returns:
+        dict: Benchmark name -> list of seconds per call.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        benchmarks = collect(folder)
+        return {name: measure(function, samples) for name, function in benchmarks.items()
+                if not name_filter or name_filter in name}
+
+
+def measure_in_workers(name_filter=None, samples=SAMPLES, processes=PROCESSES):
+    """Splits the samples over fresh worker processes and pools them.
+
+    A process's timings shift as a whole (memory layout, hash seed, what else
+    the machine is doing), so samples from one process understate the noise
+    between runs.  Pooling a few processes puts that noise into the samples
+    the statistical test sees.
+
+    Returns:
+        dict: Benchmark name -> list of seconds per call.
+    """
+    per_process = max(1, math.ceil(samples / processes))
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--samples", str(per_process)]
+    if name_filter:
+        command += ["--filter", name_filter]
+    results = {}
+    for _ in range(processes):
+        output = subprocess.run(command, capture_output=True, text=True, check=True, stdin=subprocess.DEVNULL).stdout
+        for name, values in json.loads(output.splitlines()[-1]).items():
+            results.setdefault(name, []).extend(values)
+    return results
+
+
+def run(baseline_path=DEFAULT_BASELINE, save=False, name_filter=None, threshold=DEFAULT_THRESHOLD, samples=SAMPLES,
+        processes=PROCESSES):
+    """Runs the suite, prints a report and returns the process exit status."""
+    if processes > 1:
+        results = measure_in_workers(name_filter, samples, processes)
+    else:
+        results = measure_all(name_filter, samples)
+    baseline = {}
+    if os.path.exists(baseline_path) and not save:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(f"{'benchmark':<44} {'baseline':>11} {'now':>11} {'change':>8} {'p':>7}  verdict")
+    regressions = 0
+    for name, old, new, change, p, verdict in compare(results, baseline, threshold):
+        old_text = f"{old * 1e6:9.2f}us" if old is not None else f"{'-':>11}"
+        change_text = f"{change:+7.1%}" if change is not None else f"{'':>8}"
+        p_text = f"{p:7.4f}" if p is not None else f"{'':>7}"
+        print(f"{name:<44} {old_text} {new * 1e6:9.2f}us {change_text} {p_text}  {verdict}")
+        regressions += verdict == "REGRESSION"
+    if save:
+        data = {"python": platform.python_version(), "machine": platform.platform(),
+                "saved": time.strftime("%Y-%m-%d %H:%M:%S"), "benchmarks": results}
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        print(f"Baseline saved to {baseline_path}")
+    elif baseline:
+        print(f"Compared with the baseline from {baseline.get('saved', '?')} ({baseline.get('machine', '?')}): "
+              f"{regressions} regression(s) past {threshold:.0%}")
+    else:
+        print(f"No baseline at {baseline_path}; run with --save to create one.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game code and gate on regressions.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file (default: bench_baseline.json)")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"slowdown that fails the run, as a fraction (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help=f"samples per benchmark (default: {SAMPLES})")
+    parser.add_argument("--processes", type=int, default=PROCESSES,
+                        help=f"worker processes the samples are split over (default: {PROCESSES})")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.worker:
+        with contextlib.redirect_stdout(sys.stderr):
+            results = measure_all(options.filter, options.samples)
+        print(json.dumps(results))
+        sys.exit(0)
+    sys.exit(run(options.baseline, options.save, options.filter, options.threshold, options.samples,
+                 options.processes))
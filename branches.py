@@ -0,0 +1,216 @@
+"""What-if branches: fork a game at any turn and compare how different choices play out.
+
+A branch is a list of lines typed into a fork of the same session
+(HeadlessGame.fork(), which copies only the inventory and saved games and
+shares everything else), so trying "tell truth", "bribe" and "lie" in
+caught_stealing leaves the original session untouched.  Every branch starts
+from the same random state, so any difference in the output comes from the
+choice, not from a shuffle.  compare() plays the branches and report() shows
+where each one's text differs from the first and how its final state differs.
+
+explore() forks once per command the current location understands, level by
+level, to see every outcome a few moves ahead, and reports how long the
+forking itself took.  Hosted sessions can be branched live from the admin console
+(`python admin.py fork <session> "tell truth" "bribe"`).
+
+Usage:
+    python branches.py --setup "go west" --branch "tell truth" --branch "bribe"
+    python branches.py --at caught_stealing --branch "tell truth" --branch "bribe" --branch "lie"
+    python branches.py --at base --explore 3
+"""
+
+import argparse  # Used for the command-line options
+import collections  # Used for counting the outcomes of explore()
+import difflib  # Used for showing how branch outputs differ
+import json  # Used for the --inventory option
+import random  # Used for starting every branch from the same random state
+import time  # Used for timing explore()
+
+import headless
+
+ANSWERS = 3  # Times "1" is typed for prompts inside an explored turn (Alex's questions)
+SKIPPED_COMMANDS = {"debug", "save", "load", "restart", "exit"}  # Not worth exploring
+
+
+def split_branch(text):
+    """Splits a branch written as "cmd1; cmd2" into its lines."""
+    return [line.strip() for line in text.split(";") if line.strip()]
+
+
+def play(game, lines, seed=0):
+    """Plays lines on a fork of a game, from a fixed random state.
+
+    The global random state is put back afterwards, so branching a live
+    session doesn't change the shuffles other sessions see.
+
+    Args:
+        game (HeadlessGame): The session to branch from (left as it is).
+        lines (list): The lines to type.
+        seed (int, optional): Random seed every branch starts from. Defaults to 0.
+
+    Returns:
+        dict: The branch's lines, everything it printed, its final state() and the error that stopped it
+            (None if it played to the end).
+    """
+    fork = game.fork()
+    saved = random.getstate()
+    random.seed(seed)
+    output = []
+    error = None
+    try:
+        for line in lines:
+            output.append(fork.send(line))
+    except Exception as e:  # A game bug ends this branch, not the comparison
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        random.setstate(saved)
+    return {"lines": list(lines), "output": "".join(output), "state": fork.state(), "error": error}
+
+
+def compare(game, branches, seed=0):
+    """Plays each branch from the same point and works out how they differ from the first.
+
+    Args:
+        game (HeadlessGame): The session to branch from (left as it is).
+        branches (list): Each branch's lines.
+        seed (int, optional): Random seed every branch starts from. Defaults to 0.
+
+    Returns:
+        list: One dict per branch (see play()), with "diff" (unified diff of its output against the
+            first branch's) and "changed" (state entries that differ from the first branch's).
+    """
+    return differences([play(game, lines, seed) for lines in branches])
+
+
+def differences(results):
+    """Adds "diff" and "changed" (see compare()) to play() results, against the first one.
+
+    Returns:
+        list: The same results.
+    """
+    first = results[0]
+    for result in results:
+        result["diff"] = list(difflib.unified_diff(
+            first["output"].splitlines(), result["output"].splitlines(), " ; ".join(first["lines"]),
+            " ; ".join(result["lines"]), lineterm="", n=0))
+        result["changed"] = state_changes(first["state"], result["state"])
+    return results
+
+
+def state_changes(before, after):
+    """Lists what differs between two state() dicts, e.g. ["location: jail -> base", "money: 40 -> 20"]."""
+    changes = []
+    for key in ("location", "sweet_mode", "finished", "ending"):
+        if before[key] != after[key]:
+            changes.append(f"{key}: {before[key]} -> {after[key]}")
+    for key in sorted(before["inventory"].keys() | after["inventory"].keys()):
+        old, new = before["inventory"].get(key, "-"), after["inventory"].get(key, "-")
+        if old != new:
+            changes.append(f"{key}: {old} -> {new}")
+    return changes
+
+
+def report(results):
+    """Formats compare()'s results for reading."""
+    lines = []
+    for i, result in enumerate(results):
+        state = result["state"]
+        outcome = f"ended ({state['ending']})" if state["finished"] else f"at {state['location']}"
+        lines.append(f"=== Branch {i + 1}: {' ; '.join(result['lines'])} -> {outcome}, ${state['money']}")
+        if result["error"]:
+            lines.append(f"    stopped by {result['error']}")
+        if i == 0:
+            lines.extend("    " + line for line in result["output"].splitlines() if line.strip())
+            continue
+        if result["diff"]:
+            lines.extend("    " + line for line in result["diff"][2:])  # Without the ---/+++ header
+        else:
+            lines.append("    (same output as branch 1)")
+        if result["changed"]:
+            lines.append("    state vs branch 1: " + ", ".join(result["changed"]))
+    return "\n".join(lines)
+
+
+def explore(game, depth, seed=0):
+    """Forks the game once per command at each level, `depth` moves deep.
+
+    Args:
+        game (HeadlessGame): The session to explore from (left as it is).
+        depth (int): Moves to look ahead.
+        seed (int, optional): Random seed every fork starts from. Defaults to 0.
+
+    Returns:
+        dict: forks made, seconds taken (in all, and forking alone), distinct states reached, and how
+            often each ending (and each game error) was reached.
+    """
+    commands_at = headless.command_table()
+    started = time.perf_counter()
+    saved = random.getstate()
+    forks = 0
+    forking = 0.0
+    endings = collections.Counter()
+    errors = collections.Counter()
+    seen = set()
+    level = [game]
+    try:
+        for _ in range(depth):
+            next_level = []
+            for parent in level:
+                for command in commands_at.get(parent.location, ()):
+                    if command in SKIPPED_COMMANDS:
+                        continue
+                    random.seed(seed)
+                    before = time.perf_counter()
+                    child = parent.fork()
+                    forking += time.perf_counter() - before
+                    forks += 1
+                    try:
+                        child.send(command)
+                        for _ in range(ANSWERS):
+                            if not child.awaiting_input:
+                                break
+                            child.send("1")
+                    except Exception as e:
+                        errors[f"{type(e).__name__} after {command!r} at {parent.location}"] += 1
+                        continue
+                    if child.finished:
+                        endings[child.ending] += 1
+                        continue
+                    key = (child.location, tuple(sorted(child.inventory.items(), key=str)))
+                    if key not in seen:
+                        seen.add(key)
+                        next_level.append(child)
+            level = next_level
+    finally:
+        random.setstate(saved)
+    return {"forks": forks, "seconds": time.perf_counter() - started, "fork_seconds": forking, "states": len(seen),
+            "endings": dict(endings), "errors": dict(errors)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fork a game and compare what-if branches.")
+    parser.add_argument("--setup", action="append", default=[], help="line to play before branching (repeatable)")
+    parser.add_argument("--at", help="start at this location instead of a new game")
+    parser.add_argument("--inventory", default='{"money": 40}', help="inventory as JSON for --at (default: a new game's)")
+    parser.add_argument("--branch", action="append", default=[],
+                        help='a branch to try, with its lines separated by ";" (repeatable)')
+    parser.add_argument("--explore", type=int, metavar="DEPTH", help="fork every command, DEPTH moves deep")
+    parser.add_argument("--seed", type=int, default=0, help="random seed every branch starts from (default: 0)")
+    options = parser.parse_args()
+    if options.at:
+        base = headless.HeadlessGame.at(options.at, json.loads(options.inventory))
+    else:
+        base = headless.HeadlessGame()
+        base.start()
+    for setup_line in options.setup:
+        base.send(setup_line)
+    print(f"Branching at {base.location} with {base.inventory}")
+    if options.branch:
+        print(report(compare(base, [split_branch(branch) for branch in options.branch], options.seed)))
+    if options.explore:
+        found = explore(base, options.explore, options.seed)
+        print(f"{found['forks']} forks played in {found['seconds']:.2f}s; forking alone took "
+              f"{found['fork_seconds'] * 1e6 / max(1, found['forks']):.1f} us per fork. "
+              f"{found['states']} distinct states, endings {found['endings']}")
+        for error, count in found["errors"].items():
+            print(f"  {count} x {error}")
@@ -0,0 +1,356 @@
+"""Circuit breakers for the geolocation providers get_user_country() asks.
+
+Each provider gets a CircuitBreaker that watches its recent calls:
+
+* closed: calls go through; the last `window` outcomes are kept.  When at
+  least `min_calls` are recorded and the share of failures (errors, timeouts,
+  resets, malformed replies) or of slow calls reaches its threshold, the
+  breaker opens.
+* open: the provider is skipped for `open_seconds` (doubling after each
+  failed probe, up to `max_open_seconds`).  A 429 opens it straight away for
+  the Retry-After the provider asked for (5 minutes if it didn't say).
+* half-open: once the wait is over, one probe call is let through; success
+  closes the breaker, failure opens it again.
+
+ProviderHealth keeps a breaker per provider and orders providers by observed
+success rate and latency, so the fastest healthy one is tried first.
+
+Usage:
+    python circuit_breaker.py --check
+"""
+
+import argparse  # Used for the command-line options
+import collections  # Used for the sliding window of recent outcomes
+import contextlib  # Used for pointing the game at fake providers in the checks
+import io  # Used for silencing get_user_country() in the checks
+import time  # Used as the default clock
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+DEFAULT_RETRY_AFTER = 5 * 60  # Seconds a provider is left alone after a 429 without Retry-After
+SMOOTHING = 0.3  # Weight of the newest call in the moving averages used for ordering
+
+
+class CircuitBreaker:
+    """Tracks one provider's health and decides whether to call it.
+
+    Args:
+        name (str): The provider (for reports).
+        window (int, optional): Recent calls considered. Defaults to 10.
+        min_calls (int, optional): Calls needed in the window before it can trip. Defaults to 3.
+        failure_rate (float, optional): Share of failed calls that trips the breaker. Defaults to 0.5.
+        slow_call_seconds (float, optional): Calls slower than this count as slow. Defaults to 2.
+        slow_rate (float, optional): Share of slow calls that trips the breaker. Defaults to 0.8.
+        open_seconds (float, optional): First wait before a probe. Defaults to 30.
+        max_open_seconds (float, optional): Longest wait before a probe. Defaults to 600.
+        clock (callable, optional): Returns the time in seconds. Defaults to time.monotonic.
+    """
+
+    def __init__(self, name, window=10, min_calls=3, failure_rate=0.5, slow_call_seconds=2.0, slow_rate=0.8,
+                 open_seconds=30.0, max_open_seconds=600.0, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)  # (failed, slow) per recent call
+        self.opened_until = 0.0
+        self.probing = False  # A half-open probe call is in flight
+        self.wait = open_seconds  # Next open period; doubles while probes keep failing
+        self.success_average = 1.0  # Moving averages for ordering providers (optimistic start)
+        self.latency_average = None
+        self.calls = 0
+        self.trips = 0
+
+    def available(self):
+        """Returns True if allow() would let a call through now (without changing state)."""
+        if self.state == OPEN:
+            return self.clock() >= self.opened_until
+        return self.state == CLOSED or not self.probing
+
+    def allow(self):
+        """Returns True if the provider may be called now; call just before calling it.
+
+        A due open breaker moves to half-open and lets exactly one probe through
+        until its outcome is recorded.
+        """
+        if self.state == OPEN and self.clock() >= self.opened_until:
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return self.state != OPEN
+
+    def _update_averages(self, failed, seconds):
+        self.calls += 1
+        self.success_average += SMOOTHING * ((0.0 if failed else 1.0) - self.success_average)
+        if self.latency_average is None:
+            self.latency_average = seconds
+        else:
+            self.latency_average += SMOOTHING * (seconds - self.latency_average)
+
+    def record_success(self, seconds):
+        """Records a call that returned a usable answer after `seconds`."""
+        self._update_averages(False, seconds)
+        slow = seconds > self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self.probing = False
+            if slow:
+                return self._open(self.wait * 2)
+            self.state = CLOSED
+            self.outcomes.clear()
+            self.wait = self.open_seconds
+            return
+        self.outcomes.append((False, slow))
+        self._check()
+
+    def record_failure(self, seconds):
+        """Records a call that failed (error status, timeout, reset, malformed reply) after `seconds`."""
+        self._update_averages(True, seconds)
+        if self.state == HALF_OPEN:
+            self.probing = False
+            return self._open(self.wait * 2)
+        self.outcomes.append((True, seconds > self.slow_call_seconds))
+        self._check()
+
+    def trip(self, seconds=None):
+        """Opens the breaker now, e.g. on a 429, for `seconds` (a normal open period if None)."""
+        self._update_averages(True, 0.0)
+        self.probing = False
+        self._open(self.wait if seconds is None else seconds, grow=False)
+
+    def _check(self):
+        if len(self.outcomes) < self.min_calls:
+            return
+        failed = sum(1 for f, _ in self.outcomes if f) / len(self.outcomes)
+        slow = sum(1 for _, s in self.outcomes if s) / len(self.outcomes)
+        if failed >= self.failure_rate or slow >= self.slow_rate:
+            self._open(self.wait)
+
+    def _open(self, seconds, grow=True):
+        if grow:
+            self.wait = min(self.max_open_seconds, max(self.open_seconds, seconds))
+            seconds = self.wait
+        self.state = OPEN
+        self.opened_until = self.clock() + seconds
+        self.outcomes.clear()
+        self.trips += 1
+
+    def cost(self):
+        """Expected seconds to a good answer: average latency over success rate (lower is better)."""
+        if self.latency_average is None:
+            return 0.0  # Untried providers keep their configured order at the front
+        return self.latency_average / max(self.success_average, 0.05)
+
+    def describe(self):
+        latency = "-" if self.latency_average is None else f"{self.latency_average * 1000:.0f} ms"
+        return (f"{self.name}: {self.state}, {self.calls} calls, {self.trips} trips, "
+                f"success {self.success_average:.0%}, latency {latency}")
+
+
+class ProviderHealth:
+    """A circuit breaker per provider, and an order to try them in.
+
+    Args:
+        **breaker_options: Passed on to every CircuitBreaker.
+    """
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self.breakers = {}  # provider -> CircuitBreaker
+
+    def breaker(self, provider):
+        """Returns the provider's breaker, creating it on first use."""
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            breaker = self.breakers[provider] = CircuitBreaker(provider, **self.breaker_options)
+        return breaker
+
+    def order(self, providers):
+        """Returns the providers worth trying now, cheapest (fastest healthy) first.
+
+        Ties keep the given order.  Call allow() on each one just before calling it.
+        """
+        allowed = [provider for provider in providers if self.breaker(provider).available()]
+        return sorted(allowed, key=lambda provider: self.breaker(provider).cost())
+
+    def summary(self):
+        return "\n".join(breaker.describe() for breaker in self.breakers.values())
+
+
+def retry_after(response, default=DEFAULT_RETRY_AFTER):
+    """Reads a Retry-After header in seconds (HTTP dates fall back to the default)."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return default
+
+
+class _Clock:
+    """A clock the checks move by hand, so open periods can be checked exactly."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@contextlib.contextmanager
+def _providers(faults, client=None, **breaker_options):
+    """Points get_user_country() at a StandIn with fresh breakers on a hand-moved clock.
+
+    Yields:
+        tuple: (lookup, health, clock, standin), where lookup(*paths) runs get_user_country() against
+            those stand-in providers and returns the paths it asked.
+    """
+    import http_client
+    import main
+    from standin import StandIn
+
+    clock = _Clock()
+    health = ProviderHealth(clock=clock, **breaker_options)
+    saved = main.geo_providers, http_client._default
+    main.geo_providers = health
+    if client is not None:
+        http_client._default = client
+    try:
+        with StandIn(faults=faults) as standin, standin.redirect():
+            def lookup(*paths):
+                main.GEO_APIS = [standin.url(path) for path in paths]
+                before = dict(standin.requests)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main.get_user_country()
+                return [path for path in paths if standin.requests.get(path) != before.get(path)]
+
+            yield lookup, health, clock, standin
+    finally:
+        main.geo_providers, http_client._default = saved
+
+
+def check_failures_open():
+    """Repeated resets or timeouts open the breaker, and the provider is then skipped."""
+    import http_client
+    from standin import Fault
+
+    client = http_client.HttpClient(read_timeout=0.2, retries=0)
+    faults = {"/geo/ipapi": Fault(reset=True), "/geo/ipwho": Fault(latency=0.5)}
+    with _providers(faults, client, min_calls=3) as (lookup, health, clock, standin):
+        for path in faults:
+            breaker = health.breaker(standin.url(path))
+            for _ in range(3):
+                assert lookup(path) == [path], f"{path} not asked while its breaker was closed"
+            assert breaker.state == OPEN, f"{path}: 3 failures left the breaker {breaker.state}"
+            assert lookup(path) == [], f"{path} asked while its breaker was open"
+    client.close()
+
+
+def check_half_open_probe():
+    """After the cool-down exactly one probe goes through; success closes the breaker, failure reopens it."""
+    from standin import Fault
+
+    path = "/geo/ipapi"
+    with _providers({path: Fault(reset=True)}, min_calls=3, open_seconds=30) as (lookup, health, clock, standin):
+        breaker = health.breaker(standin.url(path))
+        for _ in range(3):
+            lookup(path)
+        assert breaker.state == OPEN
+        clock.now += 29.9
+        assert lookup(path) == [], "probed before the cool-down was over"
+        clock.now += 0.1
+        assert breaker.allow() and not breaker.allow(), "half-open let more than one probe through"
+        breaker.probing = False  # That probe was never sent
+        assert lookup(path) == [path], "no probe after the cool-down"
+        assert breaker.state == OPEN and breaker.wait == 60, "a failed probe didn't reopen the breaker for longer"
+        assert lookup(path) == [], "asked again right after a failed probe"
+        del standin.faults[path]
+        clock.now += 60
+        assert lookup(path) == [path], "no probe after the second cool-down"
+        assert breaker.state == CLOSED and breaker.wait == 30, "a good probe didn't close the breaker"
+        assert lookup(path) == [path], "a closed breaker skipped the provider"
+
+
+def check_retry_after():
+    """A 429 keeps the provider skipped for exactly its Retry-After."""
+    from standin import Fault
+
+    path = "/geo/freegeoip"
+    with _providers({path: Fault(status=429, retry_after=7, times=1)}) as (lookup, health, clock, standin):
+        breaker = health.breaker(standin.url(path))
+        assert lookup(path) == [path]
+        assert breaker.state == OPEN, "a 429 didn't open the breaker"
+        clock.now += 6.99
+        assert lookup(path) == [], "asked before Retry-After was up"
+        clock.now += 0.01
+        assert lookup(path) == [path], "not asked once Retry-After was up"
+        assert breaker.state == CLOSED
+
+
+def check_slow_calls():
+    """Calls slower than the latency threshold trip the breaker even though they succeed."""
+    from standin import Fault
+
+    path = "/geo/ipwho"
+    with _providers({path: Fault(latency=0.3)}, min_calls=3, slow_call_seconds=0.2) as (lookup, health, clock,
+                                                                                       standin):
+        breaker = health.breaker(standin.url(path))
+        for _ in range(3):
+            assert lookup(path) == [path]
+        assert breaker.state == OPEN, f"3 slow calls left the breaker {breaker.state}"
+        assert lookup(path) == []
+
+
+def check_malformed_replies():
+    """A body that is not a JSON object with a country counts as a failure, and the next provider is asked."""
+    from standin import Fault
+
+    for body in ("null", "5", '["Canada"]', '{"country_name": "Can', '{"ip": "127.0.0.1"}'):
+        with _providers({"/geo/ipapi": Fault(body=body)}) as (lookup, health, clock, standin):
+            breaker = health.breaker(standin.url("/geo/ipapi"))
+            assert lookup("/geo/ipapi", "/geo/ipwho") == ["/geo/ipapi", "/geo/ipwho"], \
+                f"{body!r}: the next provider wasn't asked"
+            assert list(breaker.outcomes) == [(True, False)], f"{body!r} wasn't recorded as a failure"
+
+
+def check_ordering():
+    """ProviderHealth puts the fast healthy provider first."""
+    from standin import Fault
+
+    paths = ("/geo/ipapi", "/geo/ipwho", "/geo/freegeoip")
+    faults = {"/geo/ipapi": Fault(latency=0.15), "/geo/freegeoip": Fault(status=503)}
+    with _providers(faults, min_calls=10) as (lookup, health, clock, standin):
+        for _ in range(4):
+            lookup(*paths)
+        order = health.order([standin.url(path) for path in paths])
+        assert order[0] == standin.url("/geo/ipwho"), f"fast provider not first: {order}"
+        assert lookup(*paths) == ["/geo/ipwho"], "the fast provider wasn't the only one asked"
+
+
+CHECKS = [check_failures_open, check_half_open_probe, check_retry_after, check_slow_calls, check_malformed_replies,
+          check_ordering]
+
+
+def check():
+    """Runs every check against local fake providers (standin.StandIn); raises AssertionError on a failure."""
+    for function in CHECKS:
+        function()
+        print(f"ok  {function.__doc__}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Circuit breakers for the geolocation providers.")
+    parser.add_argument("--check", action="store_true",
+                        help="check the breakers with get_user_country() against local fake providers")
+    options = parser.parse_args()
+    if options.check:
+        check()
+    else:
+        parser.print_help()
@@ -0,0 +1,285 @@
+"""Offline country lookups: timezone name -> country, and IP address -> country.
+
+pytz only maps countries to their timezones (pytz.country_timezones), so
+this module inverts that once into a timezone -> country index and caches it
+on disk, keyed by the pytz version.  Legacy alias names ("US/Eastern",
+"Japan", ...) are matched to the canonical zone with identical transition
+data, as long as all such zones belong to the same country.
+
+Optionally, an IP-range table (a CSV file of `start,end,country` lines, with
+a country code or name) is loaded into sorted arrays and searched with bisect.
+The game loads one when CN_TOWER_IP_TABLE names the file; the hosted server
+then checks each player's country from their address (server.GameContent).
+
+After the index is loaded, lookups are a dictionary or bisect hit: a few
+microseconds, no network.
+
+Usage:
+    python country_index.py
+    python country_index.py --timezone America/Toronto --ip-table ranges.csv --ip 203.0.113.7
+"""
+
+import argparse  # Used for the command-line options
+import bisect  # Used for searching the sorted IP ranges
+import csv  # Used for reading IP-range tables
+import ipaddress  # Used for turning addresses into comparable integers
+import json  # Used for the on-disk index cache
+import os  # Used for the cache folder and reading the system timezone
+import tempfile  # Used for the default cache folder
+import time  # Used for timing lookups in the command-line report
+
+import pytz  # Used for the timezone and country data
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "cn_tower_cache")
+IP_TABLE_ENV = "CN_TOWER_IP_TABLE"  # Environment variable naming the IP-range table default_resolver() loads
+
+# Legacy zone folders that belong to one country, whatever their rules look like
+LEGACY_PREFIXES = {"US/": "US", "Canada/": "CA", "Mexico/": "MX", "Brazil/": "BR", "Chile/": "CL", "Australia/": "AU"}
+
+
+def _zone_signature(zone):
+    """Describes a timezone's rules, so aliases can be matched to canonical zones."""
+    if hasattr(zone, "_utc_transition_times"):
+        return repr((zone._utc_transition_times, zone._transition_info))
+    return repr((getattr(zone, "_utcoffset", None), getattr(zone, "_tzname", None)))
+
+
+def build_timezone_index():
+    """Inverts pytz.country_timezones into timezone name -> country code.
+
+    Returns:
+        dict: Timezone name -> ISO country code.
+    """
+    index = {}
+    for code, zones in pytz.country_timezones.items():
+        for name in zones:
+            index.setdefault(name, code.upper())
+    by_signature = {}
+    for name, code in index.items():
+        by_signature.setdefault(_zone_signature(pytz.timezone(name)), set()).add(code)
+    for name in pytz.all_timezones:
+        if name in index:
+            continue
+        prefix = name.split("/", 1)[0] + "/"
+        if prefix in LEGACY_PREFIXES:
+            index[name] = LEGACY_PREFIXES[prefix]
+            continue
+        try:
+            codes = by_signature.get(_zone_signature(pytz.timezone(name)), ())
+        except pytz.UnknownTimeZoneError:
+            continue
+        if len(codes) == 1:
+            index[name] = next(iter(codes))
+    return index
+
+
+def cache_path(cache_dir=DEFAULT_CACHE_DIR):
+    """Returns the index cache file for the installed pytz version."""
+    return os.path.join(cache_dir, f"tz_country-{pytz.__version__}.json")
+
+
+def load_timezone_index(cache_dir=DEFAULT_CACHE_DIR):
+    """Loads the timezone index from the disk cache, building and saving it if needed.
+
+    Args:
+        cache_dir (str, optional): Folder for the cache file. Defaults to DEFAULT_CACHE_DIR.
+
+    Returns:
+        dict: Timezone name -> ISO country code.
+    """
+    path = cache_path(cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    index = build_timezone_index()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, sort_keys=True)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # Read-only disk: still works, just rebuilds next time
+    return index
+
+
+def local_timezone_name():
+    """Finds the IANA name of this machine's timezone (e.g. "America/Toronto").
+
+    datetime's local tzinfo only knows abbreviations such as "EST", so this
+    looks at $TZ, /etc/timezone and the /etc/localtime symlink instead.
+
+    Returns:
+        str: The timezone name, or None if it can't be told.
+    """
+    candidates = [os.environ.get("TZ", "").lstrip(":")]
+    try:
+        with open("/etc/timezone", "r", encoding="utf-8") as f:
+            candidates.append(f.read().strip())
+    except OSError:
+        pass
+    try:
+        target = os.path.realpath("/etc/localtime")
+        if "zoneinfo" + os.sep in target:
+            candidates.append(target.split("zoneinfo" + os.sep, 1)[1])
+    except OSError:
+        pass
+    for name in candidates:
+        if name in pytz.all_timezones_set:
+            return name
+    return None
+
+
+class IPRangeTable:
+    """Country lookups by IP address over sorted, non-overlapping ranges.
+
+    Args:
+        ranges (iterable): (first address, last address, country) tuples.
+    """
+
+    def __init__(self, ranges):
+        tables = {4: [], 6: []}
+        for first, last, country in ranges:
+            first, last = ipaddress.ip_address(first), ipaddress.ip_address(last)
+            tables[first.version].append((int(first), int(last), country))
+        self._starts, self._ends, self._countries = {}, {}, {}
+        for version, rows in tables.items():
+            rows.sort()
+            self._starts[version] = [row[0] for row in rows]
+            self._ends[version] = [row[1] for row in rows]
+            self._countries[version] = [row[2] for row in rows]
+
+    @classmethod
+    def from_csv(cls, path):
+        """Reads `start,end,country` lines (blank lines and # comments are skipped).
+
+        Raises:
+            ValueError: If a line isn't a valid range, naming the file and line.
+        """
+        ranges = []
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            for row in reader:
+                if not row or row[0].lstrip().startswith("#"):
+                    continue
+                where = f"{path}, line {reader.line_num}"
+                if len(row) < 3:
+                    raise ValueError(f"{where}: expected start,end,country, got {len(row)} column(s)")
+                first, last, country = (value.strip() for value in row[:3])
+                try:
+                    first_address, last_address = ipaddress.ip_address(first), ipaddress.ip_address(last)
+                except ValueError as e:
+                    raise ValueError(f"{where}: {e}") from None
+                if first_address.version != last_address.version:
+                    raise ValueError(f"{where}: {first} and {last} are different IP versions")
+                if first_address > last_address:
+                    raise ValueError(f"{where}: range starts after it ends ({first} > {last})")
+                if not country:
+                    raise ValueError(f"{where}: no country")
+                ranges.append((first, last, country))
+        return cls(ranges)
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def lookup(self, address):
+        """Returns the country for an address, or None if no range holds it."""
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return None
+        value, starts = int(address), self._starts[address.version]
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= self._ends[address.version][i]:
+            return self._countries[address.version][i]
+        return None
+
+
+class CountryResolver:
+    """Resolves country names offline from a timezone name or an IP address.
+
+    Args:
+        timezone_index (dict): Timezone name -> ISO country code.
+        ip_table (IPRangeTable, optional): IP ranges to search.
+    """
+
+    def __init__(self, timezone_index, ip_table=None):
+        self.timezone_index = timezone_index
+        self.ip_table = ip_table
+
+    @classmethod
+    def load(cls, cache_dir=DEFAULT_CACHE_DIR, ip_table_path=None):
+        """Loads the cached timezone index (building it on first use) and an optional IP table."""
+        ip_table = IPRangeTable.from_csv(ip_table_path) if ip_table_path else None
+        return cls(load_timezone_index(cache_dir), ip_table)
+
+    @staticmethod
+    def country_name(country):
+        """Turns an ISO code into pytz's country name; other values are returned as they are."""
+        if country and len(country) == 2:
+            return pytz.country_names.get(country.upper(), country)
+        return country or None
+
+    def from_timezone(self, name):
+        """Returns the country for a timezone name such as "Europe/Budapest", or None."""
+        return self.country_name(self.timezone_index.get(name))
+
+    def from_ip(self, address):
+        """Returns the country for an IP address, or None (also when there is no IP table)."""
+        if self.ip_table is None:
+            return None
+        return self.country_name(self.ip_table.lookup(address))
+
+    def local_country(self):
+        """Returns the country of this machine's timezone, or None."""
+        name = local_timezone_name()
+        return self.from_timezone(name) if name else None
+
+
+_resolver = None
+
+
+def default_resolver():
+    """Returns a process-wide resolver using the default cache and the IP table named by CN_TOWER_IP_TABLE (if set)."""
+    global _resolver
+    if _resolver is None:
+        _resolver = CountryResolver.load(ip_table_path=os.environ.get(IP_TABLE_ENV) or None)
+    return _resolver
+
+
+def local_country():
+    """Returns the country of this machine's timezone, or None (see CountryResolver)."""
+    return default_resolver().local_country()
+
+
+def ip_country(address):
+    """Returns the country of an IP address from the CN_TOWER_IP_TABLE table, or None (also without a table)."""
+    return default_resolver().from_ip(address)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve countries offline from timezones and IP ranges.")
+    parser.add_argument("--timezone", help="timezone name to look up (default: this machine's)")
+    parser.add_argument("--ip-table", default=os.environ.get(IP_TABLE_ENV),
+                        help=f"CSV file of start,end,country IP ranges (default: ${IP_TABLE_ENV})")
+    parser.add_argument("--ip", help="IP address to look up in the table")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"index cache folder (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the cached timezone index")
+    options = parser.parse_args()
+    if options.rebuild and os.path.exists(cache_path(options.cache_dir)):
+        os.remove(cache_path(options.cache_dir))
+    started = time.perf_counter()
+    resolver = CountryResolver.load(options.cache_dir, options.ip_table)
+    print(f"Loaded {len(resolver.timezone_index)} timezones"
+          f"{f' and {len(resolver.ip_table)} IP ranges' if resolver.ip_table else ''} "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    timezone = options.timezone or local_timezone_name()
+    lookups = [(f"timezone {timezone}", resolver.from_timezone, timezone)]
+    if options.ip:
+        lookups.append((f"IP {options.ip}", resolver.from_ip, options.ip))
+    for label, function, value in lookups:
+        started = time.perf_counter()
+        for _ in range(10000):
+            country = function(value)
+        print(f"{label}: {country} ({(time.perf_counter() - started) / 10000 * 1e6:.2f} µs per lookup)")
@@ -0,0 +1,116 @@
+"""Checks the game's libraries without importing or installing them.
+
+Each library in requirements.txt is looked up with importlib.util.find_spec,
+which finds the module on disk without running it.  The result is cached in a
+stamp file named after everything it depends on: the interpreter, the
+contents of requirements.txt and the modification times of the
+site-packages folders (which change when pip installs or removes anything).
+A normal launch therefore only reads one small file, and the libraries are
+looked up again whenever any of those change.
+
+Nothing is installed while the game starts.  requests is needed to run at
+all; without any other library the game runs in a degraded mode (see
+DEGRADED) and says what to install.
+
+Usage:
+    python dependencies.py
+    python dependencies.py --refresh
+"""
+
+import argparse  # Used for the command-line options
+import hashlib  # Used for the stamp key
+import importlib.util  # Used for finding libraries without importing them
+import json  # Used for the stamp file
+import os  # Used for locating requirements.txt and the stamp
+import re  # Used for reading names out of requirements.txt
+import site  # Used for finding the site-packages folders
+import sys  # Used for the interpreter in the stamp key
+import tempfile  # Used for the default stamp folder
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REQUIREMENTS_FILE = os.path.join(HERE, "requirements.txt")
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "cn_tower_cache")  # Shared with country_index
+REQUIRED = {"requests"}  # main.py imports it when it loads
+DEGRADED = {  # What the game does without each optional library
+    "art": "no CN Tower banner",
+    "prompt_toolkit": "plain input() without command history or idle timeouts",
+    "pytz": "no timezone fallback when the country can't be looked up online",
+}
+
+
+def requirements(path=REQUIREMENTS_FILE):
+    """Returns the module names of the libraries in a requirements file, in order."""
+    names = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = re.match(r"\s*([A-Za-z0-9_.-]+)", line.split("#", 1)[0])
+            if match:
+                names.append(match.group(1).replace("-", "_").lower())
+    return names
+
+
+def _site_folders():
+    folders = list(site.getsitepackages()) if hasattr(site, "getsitepackages") else []
+    folders.append(site.getusersitepackages())
+    return [folder for folder in folders if os.path.isdir(folder)]
+
+
+def stamp_key(path=REQUIREMENTS_FILE):
+    """Digest of what the check depends on: interpreter, requirements and site-packages changes."""
+    digest = hashlib.sha256()
+    digest.update(f"{sys.executable}\n{sys.version}\n".encode("utf-8"))
+    with open(path, "rb") as f:
+        digest.update(f.read())
+    for folder in _site_folders():
+        digest.update(f"{folder}\n{os.stat(folder).st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def verify(path=REQUIREMENTS_FILE, cache_dir=DEFAULT_CACHE_DIR, refresh=False):
+    """Finds out which libraries in requirements.txt are installed, using the stamp when it is current.
+
+    Args:
+        path (str, optional): The requirements file. Defaults to REQUIREMENTS_FILE.
+        cache_dir (str, optional): Folder for the stamp. Defaults to DEFAULT_CACHE_DIR.
+        refresh (bool, optional): Look the libraries up even if the stamp is current. Defaults to False.
+
+    Returns:
+        dict: Module name -> True if it can be imported.
+    """
+    stamp = os.path.join(cache_dir, f"dependencies-{stamp_key(path)}.json")
+    if not refresh:
+        try:
+            with open(stamp, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    available = {name: importlib.util.find_spec(name) is not None for name in requirements(path)}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(stamp + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(available, f)
+        os.replace(stamp + ".tmp", stamp)
+    except OSError:
+        pass  # A read-only cache only costs the lookup next time
+    return available
+
+
+def missing(path=REQUIREMENTS_FILE, cache_dir=DEFAULT_CACHE_DIR):
+    """Returns the libraries from requirements.txt that aren't installed."""
+    return [name for name, found in verify(path, cache_dir).items() if not found]
+
+
+def describe(name):
+    """Says what the game does without a library."""
+    if name in REQUIRED:
+        return "the game can't start without it"
+    return DEGRADED.get(name, "some features are unavailable")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the game's libraries without importing them.")
+    parser.add_argument("--refresh", action="store_true", help="look the libraries up again, ignoring the stamp")
+    options = parser.parse_args()
+    for library, found in verify(refresh=options.refresh).items():
+        print(f"{library:<16} {'installed' if found else 'missing: ' + describe(library)}")
+    print(f"Stamp: {os.path.join(DEFAULT_CACHE_DIR, f'dependencies-{stamp_key()}.json')}")
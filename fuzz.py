@@ -0,0 +1,323 @@
+"""Command fuzzer for the CN Tower game.
+
+Drives display_location/process_command in-process through HeadlessGame with
+random and mutated command sequences, using every core.  Sleeps and network
+fetches are stubbed out by HeadlessGame, so a run costs only the game logic.
+
+A run is a "crash" when the game raises (anything but the EOFError of running
+out of typed lines), and a "finding" when it breaks an invariant, e.g. moving
+to a location that display_location has no branch for.  Each distinct problem
+is shrunk to a minimal command sequence and saved as a replayable script.
+
+Usage:
+    python fuzz.py --seconds 60
+    python fuzz.py --seconds 10 --workers 4 --out fuzz_crashes
+"""
+
+import argparse  # Used for the command-line options
+import hashlib  # Used for naming repro scripts after their crash signature
+import multiprocessing  # Used for fuzzing on every core
+import os  # Used for creating the output folder and counting cores
+import random  # Used for generating and mutating command sequences
+import sys  # Used for printing replayed crashes to the console
+import time  # Used for the time budget and throughput numbers
+import traceback  # Used for locating where in the game a crash happened
+
+import headless
+
+DEFAULT_OUT = os.path.join(headless.HERE, "fuzz_crashes")
+
+# Lines that are not game commands but reach input() prompts (debug menu, Alex's options)
+EXTRA_LINES = [
+    "1", "2", "3", "4", "5", "6", "7", "8", "0", "-1", "", " ", "99999999999999999999",
+    "1.5", "abc", "money", "ticket", "mask", "edgewalk_ticket", "bible", "alex_phone",
+    "\x00", "🗼", "go", "GO NORTH", "  go north  ", "buy edgewalk ticket", "hint",
+]
+
+
+class InvariantViolation(Exception):
+    """Raised when the game reaches a state it should never be in."""
+
+
+def build_vocabulary():
+    """Collects every line worth typing: known commands, locations and edge cases.
+
+    Returns:
+        list: The vocabulary (unique strings).
+    """
+    vocabulary = []
+    table = headless.command_table()
+    for commands in table.values():
+        vocabulary.extend(commands)
+    vocabulary.extend(table)  # Location names, for the debug menu's "Set Location"
+    vocabulary.extend(headless.display_locations())
+    vocabulary.extend(EXTRA_LINES)
+    return list(dict.fromkeys(vocabulary))
+
+
+class InvariantChecker:
+    """Called after every command; raises InvariantViolation on impossible states.
+
+    Args:
+        displayed (set): Locations display_location has a branch for.
+        known (set): Locations the game itself can move the player to.
+        table (dict): Location -> commands, for labelling coverage edges.
+        edges (set, optional): Collects (location, command, next location) edges.
+    """
+
+    def __init__(self, displayed, known, table, edges=None):
+        self.displayed = displayed
+        self.known = known
+        self.table = table
+        self.edges = edges
+
+    def __call__(self, game, command, before):
+        if self.edges is not None:
+            label = command if command in self.table.get(before, ()) else "<other>"
+            self.edges.add((before, label, game.location))
+        if not game.finished and game.location not in self.displayed:
+            if game.location in self.known:
+                raise InvariantViolation(f"no display_location branch for {game.location!r}")
+            # Free text typed into the debug menu's "Set Location"; one finding covers it
+            raise InvariantViolation("no display_location branch for a location set in the debug menu")
+        if game.inventory.get("money", 0) < 0:
+            raise InvariantViolation("money went negative")
+
+
+def replay(lines, seed, sweet_mode):
+    """Replays a saved crash on the console, with the same invariant checks as the fuzzer."""
+    random.seed(seed)
+    checker = InvariantChecker(headless.display_locations(), headless.game_locations(),
+                               headless.command_table())
+    game = headless.HeadlessGame(dialogue_data=headless.load_local_dialogue(), sweet_mode=sweet_mode)
+    game.run_script(lines, on_turn=checker, output=sys.stdout)
+
+
+class Fuzzer:
+    """Runs command sequences and keeps a corpus of ones that reached new ground.
+
+    Coverage is tracked as (location, command, next location) edges; a sequence
+    that produces an unseen edge joins the corpus and gets mutated later.
+
+    Args:
+        seed (int): Seed for this fuzzer's random generator.
+        max_length (int, optional): Longest sequence to generate. Defaults to 40.
+    """
+
+    def __init__(self, seed, max_length=40):
+        self.rng = random.Random(seed)
+        self.max_length = max_length
+        self.vocabulary = build_vocabulary()
+        self.table = headless.command_table()
+        self.displayed = headless.display_locations()
+        self.known = headless.game_locations()
+        self.art = headless.load_local_art()
+        self.dialogue = headless.load_local_dialogue()
+        self.edges = set()
+        self.corpus = [[]]
+        self.crashes = {}  # signature -> (lines, seed, description)
+        self.runs = 0
+        self.turns = 0
+
+    def _random_line(self, location=None):
+        if location in self.table and self.table[location] and self.rng.random() < 0.7:
+            return self.rng.choice(self.table[location])
+        if self.rng.random() < 0.05:
+            return "".join(self.rng.choice("abcdefghijklmnopqrstuvwxyz 0123456789")
+                           for _ in range(self.rng.randint(0, 12)))
+        return self.rng.choice(self.vocabulary)
+
+    def generate(self):
+        """Makes a new sequence: either fresh random lines or a mutated corpus entry."""
+        rng = self.rng
+        if len(self.corpus) == 1 or rng.random() < 0.2:
+            return [self._random_line() for _ in range(rng.randint(1, self.max_length))]
+        lines = list(rng.choice(self.corpus))
+        for _ in range(rng.randint(1, 4)):
+            op = rng.random()
+            position = rng.randint(0, len(lines))
+            if op < 0.4 or not lines:
+                lines.insert(position, self._random_line())
+            elif op < 0.6:
+                del lines[min(position, len(lines) - 1)]
+            elif op < 0.8:
+                lines[min(position, len(lines) - 1)] = self._random_line()
+            else:
+                other = rng.choice(self.corpus)
+                lines = lines[:position] + other[rng.randint(0, len(other)):] if other else lines
+        return lines[:self.max_length * 2]
+
+    def execute(self, lines, seed, edges=None):
+        """Runs one sequence from a fresh game.
+
+        Args:
+            lines (list): The typed lines.
+            seed (int): Seed for the game's random module.
+            edges (set, optional): Collects the coverage edges the run visits.
+
+        Returns:
+            tuple: (signature, description) of the problem, or None if the run was clean.
+        """
+        random.seed(seed)
+        sweet = seed % 2 == 0
+        game = headless.HeadlessGame(dialogue_data=self.dialogue, art=self.art,
+                                     sweet_mode=sweet, capture=False)
+        checker = InvariantChecker(self.displayed, self.known, self.table, edges)
+        try:
+            game.run_script(lines, on_turn=checker)
+        except EOFError:
+            pass  # Ran out of typed lines in the middle of an input() prompt
+        except Exception as e:  # Anything else is a bug in the game
+            return self._signature(e), f"{type(e).__name__}: {e}"
+        finally:
+            self.turns += game.turns
+            self.runs += 1
+        return None
+
+    @staticmethod
+    def _signature(error):
+        """Identifies a crash by exception type and the innermost frame in the game code."""
+        frames = traceback.extract_tb(error.__traceback__)
+        location = "?"
+        for frame in reversed(frames):
+            if frame.filename.startswith(headless.HERE) and not frame.filename.endswith("fuzz.py"):
+                location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                break
+        if isinstance(error, InvariantViolation):
+            return f"InvariantViolation: {error}"
+        return f"{type(error).__name__} at {location}"
+
+    def step(self):
+        """Generates and runs one sequence, updating corpus and crashes."""
+        lines = self.generate()
+        seed = self.rng.getrandbits(32)
+        edges = set()
+        problem = self.execute(lines, seed, edges)
+        if problem is not None:
+            signature, description = problem
+            known = self.crashes.get(signature)
+            if known is None or len(lines) < len(known[0]):
+                self.crashes[signature] = (lines, seed, description)
+        if not edges <= self.edges:
+            self.edges |= edges
+            self.corpus.append(lines)
+
+    def minimize(self, lines, seed, signature):
+        """Shrinks a crashing sequence with delta debugging, keeping the same signature.
+
+        Args:
+            lines (list): The crashing lines.
+            seed (int): Seed the crash was found with.
+            signature (str): The crash signature to preserve.
+
+        Returns:
+            list: The smallest sequence found that still crashes the same way.
+        """
+        def crashes(candidate):
+            problem = self.execute(candidate, seed)
+            return problem is not None and problem[0] == signature
+
+        chunks = 2
+        while len(lines) >= 2:
+            size = max(1, len(lines) // chunks)
+            reduced = False
+            for start in range(0, len(lines), size):
+                candidate = lines[:start] + lines[start + size:]
+                if candidate and crashes(candidate):
+                    lines, chunks, reduced = candidate, max(chunks - 1, 2), True
+                    break
+            if not reduced:
+                if size == 1:
+                    break
+                chunks = min(len(lines), chunks * 2)
+        return lines
+
+
+def _worker(args):
+    """Fuzzes in one process until the deadline and returns what it found."""
+    seed, deadline = args
+    fuzzer = Fuzzer(seed)
+    while time.time() < deadline:
+        for _ in range(200):
+            fuzzer.step()
+    return fuzzer.crashes, fuzzer.edges, fuzzer.runs, fuzzer.turns
+
+
+def write_repro(out_dir, signature, lines, seed, description):
+    """Saves a crash as a script that replays it through HeadlessGame.
+
+    Returns:
+        str: The path of the script.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    name = "crash_" + hashlib.sha1(signature.encode("utf-8")).hexdigest()[:10] + ".py"
+    path = os.path.join(out_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'"""Fuzzer repro: {signature}\n\n{description}\n"""\n\n')
+        f.write("import os\nimport sys\n\n")
+        game_dir = os.path.relpath(headless.HERE, os.path.abspath(out_dir))
+        f.write(f"sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), {game_dir!r}))\n\n")
+        f.write("import fuzz  # noqa: E402\n\n")
+        f.write(f"SEED = {seed}\n")
+        f.write(f"SWEET_MODE = {seed % 2 == 0}\n")
+        f.write("LINES = [\n")
+        for line in lines:
+            f.write(f"    {line!r},\n")
+        f.write("]\n\n")
+        f.write('if __name__ == "__main__":\n')
+        f.write("    fuzz.replay(LINES, SEED, SWEET_MODE)\n")
+    return path
+
+
+def run(seconds, workers, out_dir):
+    """Fuzzes on several processes, then minimises and saves every distinct crash.
+
+    Args:
+        seconds (float): How long to fuzz.
+        workers (int): Number of processes.
+        out_dir (str): Folder for repro scripts.
+
+    Returns:
+        dict: Signature -> path of the saved repro script.
+    """
+    deadline = time.time() + seconds
+    started = time.perf_counter()
+    seeds = [(random.getrandbits(32), deadline) for _ in range(workers)]
+    if workers == 1:
+        results = [_worker(seeds[0])]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_worker, seeds)
+    elapsed = time.perf_counter() - started
+
+    crashes, edges, runs, turns = {}, set(), 0, 0
+    for worker_crashes, worker_edges, worker_runs, worker_turns in results:
+        for signature, found in worker_crashes.items():
+            if signature not in crashes or len(found[0]) < len(crashes[signature][0]):
+                crashes[signature] = found
+        edges |= worker_edges
+        runs += worker_runs
+        turns += worker_turns
+
+    print(f"{runs} runs, {turns} turns in {elapsed:.1f}s on {workers} process(es): "
+          f"{turns / elapsed:,.0f} turns/s, {len(edges)} edges covered")
+
+    minimizer = Fuzzer(0)
+    saved = {}
+    for signature, (lines, seed, description) in sorted(crashes.items()):
+        small = minimizer.minimize(lines, seed, signature)
+        saved[signature] = write_repro(out_dir, signature, small, seed, description)
+        print(f"- {signature} ({len(lines)} -> {len(small)} lines): {saved[signature]}")
+    if not crashes:
+        print("No crashes found.")
+    return saved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuzz the CN Tower game's command handling.")
+    parser.add_argument("--seconds", type=float, default=30, help="how long to fuzz (default: 30)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of processes (default: one per core)")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="folder for repro scripts")
+    options = parser.parse_args()
+    run(options.seconds, options.workers, options.out)
@@ -0,0 +1,651 @@
+"""Drives the CN Tower game in-process, without a terminal.
+
+The game logic in main.py talks to the outside world through print(), input(),
+story pauses and a couple of HTTP fetches.  HeadlessGame swaps those out for the
+duration of a turn so the same display_location/process_command code can be run
+by tools (the fuzzer, simulations) and by hosted front-ends that need the
+rendered text instead of a console.
+"""
+
+import ast  # Used for reading the location/command tables straight out of main.py
+import contextlib  # Used for redirect_stdout while a turn runs
+import copy  # Used for snapshotting the inventory before a turn that may need replaying
+import functools  # Used for reading the bundled art only once
+import json  # Used for reading the bundled dialogue.json
+import os  # Used for locating the bundled dialogue.json and cn_tower_art.txt
+import random  # Used for keeping random.shuffle (Alex's support options) replayable
+import sys  # Used for finding where the room description starts in a turn's output
+import threading  # Used for serialising turns, since the patches are module-wide
+import time  # Used by FakeClock to report a believable time.time()
+
+import history
+import location_plugins
+import main
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN_FILE = os.path.join(HERE, "main.py")
+DIALOGUE_FILE = os.path.join(HERE, "dialogue.json")
+ART_FILE = os.path.join(HERE, "cn_tower_art.txt")
+
+# Locations that end the inner game loop in main() instead of being displayed
+TERMINAL_LOCATIONS = ("exit", "restart")
+
+# main's module globals are patched while a turn runs, so only one turn at a time
+_TURN_LOCK = threading.RLock()
+_MISSING = object()
+
+
+class NeedInput(Exception):
+    """Raised when the game asks for a line that has not been typed yet."""
+
+
+class FakeClock:
+    """Stands in for the time module and story pauses inside main.py.
+
+    Sleeps return immediately but are added up, so callers can still tell how
+    long a real player would have waited.
+    """
+
+    def __init__(self):
+        self.slept = 0.0  # Total seconds the game asked to sleep
+
+    def sleep(self, seconds):
+        self.slept += seconds
+
+    def time(self):
+        return time.time() + self.slept
+
+
+class _Output:
+    """Minimal file-like object that collects everything printed during a turn."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+class _NullOutput:
+    """File-like object that throws output away (used when only state matters)."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ""
+
+
+def _discard(*args, **kwargs):
+    """Replacement for print() when output is not captured."""
+
+
+def load_local_dialogue(filename=DIALOGUE_FILE):
+    """Loads the dialogue data bundled next to main.py.
+
+    Returns:
+        dict: The dialogue data, or an empty dictionary if the file is missing or broken.
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@functools.lru_cache(maxsize=None)
+def load_local_art(filename=ART_FILE):
+    """Loads the CN Tower art bundled next to main.py.
+
+    Returns:
+        str: The art, or None if the file is missing.
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _location_branches(function_name, variable, path=MAIN_FILE):
+    """Yields (location, branch body) for an `if variable == "..."` chain in main.py."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == function_name:
+            break
+    else:
+        return
+    for statement in node.body:
+        branch = statement
+        while isinstance(branch, ast.If):
+            test = branch.test
+            if (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name)
+                    and test.left.id == variable and isinstance(test.ops[0], ast.Eq)
+                    and isinstance(test.comparators[0], ast.Constant)):
+                yield test.comparators[0].value, branch.body
+            if len(branch.orelse) == 1 and isinstance(branch.orelse[0], ast.If):
+                branch = branch.orelse[0]
+            else:
+                break
+
+
+def _plugin_functions(function_name):
+    """Yields (location, function node) for a function defined by each location plugin (not imported)."""
+    for location, path in location_plugins.sources().items():
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and node.name == function_name:
+                yield location, node
+
+
+def _commands(body):
+    commands = []
+    for statement in body:
+        for node in ast.walk(statement):
+            if (isinstance(node, ast.Compare) and isinstance(node.left, ast.Name)
+                    and node.left.id == "command" and isinstance(node.ops[0], ast.Eq)
+                    and isinstance(node.comparators[0], ast.Constant)):
+                value = node.comparators[0].value
+                if value not in commands:
+                    commands.append(value)
+    return commands
+
+
+def command_table(path=MAIN_FILE):
+    """Reads which commands process_command understands in each location.
+
+    Location plugins (locations/) are read too, without importing them.
+
+    Args:
+        path (str, optional): The file to read. Defaults to main.py.
+
+    Returns:
+        dict: Location name -> list of command strings, in the order they are checked.
+    """
+    table = {}
+    for location, body in _location_branches("process_command", "current_location", path):
+        table[location] = _commands(body)
+    for location, node in _plugin_functions("process_command"):
+        table.setdefault(location, _commands(node.body))
+    return table
+
+
+def display_locations(path=MAIN_FILE):
+    """Reads which locations display_location (or a location plugin) can show.
+
+    Returns:
+        set: The location names.
+    """
+    names = {location for location, _ in _location_branches("display_location", "location", path)}
+    return names | {location for location, _ in _plugin_functions("display")}
+
+
+def game_locations(path=MAIN_FILE):
+    """Reads every location name the game itself can move the player to.
+
+    That is every branch of display_location/process_command plus every literal
+    assigned to new_location or returned by display_location, in main.py and in
+    the location plugins.
+
+    Returns:
+        set: The location names (without "exit" and "restart").
+    """
+    names = set(display_locations(path)) | set(command_table(path))
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    functions = [node for node in ast.walk(tree)
+                 if isinstance(node, ast.FunctionDef) and node.name in ("display_location", "process_command")]
+    for function_name in ("display", "process_command"):
+        functions.extend(node for _, node in _plugin_functions(function_name))
+    for node in functions:
+        for child in ast.walk(node):
+            if (isinstance(child, ast.Assign) and isinstance(child.value, ast.Constant)
+                    and any(isinstance(t, ast.Name) and t.id == "new_location" for t in child.targets)):
+                names.add(child.value.value)
+            elif isinstance(child, ast.Return) and isinstance(child.value, ast.Constant):
+                names.add(child.value.value)
+    return {name for name in names if isinstance(name, str)} - set(TERMINAL_LOCATIONS)
+
+
+class HeadlessGame:
+    """One game session driven in-process.
+
+    It mirrors the loop in main(): show the location, read a command, process it.
+    Lines are fed in with send() (interactive use) or run_script() (batch use).
+    When the game calls input() in the middle of a turn (Alex's support options,
+    the debug menu) and no line is waiting yet, send() rolls the turn back and
+    returns what was printed so far; the turn is replayed when the next line
+    arrives, with the same random state, and only the new output is returned.
+
+    Args:
+        dialogue_data (dict, optional): Dialogue for sweet+ mode. Defaults to no dialogue.
+        art (str, optional): CN Tower art shown at the info booth. Defaults to the bundled file.
+        sweet_mode (bool, optional): Whether sweet+ mode starts enabled. Defaults to False.
+        is_restricted (bool, optional): Whether the player is in a restricted country. Defaults to False.
+        capture (bool, optional): Whether to keep printed text. Defaults to True.
+        save_store (SaveStore, optional): Where saved games go. Defaults to keeping them in the session.
+        save_owner (str, optional): Whose slots they are in save_store (e.g. the session id).
+    """
+
+    def __init__(self, dialogue_data=None, art=None, sweet_mode=False, is_restricted=False, capture=True,
+                 save_store=None, save_owner=None):
+        self.dialogue_data = dialogue_data if dialogue_data is not None else {}
+        self.art = art if art is not None else load_local_art()
+        self.sweet_mode = sweet_mode and not is_restricted
+        self.is_restricted = is_restricted
+        self.capture = capture
+        self.clock = FakeClock()
+        self.saves = {}  # In-memory stand-in for savegame.json (unless save_store is set)
+        self.save_store = save_store
+        self.save_owner = save_owner
+        self.location = "base"
+        self.inventory = {"money": 40}
+        self.finished = False
+        self.ending = None  # Where the game ended ("quit" if the player typed exit)
+        self.turns = 0
+        self.room = ""  # What the last display of a location printed (empty when output isn't captured)
+        self.history = history.History()  # Undo/redo, recorded at every prompt like main() does
+        self.awaiting_input = False  # True while the game waits inside input()
+        self._command = None  # Command of the turn in progress
+        self._lines = []  # Lines typed for input() prompts (or the whole script in run_script)
+        self._cursor = 0  # Next line in _lines to hand to input()
+        self._interactive = True
+        self._shown = 0  # Characters of the pending turn already returned by send()
+        self._turn_random = None  # Random state the pending turn started with
+        self._started = False
+        self._forked = False  # Forks keep their saved games to themselves
+
+    def _new_output(self):
+        return _Output() if self.capture else _NullOutput()
+
+    # --- patches -----------------------------------------------------------
+
+    def _input(self, prompt=""):
+        print(prompt, end="")
+        if self._cursor < len(self._lines):
+            line = self._lines[self._cursor]
+            self._cursor += 1
+            print()
+            return line
+        if self._interactive:
+            raise NeedInput(prompt)
+        raise EOFError  # Same as a closed stdin for the real game
+
+    def _load_art(self):
+        return self.art
+
+    def _save_game(self, location, inventory, filename="savegame.json"):
+        if self.save_store is not None and not self._forked:
+            self.save_store.put(self.save_owner, filename, {"location": location, "inventory": inventory})
+        else:
+            self.saves[filename] = (location, copy.deepcopy(inventory))
+        print("Game saved.")
+
+    def _load_game(self, filename="savegame.json"):
+        if self.save_store is not None and filename not in self.saves:
+            try:
+                data = self.save_store.get(self.save_owner, filename)
+            except KeyError:
+                data = None
+            saved = (data["location"], data["inventory"]) if data else None
+        else:
+            saved = self.saves.get(filename)
+        if saved is None:
+            print("No saved game found. Starting new game.")
+            return "base", {"money": 40}
+        location, inventory = saved
+        print("Game loaded.")
+        return location, copy.deepcopy(inventory)
+
+    @contextlib.contextmanager
+    def _patched(self, out):
+        patches = {
+            "input": self._input,
+            "ask": self._input,  # pauses.ask: prompts inside a scene
+            "pause": self.clock.sleep,  # pauses.pause: story pauses cost nothing
+            "time": self.clock,
+            "load_cn_tower_art": self._load_art,
+            "save_game": self._save_game,
+            "load_game": self._load_game,
+            "game_history": self.history,
+        }
+        if not self.capture:
+            patches["print"] = _discard  # Skips formatting text nobody will read
+        with _TURN_LOCK:
+            saved = {name: main.__dict__.get(name, _MISSING) for name in patches}
+            main.__dict__.update(patches)
+            try:
+                with contextlib.redirect_stdout(out):
+                    yield out
+            finally:
+                for name, value in saved.items():
+                    if value is _MISSING:
+                        del main.__dict__[name]
+                    else:
+                        main.__dict__[name] = value
+
+    # --- game loop ---------------------------------------------------------
+
+    def _welcome(self):
+        print("Welcome to the CN Tower Experience Simulator!")
+        print('Type "Help" for commands.')
+
+    def _display(self, restored=False):
+        """Shows the current location, following restarts the way main() does."""
+        show = main.display_restored_location if restored else main.display_location
+        while True:
+            shown = self.location
+            out = sys.stdout
+            start = len(out.parts) if isinstance(out, _Output) else None
+            self.location = show(self.location, self.inventory, self.sweet_mode, self.dialogue_data)
+            show = main.display_location
+            if self.location == "exit":
+                if shown != "exit":
+                    self.ending = shown
+                print("Thanks for playing!")
+                self.finished = True
+                return
+            if self.location != "restart":
+                self.room = "".join(out.parts[start:]) if start is not None else ""
+                self.history.record(self.location, self.inventory)
+                return
+            print("Restarting the game...")
+            self.location = "base"
+            self.inventory = {"money": 40}
+            self.history.clear()
+            self._welcome()
+
+    def _turn(self, command):
+        """Processes one command and shows where it leads (None just shows the location)."""
+        if command is not None:
+            before = self.location
+            self.location, self.inventory, self.sweet_mode = main.process_command(
+                command, self.location, self.inventory, self.sweet_mode, self.dialogue_data, self.is_restricted)
+            self.turns += 1
+            if self.location == "exit":
+                self.ending = "quit" if command == "exit" else before
+        self._display(restored=command in ("undo", "redo"))
+
+    def _advance(self):
+        """Runs the pending turn for start()/send(), rolling it back if it needs more input.
+
+        A turn that raises anything else is rolled back too and forgotten (the
+        exception still propagates), so the next line starts a fresh turn
+        instead of replaying the one that failed.
+        """
+        out = self._new_output()
+        outer_random = None
+        if self._turn_random is not None:
+            # Replaying a turn: reuse the random state it started with (same shuffles),
+            # without disturbing the sequence other sessions are drawing from
+            outer_random = random.getstate()
+            random.setstate(self._turn_random)
+        before = (self._started, self.location, copy.deepcopy(self.inventory), self.sweet_mode,
+                  self.turns, self.ending, self.clock.slept, random.getstate(), self.history.checkpoint())
+        self._cursor = 0
+        self._interactive = True
+        try:
+            with self._patched(out):
+                if not self._started:
+                    self._started = True
+                    self._welcome()
+                    self._display()
+                else:
+                    self._turn(self._command)
+        except NeedInput:
+            (self._started, self.location, self.inventory, self.sweet_mode,
+             self.turns, self.ending, self.clock.slept, self._turn_random, checkpoint) = before
+            self.history.restore(checkpoint)
+            self.finished = False
+            self.awaiting_input = True
+            text = out.getvalue()
+            new, self._shown = text[self._shown:], len(text)
+            return new
+        except Exception:
+            (self._started, self.location, self.inventory, self.sweet_mode,
+             self.turns, self.ending, self.clock.slept, _, checkpoint) = before
+            self.history.restore(checkpoint)
+            self.finished = False
+            self.awaiting_input = False
+            self._command = None
+            self._lines = []
+            self._turn_random = None
+            self._shown = 0
+            raise
+        finally:
+            if outer_random is not None:
+                random.setstate(outer_random)
+        text = out.getvalue()
+        new, self._shown = text[self._shown:], 0
+        self._command = None
+        self._lines = []
+        self._turn_random = None
+        self.awaiting_input = False
+        return new
+
+    def start(self):
+        """Shows the welcome message and the starting location.
+
+        Returns:
+            str: The text printed (empty if the game was already started).
+        """
+        if self._started or self.awaiting_input:
+            return ""
+        return self._advance()
+
+    def send(self, line):
+        """Types one line into the game.
+
+        The first line of a turn is a command (lower-cased like get_player_input());
+        while awaiting_input is set, lines answer the input() prompt inside that turn.
+
+        Args:
+            line (str): The line the player typed.
+
+        Returns:
+            str: The new text printed in response.
+        """
+        text = self.start()
+        if self.finished:
+            return text
+        if self.awaiting_input:
+            self._lines.append(line)
+        else:
+            self._command = line.lower()
+            self._lines = []
+        return text + self._advance()
+
+    def run_script(self, lines, on_turn=None, output=None):
+        """Plays a whole list of typed lines, as if they were piped into main.py.
+
+        Unlike send(), a missing line for input() ends the run with EOFError, and
+        exceptions from the game propagate to the caller.
+
+        Args:
+            lines (list): The typed lines.
+            on_turn (callable, optional): Called as on_turn(game, command, before) after each command.
+            output (file, optional): Where printed text goes. Defaults to a buffer.
+
+        Returns:
+            str: Everything printed (empty when output is given or capture is off).
+        """
+        out = output if output is not None else self._new_output()
+        self._lines = list(lines)
+        self._cursor = 0
+        self._interactive = False
+        try:
+            with self._patched(out):
+                if not self._started:
+                    self._started = True
+                    self._welcome()
+                    self._display()
+                while not self.finished and self._cursor < len(self._lines):
+                    command = self._lines[self._cursor].lower()
+                    self._cursor += 1
+                    before = self.location
+                    self._turn(command)
+                    if on_turn is not None:
+                        on_turn(self, command, before)
+        finally:
+            self._lines = []
+        return out.getvalue() if output is None else ""
+
+    def step(self, command, answers=()):
+        """Runs exactly one command, like one pass of main()'s loop after the prompt.
+
+        Args:
+            command (str): The command (lower-cased like get_player_input()).
+            answers (iterable, optional): Lines for input() prompts inside the turn.
+
+        Returns:
+            str: The text printed.
+
+        Raises:
+            EOFError: If the turn asked for more lines than answers holds.
+        """
+        out = self._new_output()
+        self._lines = list(answers)
+        self._cursor = 0
+        self._interactive = False
+        try:
+            with self._patched(out):
+                self._turn(command.lower())
+        finally:
+            self._lines = []
+        return out.getvalue()
+
+    @classmethod
+    def at(cls, location, inventory, **kwargs):
+        """Creates a game that is already waiting for a command at a given state.
+
+        Args:
+            location (str): The location the player is in.
+            inventory (dict): The player's inventory (used as-is, not copied).
+            **kwargs: Passed on to HeadlessGame().
+
+        Returns:
+            HeadlessGame: The game.
+        """
+        game = cls(**kwargs)
+        game.location = location
+        game.inventory = inventory
+        game._started = True
+        return game
+
+    def fork(self):
+        """Creates an independent copy of this session, to play a what-if branch from the same point.
+
+        The copy shares everything that is never changed in place: the content
+        (dialogue, art), the undo history (immutable lists, see history.py), the
+        room text and a pending turn's random state.  Only the inventory dict
+        (a few entries, all immutable values) and the map of saved games are
+        copied, so a fork costs the same however long the session has run.
+        A fork of a session that saves to a SaveStore can load those games,
+        but its own saves stay in the fork.
+
+        Returns:
+            HeadlessGame: The copy, at the same point of the game (even in the middle of a prompt).
+        """
+        child = copy.copy(self)
+        child.inventory = dict(self.inventory)
+        child.saves = dict(self.saves)
+        child.history = history.History()
+        child.history.restore(self.history.checkpoint())
+        child.clock = FakeClock()
+        child.clock.slept = self.clock.slept
+        child._lines = list(self._lines)
+        child._forked = True
+        return child
+
+    def snapshot(self):
+        """Captures this session's own state as plain JSON-compatible data.
+
+        Shared content (dialogue, art) is not included; pass it again to
+        from_snapshot().  A turn waiting on input() is kept, with the random
+        state it started with, so it replays identically after a restore.
+
+        Returns:
+            dict: The snapshot.
+        """
+        data = {
+            "location": self.location,
+            "inventory": self.inventory,
+            "sweet_mode": self.sweet_mode,
+            "is_restricted": self.is_restricted,
+            "finished": self.finished,
+            "ending": self.ending,
+            "turns": self.turns,
+            "started": self._started,
+            "slept": self.clock.slept,
+        }
+        if self.history:
+            data["history"] = self.history.to_data()
+        if self.saves:
+            data["saves"] = {name: list(save) for name, save in self.saves.items()}
+        if self.awaiting_input:
+            version, internal, gauss = self._turn_random
+            data["pending"] = {"command": self._command, "lines": self._lines, "shown": self._shown,
+                               "random": [version, list(internal), gauss]}
+        return data
+
+    @classmethod
+    def from_snapshot(cls, data, **kwargs):
+        """Recreates a session from snapshot().
+
+        Args:
+            data (dict): The snapshot.
+            **kwargs: Shared content passed on to HeadlessGame() (dialogue_data, art, ...).
+
+        Returns:
+            HeadlessGame: The restored session.
+        """
+        game = cls(sweet_mode=data["sweet_mode"], is_restricted=data["is_restricted"], **kwargs)
+        game.sweet_mode = data["sweet_mode"]
+        game.location = data["location"]
+        game.inventory = data["inventory"]
+        game.finished = data["finished"]
+        game.ending = data["ending"]
+        game.turns = data["turns"]
+        game._started = data["started"]
+        game.clock.slept = data["slept"]
+        game.saves = {name: (save[0], save[1]) for name, save in data.get("saves", {}).items()}
+        if "history" in data:
+            game.history = history.History.from_data(data["history"])
+        pending = data.get("pending")
+        if pending:
+            game.awaiting_input = True
+            game._command = pending["command"]
+            game._lines = pending["lines"]
+            game._shown = pending["shown"]
+            version, internal, gauss = pending["random"]
+            game._turn_random = (version, tuple(internal), gauss)
+        return game
+
+    def state(self):
+        """Summarises the session for front-ends.
+
+        Returns:
+            dict: Location, inventory, money, sweet_mode and progress flags.
+        """
+        return {
+            "location": self.location,
+            "inventory": dict(self.inventory),
+            "money": self.inventory.get("money", 0),
+            "sweet_mode": self.sweet_mode,
+            "finished": self.finished,
+            "ending": self.ending,
+            "awaiting_input": self.awaiting_input,
+            "turns": self.turns,
+        }
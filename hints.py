@@ -0,0 +1,298 @@
+"""Precomputed hints: the next command toward the nearest good ending, for every game state.
+
+`python hints.py --build` explores the game offline: starting from a new game
+(and from every location, for players moved there with the debug menu) it plays
+every command in every reachable state through HeadlessGame and records where
+each one leads.  A backwards breadth-first search from each good ending (one
+the game announces with "(Win)" or "(Good Ending)") then gives, for every state, the first
+command of a shortest path to that ending.  The result is written to
+hints.json.gz as a lookup table keyed by state fingerprint, so the in-game
+`hint` command is a dictionary lookup, with no search while playing however
+large the world gets.
+
+A state fingerprint is the location, the inventory flags (as a bitset) and the
+money.  Money is capped at the sum of every price the game checks, since
+having more than that never changes what a command does.
+
+The table records a digest of the game logic it was built from;
+`--check` fails when display_location, process_command or a location plugin
+has changed since, so the table can be rebuilt.
+
+Usage:
+    python hints.py --build
+    python hints.py --check
+    python hints.py --location glass_floor --inventory '{"money": 0, "ticket": true}'
+"""
+
+import argparse  # Used for the command-line options
+import ast  # Used for finding prices and digesting the game logic
+import collections  # Used for the breadth-first searches
+import functools  # Used for loading the table once
+import gzip  # Used for compressing the table
+import hashlib  # Used for the digest of the game logic
+import json  # Used for the table format and fingerprints of inventory values
+import os  # Used for locating the table next to this file
+import random  # Used for probing turns with the game's shuffles seeded
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TABLE_FILE = os.path.join(HERE, "hints.json.gz")
+START = ("base", {"money": 40})
+WAIT = ""  # Probe for rooms that continue on any input (just pressing Enter)
+SKIPPED_COMMANDS = {"debug", "save", "load", "restart", "exit"}  # Never the way to an ending
+ANSWERS = ["1"] * 6  # Lines for prompts inside a turn (Alex's questions)
+GOOD_MARKERS = ("(Win)", "(Good Ending)")  # How the game announces a good ending
+
+
+# --- building -----------------------------------------------------------------
+
+def _logic_sources(main_file):
+    with open(main_file, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    sources = [ast.dump(node) for node in tree.body
+               if isinstance(node, ast.FunctionDef) and node.name in ("display_location", "process_command")]
+    import location_plugins
+
+    for location, path in sorted(location_plugins.sources().items()):
+        with open(path, "r", encoding="utf-8") as f:
+            sources.append(location + "\n" + f.read())
+    return sources
+
+
+def logic_digest(main_file=None):
+    """Digest of the game logic the hints depend on (display_location, process_command, plugins)."""
+    main_file = main_file or os.path.join(HERE, "main.py")
+    digest = hashlib.sha256()
+    for source in _logic_sources(main_file):
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def money_cap(main_file=None):
+    """Sum of every `inventory["money"] >= N` price in the game logic."""
+    main_file = main_file or os.path.join(HERE, "main.py")
+    total = 0
+    import location_plugins
+
+    for path in [main_file, *location_plugins.sources().values()]:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Compare) and isinstance(node.ops[0], ast.GtE)
+                    and isinstance(node.left, ast.Subscript) and isinstance(node.left.slice, ast.Constant)
+                    and node.left.slice.value == "money" and isinstance(node.comparators[0], ast.Constant)):
+                total += node.comparators[0].value
+    return total
+
+
+class _Explorer:
+    """Plays every command in every reachable state and records the transitions."""
+
+    def __init__(self):
+        import headless
+
+        self.headless = headless
+        self.cap = money_cap()
+        self.commands_at = headless.command_table()
+        self.atoms = {}  # (inventory key, JSON value) -> bit
+        self.states = {}  # fingerprint -> (location, inventory)
+        self.edges = {}  # fingerprint -> {command: fingerprint or ("end", ending)}
+        self.endings = {}  # ending -> (good, its last line)
+
+    def fingerprint(self, location, inventory):
+        flags = 0
+        for key, value in inventory.items():
+            if key != "money":
+                atom = (key, json.dumps(value))
+                flags |= 1 << self.atoms.setdefault(atom, len(self.atoms))
+        return f"{location}|{flags:x}|{min(inventory.get('money', 0), self.cap)}"
+
+    def _play(self, location, inventory, command):
+        random.seed(0)
+        game = self.headless.HeadlessGame.at(location, json.loads(json.dumps(inventory)), art="")
+        try:
+            text = game.step(command, ANSWERS)
+        except EOFError:
+            return None
+        if game.finished:
+            lines = [line for line in text.splitlines() if line.strip() and line.strip() != "---"]
+            lines = [line for line in lines if line not in ("Invalid location.", "Thanks for playing!")]
+            last = lines[-1] if lines else game.ending
+            self.endings.setdefault(game.ending, (any(marker in last for marker in GOOD_MARKERS), last))
+            return ("end", game.ending)
+        inventory = dict(game.inventory)
+        inventory["money"] = min(inventory.get("money", 0), self.cap)
+        return game.location, inventory
+
+    def explore(self):
+        queue = collections.deque()
+        seeds = [START] + [(location, {"money": START[1]["money"]})
+                           for location in sorted(self.headless.display_locations())]
+        for location, inventory in seeds:
+            key = self.fingerprint(location, inventory)
+            if key not in self.states:
+                self.states[key] = (location, inventory)
+                queue.append(key)
+        while queue:
+            key = queue.popleft()
+            location, inventory = self.states[key]
+            commands = [c for c in self.commands_at.get(location, ()) if c not in SKIPPED_COMMANDS] or [WAIT]
+            moves = {}
+            for command in commands:
+                result = self._play(location, inventory, command)
+                if result is None:
+                    continue
+                if result[0] == "end":
+                    moves[command] = result
+                    continue
+                next_key = self.fingerprint(*result)
+                if next_key != key:
+                    moves[command] = next_key
+                if next_key not in self.states:
+                    self.states[next_key] = result
+                    queue.append(next_key)
+            self.edges[key] = moves
+
+
+def build():
+    """Explores the game and computes the hint table.
+
+    Returns:
+        dict: The table (see the module docstring).
+    """
+    explorer = _Explorer()
+    explorer.explore()
+    commands = sorted({command for moves in explorer.edges.values() for command in moves})
+    command_ids = {command: i for i, command in enumerate(commands)}
+    incoming = collections.defaultdict(list)  # target -> [(source, command)]
+    for source, moves in explorer.edges.items():
+        for command, target in moves.items():
+            incoming[target if isinstance(target, str) else tuple(target)].append((source, command))
+    table = {}
+    for ending, (good, _) in explorer.endings.items():
+        if not good:
+            continue
+        steps = {}  # fingerprint -> [command id, moves to the ending]
+        frontier = collections.deque()
+        for source, command in incoming[("end", ending)]:
+            if source not in steps:
+                steps[source] = [command_ids[command], 1]
+                frontier.append(source)
+        while frontier:
+            target = frontier.popleft()
+            for source, command in incoming[target]:
+                if source not in steps:
+                    steps[source] = [command_ids[command], steps[target][1] + 1]
+                    frontier.append(source)
+        table[ending] = steps
+    by_location = collections.defaultdict(collections.Counter)  # Fallback for fingerprints never seen
+    for steps in table.values():
+        for key, (command, _) in steps.items():
+            by_location[key.split("|", 1)[0]][command] += 1
+    return {
+        "version": 1,
+        "logic": logic_digest(),
+        "money_cap": explorer.cap,
+        "atoms": [[key, value] for (key, value), _ in sorted(explorer.atoms.items(), key=lambda item: item[1])],
+        "commands": commands,
+        "endings": {ending: last for ending, (good, last) in explorer.endings.items() if good},
+        "usually": {location: counts.most_common(1)[0][0] for location, counts in by_location.items()},
+        "next": table,
+        "dead": sorted(key for key in explorer.states if not any(key in steps for steps in table.values())),
+        "states": len(explorer.states),
+    }
+
+
+def save(table, path=TABLE_FILE):
+    data = json.dumps(table, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(gzip.compress(data, mtime=0))  # No timestamp, so rebuilding an unchanged game changes nothing
+
+
+# --- looking up -----------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def load_table(path=TABLE_FILE):
+    """Loads the hint table, with its atoms turned into a lookup dict.
+
+    Returns:
+        dict: The table, or None if it hasn't been built.
+    """
+    try:
+        with gzip.open(path, "rb") as f:
+            table = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    table["atom_bits"] = {(key, value): bit for bit, (key, value) in enumerate(table["atoms"])}
+    table["dead"] = set(table["dead"])
+    return table
+
+
+def fingerprint(table, location, inventory):
+    """The state fingerprint the table is keyed by, or None if the inventory holds something never seen."""
+    flags = 0
+    for key, value in inventory.items():
+        if key != "money":
+            bit = table["atom_bits"].get((key, json.dumps(value)))
+            if bit is None:
+                return None
+            flags |= 1 << bit
+    return f"{location}|{flags:x}|{min(inventory.get('money', 0), table['money_cap'])}"
+
+
+def _say(command):
+    return "just press Enter" if command == WAIT else f'type "{command}"'
+
+
+def hint(location, inventory):
+    """Returns the hint for a state: the next command toward the nearest good ending.
+
+    Args:
+        location (str): The current location.
+        inventory (dict): The player's inventory.
+
+    Returns:
+        str: The hint.
+    """
+    table = load_table()
+    if table is None:
+        return "No hints available."
+    key = fingerprint(table, location, inventory)
+    best = None
+    for ending, steps in table["next"].items():
+        step = steps.get(key) if key is not None else None
+        if step is not None and (best is None or step[1] < best[1][1]):
+            best = (ending, step)
+    if best is not None:
+        ending, (command, moves) = best
+        away = "1 move" if moves == 1 else f"{moves} moves"
+        return f"Hint: {_say(table['commands'][command])}. A good ending ({ending}) is {away} away."
+    if key in table["dead"]:
+        return "Hint: there is no good ending from here. Try 'Restart'."
+    if location in table["usually"]:
+        return f"Hint: from here, the way forward is usually to {_say(table['commands'][table['usually'][location]])}."
+    return "Hint: try 'Help' and 'Look Around'."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the precomputed hint table.")
+    parser.add_argument("--build", action="store_true", help="explore the game and write hints.json.gz")
+    parser.add_argument("--check", action="store_true", help="fail if the table is missing or out of date")
+    parser.add_argument("--location", help="location to get a hint for")
+    parser.add_argument("--inventory", default=json.dumps(START[1]), help="inventory as JSON (default: a new game's)")
+    options = parser.parse_args()
+    if options.build:
+        import time
+        started = time.perf_counter()
+        built = build()
+        save(built)
+        load_table.cache_clear()
+        print(f"{built['states']} states, {sum(len(steps) for steps in built['next'].values())} hints for "
+              f"{len(built['next'])} good ending(s) ({', '.join(built['next'])}) in "
+              f"{time.perf_counter() - started:.1f}s; {os.path.getsize(TABLE_FILE) // 1024} KiB written")
+    if options.check:
+        current = load_table()
+        if current is None or current["logic"] != logic_digest():
+            raise SystemExit("hints.json.gz is missing or out of date; run python hints.py --build")
+        print("hints.json.gz is up to date.")
+    if options.location:
+        print(hint(options.location, json.loads(options.inventory)))
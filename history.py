@@ -0,0 +1,138 @@
+"""Undo/redo history for a game: one small delta per turn.
+
+Each turn that changes anything records a delta: the location before and
+after, and only the inventory entries that changed (with their old and new
+values).  Turns that change nothing record nothing.  The deltas sit on two
+immutable linked lists (undo and redo), built from (delta, rest) tuples, so
+every version of the history shares everything below its head: undo moves one
+node from one list to the other, and a checkpoint of the whole history is just
+the two heads.
+
+Undo and redo take the same time however long the game has gone on (they
+touch one delta), and a long history costs only the few entries each turn
+changed, never a copy of the whole game per turn.
+
+main() records the state at every prompt; process_command() handles the
+`undo` and `redo` commands.
+"""
+
+_MISSING = object()  # An inventory entry that didn't exist on one side of a delta
+
+
+class History:
+    """A game's undo and redo stacks."""
+
+    def __init__(self):
+        self._undo = None  # (delta, rest) of the most recent turn, or None
+        self._redo = None
+        self._location = None  # State as last recorded (the live inventory is mutated in place)
+        self._inventory = None
+        self.depth = 0  # Turns that can be undone
+
+    def __bool__(self):
+        return self._undo is not None or self._redo is not None
+
+    def clear(self):
+        """Forgets everything (a new game)."""
+        self.__init__()
+
+    def record(self, location, inventory):
+        """Records the changes since the last record as one undoable turn.
+
+        Args:
+            location (str): The current location.
+            inventory (dict): The player's inventory.
+
+        Returns:
+            bool: True if anything had changed.
+        """
+        if self._inventory is None:
+            self._location, self._inventory = location, dict(inventory)
+            return False
+        before = self._inventory
+        changes = tuple((key, before.get(key, _MISSING), inventory.get(key, _MISSING))
+                        for key in before.keys() | inventory.keys()
+                        if before.get(key, _MISSING) != inventory.get(key, _MISSING))
+        if location == self._location and not changes:
+            return False
+        self._undo = ((self._location, location, changes), self._undo)
+        self._redo = None  # A new turn ends the redo branch
+        self.depth += 1
+        self._location, self._inventory = location, dict(inventory)
+        return True
+
+    def _move(self, location, inventory, forward):
+        self.record(location, inventory)  # Changes made outside a turn (e.g. by an admin) are undoable too
+        source = self._redo if forward else self._undo
+        if source is None:
+            return None
+        (old, new, changes), rest = source
+        if forward:
+            self._redo, self._undo = rest, (source[0], self._undo)
+            self.depth += 1
+        else:
+            self._undo, self._redo = rest, (source[0], self._redo)
+            self.depth -= 1
+        inventory = dict(self._inventory)
+        for key, before, after in changes:
+            value = after if forward else before
+            if value is _MISSING:
+                inventory.pop(key, None)
+            else:
+                inventory[key] = value
+        self._location, self._inventory = (new if forward else old), inventory
+        return self._location, dict(inventory)
+
+    def undo(self, location, inventory):
+        """Goes back one turn.
+
+        Returns:
+            tuple: The location and inventory before the last turn, or None if there is nothing to undo.
+        """
+        return self._move(location, inventory, forward=False)
+
+    def redo(self, location, inventory):
+        """Goes forward again after undo().
+
+        Returns:
+            tuple: The location and inventory after the undone turn, or None if there is nothing to redo.
+        """
+        return self._move(location, inventory, forward=True)
+
+    def checkpoint(self):
+        """Returns the whole history as a value restore() accepts (no copying: the stacks are immutable)."""
+        return self._undo, self._redo, self._location, self._inventory, self.depth
+
+    def restore(self, checkpoint):
+        """Puts the history back to a checkpoint()."""
+        self._undo, self._redo, self._location, self._inventory, self.depth = checkpoint
+
+    def to_data(self):
+        """Returns the history as JSON-compatible data (for hibernating a hosted session)."""
+        def stack(node):
+            deltas = []
+            while node is not None:
+                (old, new, changes), node = node
+                deltas.append([old, new, [[key, [] if before is _MISSING else [before],
+                                           [] if after is _MISSING else [after]] for key, before, after in changes]])
+            return deltas
+
+        return {"undo": stack(self._undo), "redo": stack(self._redo), "location": self._location,
+                "inventory": self._inventory}
+
+    @classmethod
+    def from_data(cls, data):
+        """Recreates a history from to_data()."""
+        history = cls()
+
+        def stack(deltas):
+            node = None
+            for old, new, changes in reversed(deltas):
+                node = ((old, new, tuple((key, before[0] if before else _MISSING, after[0] if after else _MISSING)
+                                         for key, before, after in changes)), node)
+            return node
+
+        history._undo, history._redo = stack(data["undo"]), stack(data["redo"])
+        history._location, history._inventory = data["location"], data["inventory"]
+        history.depth = len(data["undo"])
+        return history
@@ -0,0 +1,187 @@
+"""Shared HTTP client for everything the game fetches over the network.
+
+main.py fetches its dialogue, the CN Tower art (on every visit to the info
+booth) and the player's country.  Going through one HttpClient means:
+
+* one pooled requests.Session, so repeat fetches reuse a keep-alive connection
+  instead of paying for a new TCP+TLS handshake every time;
+* a separate connect timeout and read timeout on every request;
+* retries on connection errors, timeouts and 5xx responses, with jittered
+  exponential backoff so many clients don't retry in lockstep;
+* gzip-encoded responses (requests decompresses them transparently);
+* per-endpoint latency, retry and error counts (summary()).
+
+The module-level get() uses a client shared by the whole process.
+"""
+
+import random  # Used for jittering retry delays (with a private generator, so game randomness is untouched)
+import threading  # Used for guarding the per-endpoint stats
+import time  # Used for backoff sleeps and latency measurements
+import urllib.parse  # Used for grouping stats by endpoint (URL without query string)
+
+import requests  # Used for the pooled session
+from requests.adapters import HTTPAdapter  # Used for sizing the connection pool
+
+CONNECT_TIMEOUT = 3.05  # Seconds to establish a connection (just over a TCP retransmit window)
+READ_TIMEOUT = 5.0  # Seconds to wait between bytes of the response
+RETRIES = 2  # Extra attempts after the first one
+BACKOFF_BASE = 0.25  # Seconds; attempt n waits up to BACKOFF_BASE * 2**n
+BACKOFF_CAP = 4.0  # Longest single backoff, in seconds
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+MAX_SAMPLES = 1000  # Latency samples kept per endpoint
+
+
+def percentile(values, fraction):
+    """Returns the value at a fraction (0-1) of the sorted values, or 0.0 if there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EndpointStats:
+    """Latency and reliability numbers for one endpoint (URL without query string)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.errors = 0  # Calls that failed after all retries
+        self.latencies = []  # Seconds per call, retries and backoff included
+
+    def record(self, attempts, seconds, ok):
+        self.calls += 1
+        self.attempts += attempts
+        self.retries += attempts - 1
+        if not ok:
+            self.errors += 1
+        self.latencies.append(seconds)
+        del self.latencies[:-MAX_SAMPLES]
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "errors": self.errors,
+            "p50_ms": percentile(self.latencies, 0.5) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "max_ms": percentile(self.latencies, 1.0) * 1000,
+        }
+
+
+class HttpClient:
+    """Pooled, retrying HTTP client.
+
+    Args:
+        connect_timeout (float, optional): Seconds to connect. Defaults to CONNECT_TIMEOUT.
+        read_timeout (float, optional): Seconds to wait for response data. Defaults to READ_TIMEOUT.
+        retries (int, optional): Extra attempts on retryable failures. Defaults to RETRIES.
+        backoff_base (float, optional): Base backoff delay in seconds. Defaults to BACKOFF_BASE.
+        backoff_cap (float, optional): Longest backoff delay in seconds. Defaults to BACKOFF_CAP.
+        pool_size (int, optional): Keep-alive connections kept per host. Defaults to 4.
+        sleep (callable, optional): Used for backoff delays. Defaults to time.sleep.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP, pool_size=4, sleep=time.sleep):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip"
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)  # Retries are ours
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {}  # endpoint -> EndpointStats
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number `attempt` (0-based): "full jitter" backoff."""
+        return self._random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, retries=None, timeout=None, **kwargs):
+        """Sends a GET request, retrying connection errors, timeouts and 5xx responses.
+
+        Other responses (including 4xx such as 429) are returned straight away, so
+        callers can handle them.
+
+        Args:
+            url (str): The URL.
+            retries (int, optional): Overrides the client's retry count for this call.
+            timeout (tuple, optional): Overrides (connect timeout, read timeout) for this call.
+            **kwargs: Passed on to requests.Session.get().
+
+        Returns:
+            requests.Response: The last response (which may still be a 5xx after all retries).
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed without a response.
+        """
+        retries = self.retries if retries is None else retries
+        started = time.perf_counter()
+        attempt = 0
+        ok = False
+        try:
+            while True:
+                try:
+                    response = self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt >= retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        ok = response.status_code < 500
+                        return response
+                    response.close()
+                self.sleep(self.backoff(attempt))
+                attempt += 1
+        finally:
+            self._record(url, attempt + 1, time.perf_counter() - started, ok)
+
+    def _record(self, url, attempts, seconds, ok):
+        parts = urllib.parse.urlsplit(url)
+        endpoint = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        with self._lock:
+            stats = self.stats.get(endpoint)
+            if stats is None:
+                stats = self.stats[endpoint] = EndpointStats()
+            stats.record(attempts, seconds, ok)
+
+    def summary(self):
+        """Describes latency and retries per endpoint, one line each."""
+        with self._lock:
+            items = sorted((endpoint, stats.as_dict()) for endpoint, stats in self.stats.items())
+        return "\n".join(
+            f"{endpoint}: {s['calls']} calls, {s['retries']} retries, {s['errors']} errors, "
+            f"p50 {s['p50_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms, max {s['max_ms']:.1f} ms"
+            for endpoint, s in items)
+
+    def close(self):
+        self.session.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Returns the client shared by the whole process, creating it on first use."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = HttpClient()
+    return _default
+
+
+def get(url, **kwargs):
+    """Sends a GET request through the shared client (see HttpClient.get)."""
+    return default_client().get(url, **kwargs)
+
+
+def summary():
+    """Per-endpoint latency of the shared client (see HttpClient.summary)."""
+    return default_client().summary()
@@ -0,0 +1,214 @@
+"""Kiosk mode: a command prompt that notices when the visitor has walked away.
+
+get_player_input() normally blocks in session.prompt() until Enter is pressed,
+so a game abandoned half-way stays on screen forever.  With an IdlePolicy
+timeout set (`python main.py --idle-timeout 120`), the prompt runs as
+prompt_toolkit's prompt_async() instead, next to a timer and the housekeeping
+jobs:
+
+* every keystroke restarts the timer, so slow typists aren't cut off;
+* for the last `warning` seconds a countdown shows at the right of the prompt;
+* when the timer runs out the game is saved to the "autosave" slot, then,
+  depending on the action, the prompt keeps waiting ("autosave"), the game
+  starts over at the base ("reset"), or it starts over and asks the next
+  visitor's age ("next_visitor");
+* while the visitor is thinking, housekeeping jobs run: slow work (such as
+  refetching the dialogue) in a background thread, and the result is applied
+  on the game's thread while it is still waiting for input, never mid-turn.
+
+Idle timeouts apply to the command prompt; prompts inside a scene (Alex's
+questions, the debug menu) still wait as before.
+
+Usage:
+    python main.py --idle-timeout 120 --idle-action next_visitor
+"""
+
+import asyncio  # Used for waiting on the prompt, the idle timer and housekeeping at once
+import concurrent.futures  # Used for running slow housekeeping off the game's thread
+import sys  # Used for flushing output while idle
+import time  # Used for spacing out housekeeping runs
+
+import http_client  # Used for refetching the dialogue while idle
+
+IDLE_ACTIONS = ("autosave", "reset", "next_visitor")
+AUTOSAVE_SLOT = "autosave"  # Save slot an idle game is written to ("load autosave" brings it back)
+WARNING = 30  # Seconds of countdown before the idle action
+HOUSEKEEPING_DELAY = 5  # Seconds without a keystroke before housekeeping starts
+DIALOGUE_EVERY = 600  # Seconds between dialogue refetches
+
+# One background thread: housekeeping never competes with itself, and asyncio.run() doesn't wait for it
+_worker = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="housekeeping")
+
+
+class Job:
+    """Housekeeping to run while the game waits for a command.
+
+    Args:
+        name (str): What the job does, for messages.
+        work (callable, optional): Slow part, run in the background thread; its result goes to apply.
+        apply (callable, optional): Quick part, run on the game's thread with work's result (or None).
+        every (float, optional): Seconds between runs. Defaults to 0 (every time the visitor is idle).
+    """
+
+    def __init__(self, name, work=None, apply=None, every=0):
+        self.name = name
+        self.work = work
+        self.apply = apply
+        self.every = every
+        self.last_run = None  # time.monotonic() of the last finished run
+        self.future = None  # The work still running in the background thread
+        self.failures = 0
+
+    def due(self):
+        return self.future is None and (self.last_run is None or time.monotonic() - self.last_run >= self.every)
+
+    def step(self):
+        """Starts the work if due, or applies it once done (on the game's thread)."""
+        if self.future is None:
+            if not self.due():
+                return
+            if self.work is not None:
+                self.future = _worker.submit(self.work)
+                return
+            result = None
+        elif not self.future.done():
+            return
+        else:
+            future, self.future = self.future, None
+            if future.exception() is not None:
+                self.failures += 1
+                self.last_run = time.monotonic()
+                return
+            result = future.result()
+        self.last_run = time.monotonic()
+        if self.apply is not None:
+            self.apply(result)
+
+
+class IdlePolicy:
+    """What get_player_input() does when the visitor stops typing.
+
+    Args:
+        timeout (float, optional): Seconds without a keystroke before the action. Defaults to None (never).
+        action (str, optional): One of IDLE_ACTIONS. Defaults to "reset".
+        warning (float, optional): Seconds of countdown shown before the action. Defaults to WARNING.
+        jobs (list, optional): Housekeeping Jobs run while waiting. Defaults to none.
+    """
+
+    def __init__(self, timeout=None, action="reset", warning=WARNING, jobs=None):
+        if action not in IDLE_ACTIONS:
+            raise ValueError(f"Unknown idle action {action!r}; expected one of {', '.join(IDLE_ACTIONS)}.")
+        self.timeout = timeout
+        self.action = action
+        self.warning = warning
+        self.jobs = jobs if jobs is not None else []
+
+
+def housekeeping_jobs(dialogue_data, dialogue_url, render):
+    """The game's standard housekeeping: flush output, keep the dialogue current, warm the hint table.
+
+    Args:
+        dialogue_data (dict): The dialogue in use; updated in place when the remote copy changes.
+        dialogue_url (str): Where the dialogue is fetched from.
+        render (RenderCache): display_location, whose cached renders are dropped when the dialogue changes.
+
+    Returns:
+        list: The Jobs.
+    """
+    def fetch_dialogue():
+        response = http_client.get(dialogue_url)
+        response.raise_for_status()
+        return response.json()
+
+    def swap_dialogue(fresh):
+        if fresh and fresh != dialogue_data:
+            dialogue_data.clear()
+            dialogue_data.update(fresh)
+            render.clear()  # Renders replay the old lines otherwise
+
+    def warm_hints():
+        import hints
+
+        hints.load_table()
+
+    return [
+        Job("flush output", apply=lambda _: sys.stdout.flush()),
+        Job("warm the hint table", work=warm_hints, every=float("inf")),
+        Job("refresh the dialogue", work=fetch_dialogue, apply=swap_dialogue, every=DIALOGUE_EVERY),
+    ]
+
+
+async def _housekeeping(jobs):
+    await asyncio.sleep(HOUSEKEEPING_DELAY)
+    while True:
+        for job in jobs:
+            job.step()
+        await asyncio.sleep(0.5)
+
+
+async def read_command_async(session, message, default, policy, on_idle=None):
+    """Reads one line with session.prompt_async(), acting on the policy if the visitor goes idle.
+
+    Args:
+        session (PromptSession): The game's prompt session.
+        message (str): The prompt.
+        default (str): Text to pre-fill (type-ahead).
+        policy (IdlePolicy): The timeout and action.
+        on_idle (callable, optional): Called when the timeout runs out (the autosave). Defaults to None.
+
+    Returns:
+        str: The line typed, or None if the visitor left and the action says to start over.
+    """
+    from prompt_toolkit.application import run_in_terminal
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.timeout
+    idle = False  # on_idle already ran for this idle spell
+    activity = asyncio.Event()  # Set by a keystroke, so an idle wait notices the visitor is back
+
+    def typed(_):
+        nonlocal deadline, idle
+        deadline = loop.time() + policy.timeout
+        idle = False
+        activity.set()
+
+    def countdown():
+        left = deadline - loop.time()
+        if idle or left > policy.warning:
+            return ""
+        verb = {"autosave": "Saving", "reset": "Restarting", "next_visitor": "Restarting"}[policy.action]
+        return f"{verb} in {max(0, left):.0f}s"
+
+    session.default_buffer.on_text_changed += typed
+    prompt = asyncio.ensure_future(session.prompt_async(message, default=default, rprompt=countdown,
+                                                        refresh_interval=1))
+    housekeeping = asyncio.ensure_future(_housekeeping(policy.jobs))
+    try:
+        while True:
+            if idle:  # Already saved; wait for the line or for the visitor to start typing again
+                activity.clear()
+                woken = asyncio.ensure_future(activity.wait())
+                done, _ = await asyncio.wait([prompt, woken], return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if prompt in done:
+                    return prompt.result()
+                continue  # typed() cleared idle and moved the deadline: time the next idle spell
+            done, _ = await asyncio.wait([prompt], timeout=max(0, deadline - loop.time()))
+            if done:
+                return prompt.result()
+            if loop.time() < deadline:
+                continue  # A keystroke moved the deadline
+            idle = True
+            if on_idle is not None:
+                await run_in_terminal(on_idle)
+            if policy.action != "autosave":
+                session.app.exit(result=None)
+                return await prompt
+    finally:
+        session.default_buffer.on_text_changed -= typed
+        housekeeping.cancel()
+
+
+def read_command(session, message, default, policy, on_idle=None):
+    """Blocking wrapper of read_command_async() for the game loop (see there)."""
+    return asyncio.run(read_command_async(session, message, default, policy, on_idle))
@@ -0,0 +1,187 @@
+"""Load test for the hosted game: well-behaved players next to abusive ones.
+
+Starts server.py on a free local port for each scenario and runs a swarm of
+clients against it.  Normal players type a command, wait for the prompt and
+think for a moment; abusive clients connect from another loopback address
+(127.0.0.2) and pipeline commands as fast as the socket takes them.  The
+report compares the normal players' turn latency (command sent -> prompt
+back) with and without abusers, and with the server's limits switched off.
+
+With --spectators, two more scenarios check that an audience costs the
+player nothing: one normal player streams their game and that many spectators
+watch it, a tenth of them on connections that never read (so the server
+has to drop them).
+
+Usage:
+    python loadtest.py --players 30 --abusers 10 --seconds 10
+    python loadtest.py --players 30 --abusers 0 --spectators 2000
+"""
+
+import argparse  # Used for the command-line options
+import asyncio  # Used for running the client swarm
+import os  # Used for locating server.py
+import re  # Used for reading the spectator code off the streamer's screen
+import signal  # Used for asking the server to print its summary and stop
+import socket  # Used for finding a free port
+import subprocess  # Used for running the server in its own process
+import sys  # Used for starting the server with the same interpreter
+import time  # Used for measuring latency
+
+from server import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NORMAL_COMMANDS = ["go east", "back", "go north", "back", "look around"]
+ABUSER_ADDRESS = "127.0.0.2"  # All abusers share one source IP, as a single misbehaving host would
+THINK_TIME = 0.25  # Seconds a normal player waits between commands
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def read_until(reader, marker):
+    data = b""
+    while not data.endswith(marker):
+        chunk = await reader.read(65536)
+        if not chunk:
+            raise ConnectionError("server closed the connection")
+        data += chunk
+    return data
+
+
+def player_address(i):
+    """Gives each normal player its own loopback address (Linux routes all of 127/8 to lo)."""
+    if not sys.platform.startswith("linux"):
+        return "127.0.0.1"
+    return f"127.0.{1 + i // 250}.{1 + i % 250}"
+
+
+async def normal_player(port, deadline, latencies, local_address, code=None):
+    """Plays politely until the deadline, recording each turn's latency.
+
+    A streamer passes a future for `code`, which gets the game's spectator code.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(local_address, 0))
+    try:
+        await read_until(reader, b": ")
+        writer.write(b"20\n")
+        text = await read_until(reader, b"> ")
+        if code is not None:
+            code.set_result(re.search(rb"the code (\w+)", text).group(1).decode())
+        i = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(NORMAL_COMMANDS[i % len(NORMAL_COMMANDS)].encode() + b"\n")
+            await read_until(reader, b"> ")
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            await asyncio.sleep(THINK_TIME)
+    finally:
+        writer.close()
+
+
+async def abuser(port, deadline, counter, local_address):
+    """Floods commands without waiting for replies, reading whatever comes back."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(local_address, 0))
+
+    async def drain_replies():
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            counter[0] += chunk.count(b"> ")
+
+    replies = asyncio.create_task(drain_replies())
+    try:
+        writer.write(b"20\n")
+        while time.monotonic() < deadline:
+            writer.write(b"look around\n" * 100)
+            await asyncio.wait_for(writer.drain(), max(0.01, deadline - time.monotonic()))
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        replies.cancel()
+        writer.close()
+
+
+async def spectator(watch_port, code, deadline, received, stalled):
+    """Watches the streamer's game until the deadline; a stalled spectator never reads."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", watch_port)
+    try:
+        await read_until(reader, b": ")
+        writer.write((await code).encode() + b"\n")
+        if stalled:
+            await asyncio.sleep(max(0, deadline - time.monotonic()))
+            return
+        while time.monotonic() < deadline:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            received[0] += len(chunk)
+    finally:
+        writer.close()
+
+
+async def swarm(port, players, abusers, seconds, spectators=0, watch_port=None):
+    deadline = time.monotonic() + seconds
+    latencies, counter = [], [0]
+    abuser_address = ABUSER_ADDRESS if sys.platform.startswith("linux") else "127.0.0.1"
+    code = asyncio.get_running_loop().create_future() if watch_port is not None else None
+    tasks = [normal_player(port, deadline, latencies, player_address(i), code if i == 0 else None)
+             for i in range(players)]
+    tasks += [abuser(port, deadline, counter, abuser_address) for _ in range(abusers)]
+    received = [0]
+    tasks += [spectator(watch_port, code, deadline, received, stalled=i % 10 == 9) for i in range(spectators)]
+    # Anything still stuck on a starved connection shortly after the deadline counts as done
+    await asyncio.wait([asyncio.ensure_future(task) for task in tasks], timeout=seconds + 5)
+    return latencies, counter[0]
+
+
+def run_scenario(name, players, abusers, seconds, limits, spectators=None):
+    """Runs one scenario against a fresh server and prints a result line.
+
+    With `spectators` (even 0), player 0 streams and that many spectators watch.
+    """
+    port = free_port()
+    args = [sys.executable, "-u", os.path.join(HERE, "server.py"), "--local", "--port", str(port), "--workers", "0"]
+    if not limits:
+        args += ["--max-active", "0", "--conn-rate", "0", "--ip-rate", "0"]
+    watch_port = None
+    if spectators is not None:
+        watch_port = free_port()
+        args += ["--watch-port", str(watch_port)]
+    server = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in server.stdout:
+            if "Listening" in line:
+                break
+        else:  # Output ended: the server exited during startup (port in use, bad flag, import error)
+            raise SystemExit(f"The server failed to start (exit code {server.wait()}).")
+        latencies, abuse = asyncio.run(swarm(port, players, abusers, seconds, spectators or 0, watch_port))
+    finally:
+        server.send_signal(signal.SIGINT)
+        summary = server.communicate(timeout=10)[0].strip().splitlines()
+    print(f"{name:<32} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>9.2f} "
+          f"{percentile(latencies, 0.99) * 1000:>9.2f} {percentile(latencies, 1.0) * 1000:>9.2f} {abuse:>12}")
+    if summary:
+        print(f"    server: {summary[-1]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the hosted game with abusive clients.")
+    parser.add_argument("--players", type=int, default=30, help="well-behaved players (default: 30)")
+    parser.add_argument("--abusers", type=int, default=10, help="flooding clients (default: 10)")
+    parser.add_argument("--seconds", type=float, default=10, help="length of each scenario (default: 10)")
+    parser.add_argument("--spectators", type=int, default=0,
+                        help="also run a streamer scenario with this many spectators (default: 0, skipped)")
+    options = parser.parse_args()
+    print(f"{'scenario':<32} {'turns':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'abuse turns':>12}")
+    run_scenario("players only", options.players, 0, options.seconds, limits=True)
+    run_scenario("players + abusers, limits on", options.players, options.abusers, options.seconds, limits=True)
+    run_scenario("players + abusers, limits off", options.players, options.abusers, options.seconds, limits=False)
+    if options.spectators:
+        run_scenario("streamer, nobody watching", options.players, 0, options.seconds, limits=True, spectators=0)
+        run_scenario(f"streamer + {options.spectators} spectators", options.players, 0, options.seconds,
+                     limits=True, spectators=options.spectators)
@@ -0,0 +1,202 @@
+"""Locations packaged as plugin modules, imported the first time a player enters them.
+
+display_location and process_command in main.py handle the original tower
+themselves.  A location they don't know is looked up here, in two places:
+
+* a module in the `locations` package named after the location
+  (locations/roof.py is "roof");
+* an entry point in the "cn_tower.locations" group of an installed add-on
+  (name = location, value = module), read only if the package has no such module.
+
+Nothing is imported until a player first enters the location, so startup time
+and memory stay flat however many towers and side quests are installed.
+
+Only new locations (and phone_found and roof) are plugins.  The original
+tower's rooms stay in main.py on purpose: the render cache and undo's
+replayable() check work out what each room reads and changes from those
+`if location == "..."` chains, so a room moved out would never be cached and
+would never be shown again after undo.  Keeping them costs little: about
+44 KiB of bytecode, read from __pycache__ in well under a millisecond (about
+12 ms to compile when main.py runs as a script), against a startup dominated
+by third-party imports and the network (`python startup.py`).
+preload() imports the whole world up front instead (the server does this before
+forking, so every worker shares the compiled code).
+
+A plugin module defines two functions, shaped like the branches in main.py:
+
+    display(game, inventory, sweet_mode, dialogue_data)
+        Shows the location. Returns the location to move to, or None to stay.
+    process_command(game, command, inventory, sweet_mode, dialogue_data, is_restricted)
+        Returns (new_location, inventory, sweet_mode).
+
+`game` is the running game module.  Plugins use game.sweet_dialogue,
+game.pause, game.ask, game.has_item... from it rather than importing main,
+which would load a second copy of the game when it was started as
+`python main.py` (there it runs as __main__).
+
+Plugins are ordinary modules, so their bytecode is cached in __pycache__ the
+first time they are imported; `--compile` writes it ahead of time (for
+read-only installs or a cold first start).
+
+Usage:
+    python location_plugins.py --list
+    python location_plugins.py --compile
+    python location_plugins.py --preload
+"""
+
+import argparse  # Used for the command-line options
+import compileall  # Used for writing plugin bytecode ahead of time
+import importlib  # Used for importing plugins on first entry
+import importlib.metadata  # Used for finding plugins installed as entry points
+import importlib.util  # Used for locating plugin source files without importing them
+import pkgutil  # Used for listing the modules in the locations package
+import threading  # Used for importing each plugin once when server threads race
+import time  # Used for timing plugin imports
+
+PACKAGE = "locations"
+ENTRY_POINT_GROUP = "cn_tower.locations"
+
+
+class LocationRegistry:
+    """Finds location plugins and imports each one the first time it's needed.
+
+    Args:
+        package (str, optional): Package whose modules are locations. Defaults to PACKAGE.
+        group (str, optional): Entry point group for installed add-ons. Defaults to ENTRY_POINT_GROUP.
+    """
+
+    def __init__(self, package=PACKAGE, group=ENTRY_POINT_GROUP):
+        self.package = package
+        self.group = group
+        self.load_times = {}  # Location -> seconds its import took
+        self._modules = {}  # Location -> imported module
+        self._bundled = None  # Location -> module name, listed on first use
+        self._installed = None  # Location -> module name from entry points, read only when needed
+        self._lock = threading.Lock()
+
+    def _bundled_modules(self):
+        if self._bundled is None:
+            try:
+                package = importlib.import_module(self.package)
+                self._bundled = {info.name: f"{self.package}.{info.name}"
+                                 for info in pkgutil.iter_modules(package.__path__) if not info.ispkg}
+            except ImportError:
+                self._bundled = {}
+        return self._bundled
+
+    def _installed_modules(self):
+        if self._installed is None:
+            self._installed = {entry.name: entry.value.partition(":")[0]
+                               for entry in importlib.metadata.entry_points(group=self.group)}
+        return self._installed
+
+    def module_name(self, location):
+        """Returns the name of the module that provides a location, or None (nothing is imported).
+
+        Args:
+            location (str): The location.
+
+        Returns:
+            str: The module name, or None if no plugin provides the location.
+        """
+        bundled = self._bundled_modules()
+        if location in bundled:
+            return bundled[location]
+        return self._installed_modules().get(location)
+
+    def find(self, location):
+        """Returns the plugin module for a location, importing it on first use.
+
+        Args:
+            location (str): The location.
+
+        Returns:
+            module: The plugin, or None if no plugin provides the location.
+        """
+        module = self._modules.get(location)
+        if module is not None:
+            return module
+        name = self.module_name(location)
+        if name is None:
+            return None
+        with self._lock:
+            if location not in self._modules:
+                started = time.perf_counter()
+                self._modules[location] = importlib.import_module(name)
+                self.load_times[location] = time.perf_counter() - started
+            return self._modules[location]
+
+    def names(self):
+        """Returns every location provided by a plugin, sorted (nothing is imported)."""
+        return sorted(set(self._bundled_modules()) | set(self._installed_modules()))
+
+    def sources(self):
+        """Returns location -> source file of each plugin, for tools that read them without importing."""
+        sources = {}
+        for location in self.names():
+            spec = importlib.util.find_spec(self.module_name(location))
+            if spec is not None and spec.origin and spec.origin.endswith(".py"):
+                sources[location] = spec.origin
+        return sources
+
+    def loaded(self):
+        """Returns the locations whose plugins have been imported."""
+        return sorted(self._modules)
+
+    def preload(self):
+        """Imports every plugin now (the whole world up front).
+
+        Returns:
+            list: The locations loaded.
+        """
+        for location in self.names():
+            self.find(location)
+        return self.loaded()
+
+    def compile(self):
+        """Writes bytecode for every plugin into __pycache__ without running them.
+
+        Returns:
+            bool: True if every plugin compiled.
+        """
+        return all(compileall.compile_file(path, quiet=1) for path in self.sources().values())
+
+
+registry = LocationRegistry()
+
+
+def find(location):
+    """Returns the plugin module for a location (imported on first use), or None."""
+    return registry.find(location)
+
+
+def names():
+    """Returns every location provided by a plugin (nothing is imported)."""
+    return registry.names()
+
+
+def sources():
+    """Returns location -> source file of each plugin."""
+    return registry.sources()
+
+
+def preload():
+    """Imports every location plugin now."""
+    return registry.preload()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, compile or preload the game's location plugins.")
+    parser.add_argument("--list", action="store_true", help="list the plugin locations and their modules")
+    parser.add_argument("--compile", action="store_true", help="write bytecode for every plugin")
+    parser.add_argument("--preload", action="store_true", help="import every plugin and time each import")
+    options = parser.parse_args()
+    if options.compile:
+        print("Compiled." if registry.compile() else "Some plugins failed to compile.")
+    if options.preload:
+        registry.preload()
+        for location, seconds in sorted(registry.load_times.items()):
+            print(f"{location:<28} imported in {seconds * 1000:.2f} ms")
+    if options.list or not (options.compile or options.preload):
+        for location in registry.names():
+            print(f"{location:<28} {registry.module_name(location)}")
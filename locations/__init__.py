@@ -0,0 +1,4 @@
+"""Locations packaged as plugins: one module per location, named after it.
+
+See location_plugins.py for how they are found and what a module defines.
+"""
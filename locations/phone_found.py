@@ -0,0 +1,57 @@
+"""The edge of the roof, with Alex's phone in hand (after 'Take Phone' when scaring Alex)."""
+
+
+def display(game, inventory, sweet_mode, dialogue_data):
+    """Shows the location.
+
+    Args:
+        game (module): The running game module.
+        inventory (dict): The player's inventory.
+        sweet_mode (bool): Whether sweet+ mode is enabled.
+        dialogue_data (dict): The loaded dialogue data.
+
+    Returns:
+        str: The location to move to, or None to stay.
+    """
+    text = "You take the phone and run to the edge of the roof. There are no obstacles in front of you."
+    text = game.sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
+    print(text)
+    text = "What do you want to do?"
+    text = game.sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
+    print(text)
+    text = "Hints: 'Jump', 'Go Back' to the Glass Floor, 'Exit', 'Restart'"
+    text = game.sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
+    print(text)
+
+
+def process_command(game, command, inventory, sweet_mode, dialogue_data, is_restricted):
+    """Processes the player's command here.
+
+    Args:
+        game (module): The running game module.
+        command (str): The player's command.
+        inventory (dict): The player's inventory.
+        sweet_mode (bool): Whether sweet+ mode is enabled.
+        dialogue_data (dict): The loaded dialogue data.
+        is_restricted (bool): Whether the user is in a restricted country.
+
+    Returns:
+        tuple: The new location, updated inventory, and sweet_mode.
+    """
+    new_location = "phone_found"
+    if command == "jump":
+        text = "You jump from the roof"
+        text = game.sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
+        print(text)
+        new_location = "roof"
+    elif command == "go back":
+        new_location = "glass_floor"
+    elif command == "exit":
+        new_location = "exit"
+    elif command == "restart":
+        new_location = "restart"
+    else:
+        text = "Invalid command. Check the hints."
+        text = game.sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
+        print(text)
+    return new_location, inventory, sweet_mode
@@ -0,0 +1,28 @@
+"""The roof: the ending after jumping from the edge with Alex's phone."""
+
+
+def display(game, inventory, sweet_mode, dialogue_data):
+    """Shows the ending.
+
+    Args:
+        game (module): The running game module.
+        inventory (dict): The player's inventory.
+        sweet_mode (bool): Whether sweet+ mode is enabled.
+        dialogue_data (dict): The loaded dialogue data.
+
+    Returns:
+        str: "exit", since this is an ending.
+    """
+    text = "You jumped from the roof. The last thing you see is blue sky"
+    text = game.sweet_dialogue(text, "roof", sweet_mode, dialogue_data)
+    print(text)
+    return "exit"
+
+
+def process_command(game, command, inventory, sweet_mode, dialogue_data, is_restricted):
+    """Nothing more happens in an ending state.
+
+    Returns:
+        tuple: The location, inventory, and sweet_mode, unchanged.
+    """
+    return "roof", inventory, sweet_mode
@@ -1,12 +1,29 @@
-import time  # Used for pausing the game with time.sleep()
+import time  # Used for pausing the game with pause()
+import argparse  # Used for the kiosk options (--idle-timeout and friends)
 import os  # Used for clearing the console with os.system('cls' or 'clear')
 import random  # Used for shuffling lists (e.g., support_options in display_location)
 import json  # Used for loading and saving JSON data (e.g., load_dialogue, save_game, load_game)
-import platform  # Used for detecting the operating system (e.g., in install_library, clear_console)
-import requests  # Used for making HTTP requests (e.g., in load_cn_tower_art, load_dialogue, get_user_country)
-import subprocess  # Used for running shell commands (e.g., in install_library to run pip or pip3)
-from art import text2art  # Used for generating ASCII art (in main to display "CN Tower")
-from prompt_toolkit import PromptSession  # Used for creating a session with command history support
+import platform  # Used for detecting the operating system (e.g., in clear_console)
+import requests  # Used for handling HTTP errors (e.g., in load_cn_tower_art, load_dialogue, get_user_country)
+import sys  # Used for handing this module to location plugins (also when run as __main__)
+try:
+    from art import text2art  # Used for generating ASCII art (in main to display "CN Tower")
+except ImportError:  # Degraded mode: no banner (check_libraries says what to install)
+    text2art = None
+try:
+    from prompt_toolkit import PromptSession  # Used for creating a session with command history support
+except ImportError:  # Degraded mode: plain input() without history
+    PromptSession = None
+import dependencies  # Used for checking libraries without importing or installing them (check_libraries)
+import http_client  # Used for pooled, retrying HTTP requests (e.g., in load_cn_tower_art, load_dialogue, get_user_country)
+import circuit_breaker  # Used for skipping failing geolocation APIs (in get_user_country)
+import pauses  # Used for the type-ahead buffer (in get_player_input)
+from pauses import pause, ask  # Used for skippable story pauses and prompts that take typed-ahead lines (in display_location)
+import render_cache  # Used for replaying rooms that were already rendered with the same state (display_location)
+import location_plugins  # Used for locations packaged as plugin modules, imported on first entry (display_location, process_command)
+import hints  # Used for the precomputed next step toward a good ending (the "hint" command in process_command)
+import history  # Used for the per-turn undo/redo deltas (main records them, process_command undoes them)
+import kiosk  # Used for idle timeouts and housekeeping at the command prompt (get_player_input)
 
 # GitHub Repository Details
 # Replace 'cherrywheel' with your actual GitHub username if it's different
@@ -15,6 +32,13 @@ GITHUB_REPO = "CN-Tower"
 DIALOGUE_URL = f"https://raw.githubusercontent.com/{GITHUB_USERNAME}/{GITHUB_REPO}/main/dialogue.json"  # URL to fetch dialogue data from GitHub
 CN_TOWER_ART_URL = f"https://raw.githubusercontent.com/{GITHUB_USERNAME}/{GITHUB_REPO}/main/cn_tower_art.txt"  # URL to fetch CN Tower ASCII art from GitHub
 
+# Geolocation APIs (no API keys needed), tried in order by get_user_country
+GEO_APIS = [
+    "https://ipapi.co/json/",
+    "https://ipwho.is/",
+    "https://freegeoip.app/json/"
+]
+
 # List of countries where certain game features are restricted
 RESTRICTED_COUNTRIES = [
     "Afghanistan", "Brunei", "Gambia", "Iran", "Iraq", "Jamaica", "Kenya",
@@ -33,27 +57,16 @@ def clear_console():
     else:
         os.system('clear')  # Clear console on Linux/macOS
 
-def install_library(library_name):
-    """Installs a library using pip or pip3.
+def check_libraries():
+    """Checks the libraries in requirements.txt and says what to install.
 
-    Args:
-        library_name (str): The name of the library to install.
+    Libraries are found without importing them, and the result is cached until the
+    interpreter, requirements.txt or the installed packages change.  Nothing is
+    installed here: without an optional library the game runs in a degraded mode.
     """
-    print(f"Installing {library_name}...")
-    if platform.system() == "Windows":
-        subprocess.check_call(["pip", "install", library_name])  # Use pip on Windows
-    else:  # Assume Linux or macOS
-        subprocess.check_call(["pip3", "install", library_name])  # Use pip3 on Linux/macOS
-
-def check_libraries():
-    """Checks for required libraries and installs them if missing."""
-    required_libraries = ["requests", "art"]  # List of required libraries
-    for library in required_libraries:
-        try:
-            __import__(library)  # Try to import the library
-        except ImportError:
-            print(f"Missing library: {library}")
-            install_library(library)  # Install the missing library
+    for library in dependencies.missing():  # Found with find_spec, cached in a stamp file
+        print(f"Missing library: {library} ({dependencies.describe(library)}). "
+              f"Install it with: pip install -r requirements.txt")
 
 def load_cn_tower_art():
     """Loads CN Tower art from a remote URL.
@@ -62,7 +75,7 @@ def load_cn_tower_art():
         str: The CN Tower art as a string, or None if an error occurred.
     """
     try:
-        response = requests.get(CN_TOWER_ART_URL)  # Send GET request to the art URL
+        response = http_client.get(CN_TOWER_ART_URL)  # Send GET request to the art URL (reuses the connection)
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
         return response.text  # Return the art as a string
     except requests.exceptions.RequestException as e:
@@ -80,16 +93,65 @@ def display_cn_tower_art(art):
     else:
         print("Could not load CN Tower art.")
 
-# Create a global session to preserve command history
-session = PromptSession()
+# Create a global session to preserve command history (None without prompt_toolkit)
+session = PromptSession() if PromptSession is not None else None
+
+# The game's undo/redo history (recorded at every prompt in main)
+game_history = history.History()
+
+# What the command prompt does when a visitor walks away (no timeout unless --idle-timeout is given)
+idle_policy = kiosk.IdlePolicy()
 
-def get_player_input():
-    """Gets input from the user with command history support."""
+def get_player_input(on_idle=None):
+    """Gets input from the user with command history support.
+
+    Commands typed during a story pause are run first, in the order they were typed.
+    With an idle timeout set (idle_policy), housekeeping runs while waiting, and
+    on_idle is called once the player has been idle for the timeout.
+
+    Args:
+        on_idle (callable, optional): Called when the player goes idle (the autosave). Defaults to None.
+
+    Returns:
+        str: The command typed, or None if the player went idle and the game should start over.
+    """
+    queued = pauses.typed.next_line()
+    if queued is not None:
+        print(f"> {queued}")
+        return queued.lower()
     try:
-        return session.prompt("> ").lower()
+        if session is None:
+            partial = pauses.typed.take_partial()
+            return (partial + input("> " + partial)).lower()  # Shows the half-typed text, then appends to it
+        if idle_policy.timeout:
+            command = kiosk.read_command(session, "> ", pauses.typed.take_partial(), idle_policy, on_idle)
+            return command.lower() if command is not None else None
+        return session.prompt("> ", default=pauses.typed.take_partial()).lower()
     except EOFError:
         return "exit"
 
+def display_restored_location(location, inventory, sweet_mode, dialogue_data):
+    """Shows the location undo/redo put back, without playing its scene again.
+
+    A room that only describes itself is shown as usual.  A room whose scene
+    changes the inventory or asks questions (the storage room pays $20) already
+    did so when the player first got there, so only its name is shown.
+
+    Args:
+        location (str): The restored location.
+        inventory (dict): The restored inventory.
+        sweet_mode (bool): Whether sweet+ mode is enabled.
+        dialogue_data (dict): The loaded dialogue data.
+
+    Returns:
+        str: The location to continue from.
+    """
+    if display_location.replayable(location):
+        return display_location(location, inventory, sweet_mode, dialogue_data)
+    print("\n---")
+    print(f"You're back at {location.replace('_', ' ')}. What do you want to do?")
+    return location
+
 def has_item(inventory, item):
     """Checks if an item exists in the inventory.
 
@@ -166,6 +228,18 @@ def load_game(filename="savegame.json"):
         print(f"Error loading game: {e}. Starting new game.")
         return "base", {"money": 40}  # Return default values for a new game
 
+def slot_filename(slot):
+    """Returns the save file for a named save slot.
+
+    Args:
+        slot (str): The slot name the player typed (e.g. "castle" in "save castle").
+
+    Returns:
+        str: The file name, e.g. "savegame_castle.json".
+    """
+    name = "".join(c if c.isalnum() or c in "-_" else "_" for c in slot.strip())  # Keep it a plain file name
+    return f"savegame_{name}.json" if name else "savegame.json"
+
 def load_dialogue():
     """Loads dialogue data from a remote JSON file.
 
@@ -173,65 +247,68 @@ def load_dialogue():
         dict: The dialogue data, or an empty dictionary if an error occurred.
     """
     try:
-        response = requests.get(DIALOGUE_URL)  # Send GET request to the dialogue URL
+        response = http_client.get(DIALOGUE_URL)  # Send GET request to the dialogue URL
         response.raise_for_status()
         return response.json()  # Return the dialogue data as a dictionary
     except requests.exceptions.RequestException as e:
         print(f"Error loading dialogue: {e}")
         return {}  # Return an empty dictionary if loading fails
 
-rate_limited_apis = {}
+# Circuit breaker per geolocation API; the healthiest, fastest APIs are tried first
+geo_providers = circuit_breaker.ProviderHealth()
 
 def get_user_country():
     """Detects the user's country using multiple external APIs without API keys.
     
-    If an API returns 429 (Too Many Requests), it is blocked for 5 minutes.
-    After 5 minutes, that API is retried.
+    Each API has a circuit breaker: APIs that keep failing (errors, timeouts,
+    malformed replies) or answering slowly are skipped for a while and then
+    probed again. If an API returns 429 (Too Many Requests), it is skipped for
+    as long as its Retry-After header asks (5 minutes if it doesn't say).
     
     Returns:
         str: The detected country name, or None if not determined.
     """
-    apis = [
-        "https://ipapi.co/json/",
-        "https://ipwho.is/",
-        "https://freegeoip.app/json/"
-    ]
-    now = time.time()
-    for api_url in apis:
-        # Skip API if it's still rate-limited
-        if api_url in rate_limited_apis and now < rate_limited_apis[api_url]:
+    for api_url in geo_providers.order(GEO_APIS):
+        breaker = geo_providers.breaker(api_url)
+        if not breaker.allow():
             continue
 
+        started = time.time()
         try:
-            response = requests.get(api_url, timeout=5)  # 5-second timeout
+            response = http_client.get(api_url, retries=0)  # No retries; the breaker moves on to the next API
 
             if response.status_code == 429:
-                # Block the API for 5 minutes without printing a notification
-                rate_limited_apis[api_url] = now + 5 * 60
+                # Leave the API alone for a while without printing a notification
+                breaker.trip(circuit_breaker.retry_after(response))
                 continue
 
             response.raise_for_status()
             data = response.json()
 
-            if "country_name" in data:
+            if not isinstance(data, dict):  # e.g. null or a bare number
+                breaker.record_failure(time.time() - started)
+                print(f"Unexpected response format from {api_url}")
+            elif "country_name" in data:
+                breaker.record_success(time.time() - started)
                 return data.get("country_name", "")
             elif "country" in data:
+                breaker.record_success(time.time() - started)
                 return data.get("country", "")
             else:
+                breaker.record_failure(time.time() - started)
                 print(f"Unexpected response format from {api_url}")
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error with {api_url} (RequestException): {e}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            breaker.record_failure(time.time() - started)
+            print(f"Error with {api_url} ({type(e).__name__}): {e}")
 
     print("Could not determine country from APIs. Trying timezone...")
     try:
-        import pytz
-        from datetime import datetime
+        import country_index  # Offline timezone -> country index built from pytz (cached on disk)
 
-        local_timezone = datetime.now().astimezone().tzinfo
-        country_code = pytz.country_timezones.get(str(local_timezone))
-        if country_code:
-            return pytz.country_names.get(country_code[0].upper())
+        country = country_index.local_country()
+        if country:
+            return country
     except ImportError:
         print("Missing library: pytz. Please install it (pip install pytz)")
     except Exception as e:
@@ -293,26 +370,26 @@ def display_debug_menu(inventory, sweet_mode, is_restricted):
         if not is_restricted:
             print("7. Toggle Sweet+ Mode")
 
-        choice = input("Enter choice: ")
+        choice = ask("Enter choice: ")
 
         if choice == "1":
-            amount = int(input("Enter amount of money to add: "))
+            amount = int(ask("Enter amount of money to add: "))
             inventory["money"] += amount
             print(f"Added ${amount}. Current money: ${inventory['money']}")
         elif choice == "2":
             print("Available items:", ", ".join(valid_items))
-            item = input("Enter item name to add: ")
+            item = ask("Enter item name to add: ")
             if item in valid_items:
                 add_item(inventory, item)
                 print(f"{item} added to inventory.")
             else:
                 print("Invalid item name.")
         elif choice == "3":
-            item = input("Enter item name to remove: ")
+            item = ask("Enter item name to remove: ")
             remove_item(inventory, item)
             print(f"{item} removed from inventory.")
         elif choice == "4":
-            location = input("Enter the location to set: ")
+            location = ask("Enter the location to set: ")
             return location, inventory, sweet_mode
         elif choice == "5":
             display_inventory(inventory)
@@ -325,6 +402,7 @@ def display_debug_menu(inventory, sweet_mode, is_restricted):
         else:
             print("Invalid choice.")
 
+@render_cache.memoize
 def display_location(location, inventory, sweet_mode, dialogue_data):
     """Displays a description of the current location, inventory, and available actions.
 
@@ -372,11 +450,11 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
             text = '"Hey! Nice day to visit the CN Tower, right?"'
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
-            time.sleep(3)
+            pause(3)
             text = 'Alex checks their watch. "It\'s 17:46. I have 5 minutes to record a video for my social media channel."'
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
-            time.sleep(5)
+            pause(5)
             text = "Alex talks a lot about the weather, the view, and their love for the CN Tower."
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
@@ -384,14 +462,14 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
                 text = f"...blah, blah, blah! ({5 - i} minutes)"
                 text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
                 print(text)
-                time.sleep(3)
+                pause(3)
             text = "...Alex looks at their watch."
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
             text = '"Oh no! I lost track of time. Gotta run!"'
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
-            time.sleep(2)
+            pause(2)
             text = "You wasted a lot of time."
             text = sweet_dialogue(text, "alex_rivers", sweet_mode, dialogue_data)
             print(text)
@@ -443,7 +521,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
             choices = []
             while len(choices) < 2:
                 try:
-                    choice = int(input(f"Enter choice {len(choices) + 1}: ")) - 1
+                    choice = int(ask(f"Enter choice {len(choices) + 1}: ")) - 1
                     if 0 <= choice < len(support_options):
                         choices.append(support_options[choice])
                     else:
@@ -454,7 +532,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
             print("You say:")
             for choice in choices:
                 print(f"- {choice}")
-                time.sleep(2)
+                pause(2)
 
             # Check if the best support option was chosen
             if best_support in choices:
@@ -479,7 +557,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = '"Hey! You look like you\'ve got energy. Join our quadrobics club?"'
         text = sweet_dialogue(text, "Patrick", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(3)
+        pause(3)
         text = "Patrick shows some quadrobics moves."
         text = sweet_dialogue(text, "Patrick", sweet_mode, dialogue_data)
         print(text)
@@ -539,15 +617,15 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = "You're in the elevator. The doors close."
         text = sweet_dialogue(text, "elevator", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(2)
+        pause(2)
         text = "Going up fast..."
         text = sweet_dialogue(text, "elevator", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(3)
+        pause(3)
         text = "Your ears pop."
         text = sweet_dialogue(text, "elevator", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(2)
+        pause(2)
         text = "Ding! LookOut level."
         text = sweet_dialogue(text, "elevator", sweet_mode, dialogue_data)
         print(text)
@@ -609,7 +687,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = "You're excited and nervous."
         text = sweet_dialogue(text, "edgewalk_preparation", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(5)
+        pause(5)
         text = "The guide checks your harness. Thumbs up!"
         text = sweet_dialogue(text, "edgewalk_preparation", sweet_mode, dialogue_data)
         print(text)
@@ -659,7 +737,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = '"Hey, can you help me? I need to move these boxes to the storage room."'
         text = sweet_dialogue(text, "worker", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(2)
+        pause(2)
         text = "You start helping."
         text = sweet_dialogue(text, "worker", sweet_mode, dialogue_data)
         print(text)
@@ -667,7 +745,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
             text = f"You carry box {i} to the storage room..."
             text = sweet_dialogue(text, "worker", sweet_mode, dialogue_data)
             print(text)
-            time.sleep(2)
+            pause(2)
         text = "You pick up the 5th box. It's open a bit."
         text = sweet_dialogue(text, "worker", sweet_mode, dialogue_data)
         print(text)
@@ -694,7 +772,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = 'Worker: "Hey! What are you doing?!"'
         text = sweet_dialogue(text, "caught_stealing", sweet_mode, dialogue_data)
         print(text)
-        time.sleep(2)
+        pause(2)
         text = "He calls security. You're taken to the police."
         text = sweet_dialogue(text, "caught_stealing", sweet_mode, dialogue_data)
         print(text)
@@ -786,7 +864,7 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
             text = "They make you join their quadrobics training."
             text = sweet_dialogue(text, "corner", sweet_mode, dialogue_data)
             print(text)
-            time.sleep(3)
+            pause(3)
             text = "Now you're a quadrobist. You must scare Alex Rivers."
             text = sweet_dialogue(text, "corner", sweet_mode, dialogue_data)
             print(text)
@@ -808,23 +886,14 @@ def display_location(location, inventory, sweet_mode, dialogue_data):
         text = "Hints: 'Take Phone', 'Leave Phone', 'Exit', 'Restart'"
         text = sweet_dialogue(text, "scare_alex", sweet_mode, dialogue_data)
         print(text)
-    elif location == "phone_found":
-        text = "You take the phone and run to the edge of the roof. There are no obstacles in front of you."
-        text = sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
-        print(text)
-        text = "What do you want to do?"
-        text = sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
-        print(text)
-        text = "Hints: 'Jump', 'Go Back' to the Glass Floor, 'Exit', 'Restart'"
-        text = sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
-        print(text)
-    elif location == "roof":
-        text = "You jumped from the roof. The last thing you see is blue sky"
-        text = sweet_dialogue(text, "roof", sweet_mode, dialogue_data)
-        print(text)
-        return "exit"
     else:
-        print("Invalid location.")
+        plugin = location_plugins.find(location)  # Locations packaged in locations/ (e.g. phone_found, roof)
+        if plugin is None:
+            print("Invalid location.")
+        else:
+            new_location = plugin.display(sys.modules[__name__], inventory, sweet_mode, dialogue_data)
+            if new_location is not None and new_location != location:
+                return new_location
     print("---")
     return location  # Return the current location
 
@@ -844,6 +913,20 @@ def process_command(command, current_location, inventory, sweet_mode, dialogue_d
     """
     new_location = current_location
 
+    if command == "hint":
+        print(hints.hint(current_location, inventory))  # A table lookup; hints.py --build precomputes it
+        return new_location, inventory, sweet_mode
+
+    if command in ("undo", "redo"):
+        move = game_history.undo if command == "undo" else game_history.redo
+        state = move(current_location, inventory)  # One delta, however long the game has been
+        if state is None:
+            print(f"Nothing to {command}.")
+            return new_location, inventory, sweet_mode
+        print("Took back your last move." if command == "undo" else "Played that move again.")
+        new_location, inventory = state
+        return new_location, inventory, sweet_mode
+
     if current_location == "base":
         if command == "go north":
             new_location = "entrance"
@@ -870,10 +953,13 @@ def process_command(command, current_location, inventory, sweet_mode, dialogue_d
             text = "Interact with things using commands like 'Buy Ticket', 'Ask About History'."
             text = sweet_dialogue(text, "base", sweet_mode, dialogue_data)
             print(text)
-            text = "'Inventory' shows your items and money."
+            text = "'Inventory' shows your items and money, 'Hint' suggests what to do next."
             text = sweet_dialogue(text, "base", sweet_mode, dialogue_data)
             print(text)
-            text = "'Exit' - quit game, 'Restart' - start new game"
+            text = "'Undo' takes back your last move, 'Redo' plays it again."
+            text = sweet_dialogue(text, "base", sweet_mode, dialogue_data)
+            print(text)
+            text = "'Exit' - quit game, 'Restart' - start new game, 'Save'/'Load' - your game ('Save Castle' uses a slot named Castle)"
             text = sweet_dialogue(text, "base", sweet_mode, dialogue_data)
             print(text)
         elif command == "inventory":
@@ -890,6 +976,10 @@ def process_command(command, current_location, inventory, sweet_mode, dialogue_d
             save_game(current_location, inventory)
         elif command == "load":
             new_location, inventory = load_game()
+        elif command.startswith("save "):
+            save_game(current_location, inventory, slot_filename(command[5:]))
+        elif command.startswith("load "):
+            new_location, inventory = load_game(slot_filename(command[5:]))
         else:
             text = "Invalid command. Check the hints."
             text = sweet_dialogue(text, "base", sweet_mode, dialogue_data)
@@ -1373,24 +1463,11 @@ def process_command(command, current_location, inventory, sweet_mode, dialogue_d
             text = "Invalid command. Check the hints."
             text = sweet_dialogue(text, "scare_alex", sweet_mode, dialogue_data)
             print(text)
-    elif current_location == "phone_found":
-        if command == "jump":
-            text = "You jump from the roof"
-            text = sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
-            print(text)
-            new_location = "roof"
-        elif command == "go back":
-            new_location = "glass_floor"
-        elif command == "exit":
-            new_location = "exit"
-        elif command == "restart":
-            new_location = "restart"
-        else:
-            text = "Invalid command. Check the hints."
-            text = sweet_dialogue(text, "phone_found", sweet_mode, dialogue_data)
-            print(text)
-    elif current_location == "roof":
-        pass  # This is an ending state, nothing more happens
+    else:
+        plugin = location_plugins.find(current_location)  # Locations packaged in locations/
+        if plugin is not None:
+            new_location, inventory, sweet_mode = plugin.process_command(
+                sys.modules[__name__], command, inventory, sweet_mode, dialogue_data, is_restricted)
 
     if new_location is None:
         new_location = current_location
@@ -1419,6 +1496,34 @@ def load_age(filename=None):
     except Exception:
         return None
 
+def verify_age(user_country, ask=False):
+    """Checks the player is old enough, using the saved age unless asked to enter it again.
+
+    Args:
+        user_country (str): The player's country, shown in the prompt.
+        ask (bool, optional): Whether to ask even if an age was saved (a new visitor). Defaults to False.
+
+    Returns:
+        bool: True if the player may play.
+    """
+    # Try to load the saved age automatically
+    age = None if ask else load_age()
+    if age is not None:
+        print(f"Welcome back! Your age ({age}) was loaded automatically.")
+        return True
+    # Age verification loop
+    while True:
+        try:
+            age = int(input(f"Enter your age (in {user_country}): "))
+            if age >= 16:
+                save_age(age)  # Automatically save age after valid input
+                return True
+            else:
+                print("Sorry, you must be 16 or older to play this game.")
+                return False
+        except ValueError:
+            print("Invalid input. Please enter a number.")
+
 def main():
     """Main game loop."""
     check_libraries()  # Check for and install missing libraries
@@ -1426,15 +1531,8 @@ def main():
     sweet_mode = False  # Initialize sweet+ mode to off
     is_restricted = False  # Initialize is_restricted to False
 
-    try:
+    if text2art is not None:  # Without art there is no banner
         # Generate and display CN Tower ASCII art
-        from art import text2art
-        cn_tower_ascii = text2art("CN Tower")
-        print(cn_tower_ascii)
-    except ImportError:
-        print("Missing library: art")
-        install_library("art")  # Install 'art' library if missing
-        from art import text2art
         cn_tower_ascii = text2art("CN Tower")
         print(cn_tower_ascii)
 
@@ -1452,34 +1550,25 @@ def main():
         print("Could not determine user country. Proceeding with caution.")
         user_country = "Unknown"  # Set a default value
 
-    # Try to load the saved age automatically
-    age = load_age()
-    if age is None:
-        # Age verification loop
-        while True:
-            try:
-                age = int(input(f"Enter your age (in {user_country}): "))
-                if age >= 16:
-                    save_age(age)  # Automatically save age after valid input
-                    break
-                else:
-                    print("Sorry, you must be 16 or older to play this game.")
-                    return
-            except ValueError:
-                print("Invalid input. Please enter a number.")
-    else:
-        print(f"Welcome back! Your age ({age}) was loaded automatically.")
+    if not verify_age(user_country):
+        return
+
+    if idle_policy.timeout:
+        idle_policy.jobs = kiosk.housekeeping_jobs(dialogue_data, DIALOGUE_URL, display_location)
 
     while True:
         current_location = "base"
         inventory = {"money": 40}  # Start with some money
 
+        game_history.clear()  # A new game can't undo into the last one
         clear_console()  # Clear the console at the beginning of each loop iteration
         print("Welcome to the CN Tower Experience Simulator!")
         print('Type "Help" for commands.')
 
+        restored = False  # Undo/redo just put back a room the player has already played
         while True:  # Location loop
-            current_location = display_location(current_location, inventory, sweet_mode, dialogue_data)
+            show = display_restored_location if restored else display_location
+            current_location = show(current_location, inventory, sweet_mode, dialogue_data)
             if current_location == "exit":
                 print("Thanks for playing!")
                 return  # Exit the game completely
@@ -1487,11 +1576,34 @@ def main():
                 print("Restarting the game...")
                 break  # Break out of the inner loop to restart
 
-            command = get_player_input()
+            game_history.record(current_location, inventory)  # What 'Undo' goes back to
+            command = get_player_input(on_idle=lambda: save_game(current_location, inventory,
+                                                                 slot_filename(kiosk.AUTOSAVE_SLOT)))
+            if command is None:  # The player walked away (kiosk mode)
+                print(f"Nobody's there? Your game was saved; type 'Load {kiosk.AUTOSAVE_SLOT}' to pick it up again.")
+                if idle_policy.action == "next_visitor":
+                    while True:  # An underage visitor hands the kiosk straight on
+                        pause(2)
+                        clear_console()
+                        print("Next visitor, please!")
+                        if verify_age(user_country, ask=True):
+                            break
+                break  # Start over at the base
 
             # Process the command and update the location, inventory, and sweet_mode
             new_location, inventory, sweet_mode = process_command(command, current_location, inventory, sweet_mode, dialogue_data, is_restricted)
             current_location = new_location
+            restored = command in ("undo", "redo")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play the CN Tower Experience Simulator.")
+    parser.add_argument("--idle-timeout", type=float, metavar="SECONDS",
+                        help="kiosk mode: act after this long without a keystroke at the command prompt")
+    parser.add_argument("--idle-action", choices=kiosk.IDLE_ACTIONS, default="reset",
+                        help="what going idle does after the autosave: keep waiting, start over at the base, "
+                             "or start over and ask the next visitor's age (default: reset)")
+    parser.add_argument("--idle-warning", type=float, default=kiosk.WARNING, metavar="SECONDS",
+                        help=f"show a countdown this long before the idle action (default: {kiosk.WARNING})")
+    options = parser.parse_args()
+    idle_policy = kiosk.IdlePolicy(options.idle_timeout, options.idle_action, options.idle_warning)
     main()
@@ -0,0 +1,282 @@
+"""Per-session memory footprint of the game, measured with tracemalloc.
+
+Three reports:
+
+* shared content: what a process pays once however many sessions it hosts
+  (the game modules and their imports, the dialogue tables, the art, the
+  banner, the render cache);
+* per session: many HeadlessGame sessions play the same scripted playthrough
+  in lockstep, and after every turn the memory they retain between them is
+  divided by the number of sessions, with the location they are at.  The end
+  state of one session is then broken down field by field (inventory, saved
+  games, ...), not counting the content it shares;
+* restarts: main() itself plays the playthrough and restarts over and over,
+  reading commands through its real prompt_toolkit session (fed from a pipe).
+  Memory retained per restart is fitted over the run and flagged when it keeps
+  growing, with the allocation sites responsible (e.g. a command history that
+  is never trimmed).
+
+Usage:
+    python memprofile.py
+    python memprofile.py --sessions 500 --restarts 200 --script my_script.txt
+"""
+
+import argparse  # Used for the command-line options
+import contextlib  # Used for silencing the game's output
+import gc  # Used for collecting garbage before each measurement
+import io  # Used for discarding the game's output
+import sys  # Used for sizing objects
+import tracemalloc  # Used for measuring retained memory and where it was allocated
+
+# Playthroughs (one command per line, like the fuzzer's scripts) covering most of the tower
+SCRIPTS = {
+    "tower": ["go north", "go west", "buy ticket", "back", "go north", "go north", "look around", "go down",
+              "look down", "go west", "back", "go up", "go east", "ask about history", "ask about building", "back"],
+    "gift shop": ["go east", "buy postcards", "buy souvenir", "inventory", "back", "look around", "help", "save"],
+}
+GROWTH_FLAG_BYTES = 64  # Retained bytes per restart above which growth is flagged
+WARM_UP_RESTARTS = 3  # Restarts left out of the fit (first-use caches fill during these)
+TOP_SITES = 5
+TRACE_FRAMES = 1  # Frames kept per allocation; more slows the prompt_toolkit runs down a lot
+
+
+def _traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024 or unit == "MiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def deep_size(obj, skip=(), seen=None):
+    """Returns the size of an object and everything it refers to, except objects in `skip`.
+
+    Args:
+        obj (object): The object.
+        skip (iterable, optional): Objects (and their contents) not to count, e.g. shared content.
+        seen (set, optional): Ids already counted.
+
+    Returns:
+        int: Bytes.
+    """
+    if seen is None:
+        seen = {id(item) for item in skip}
+    if id(obj) in seen or isinstance(obj, type) or callable(obj):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, skip, seen) + deep_size(value, skip, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, skip, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), skip, seen)
+    return size
+
+
+def shared_content():
+    """Measures what the process loads once for every session it hosts.
+
+    Returns:
+        list: (name, bytes) pairs.
+    """
+    rows = []
+    before = _traced()
+    import headless
+    import main
+    rows.append(("game modules and imports", _traced() - before))
+
+    before = _traced()
+    dialogue = headless.load_local_dialogue()
+    rows.append(("dialogue tables", _traced() - before))
+    rows.append(("CN Tower art", sys.getsizeof(headless.load_local_art() or "")))
+    try:
+        from art import text2art
+        rows.append(("banner", sys.getsizeof(text2art("CN Tower"))))
+    except ImportError:
+        rows.append(("banner (art not installed)", 0))
+
+    cache = main.display_location
+    game = headless.HeadlessGame(dialogue_data=dialogue, capture=True)  # Patches pauses and prompts
+    game._interactive = False
+    before = _traced()
+    with game._patched(io.StringIO()):
+        for location in headless.display_locations():
+            try:
+                cache(location, {"money": 40}, False, dialogue)
+            except EOFError:  # Rooms that ask a question
+                pass
+    rows.append((f"render cache ({len(cache.entries)} renders)", _traced() - before))
+    cache.clear()
+    return rows
+
+
+def per_session(script, sessions):
+    """Plays a script in `sessions` sessions at once and measures what each retains after every turn.
+
+    Returns:
+        tuple: (rows of (turn, command, location, bytes per session), one finished session).
+    """
+    import headless
+    import main
+
+    dialogue = headless.load_local_dialogue()
+    art = headless.load_local_art()
+    main.display_location.enabled = False  # Shared cache growth would be charged to the sessions
+    try:
+        games = []
+        base = _traced()
+        for _ in range(sessions):
+            game = headless.HeadlessGame(dialogue_data=dialogue, art=art, capture=False)
+            game.start()
+            games.append(game)
+        rows = [(0, "(start)", games[0].location, (_traced() - base) / sessions)]
+        for turn, command in enumerate(script, 1):
+            for game in games:
+                game.send(command)
+                if game.awaiting_input:
+                    game.send("1")
+            rows.append((turn, command, games[0].location, (_traced() - base) / sessions))
+    finally:
+        main.display_location.enabled = True
+    return rows, games[0]
+
+
+def session_fields(game):
+    """Breaks one session's own state down by field (shared content not counted).
+
+    Returns:
+        list: (field, bytes) pairs, largest first.
+    """
+    shared = [game.dialogue_data, game.art]
+    rows = [("HeadlessGame object", sys.getsizeof(game) + sys.getsizeof(vars(game)))]
+    seen = {id(item) for item in shared} | {id(game), id(vars(game))}
+    for name, value in vars(game).items():
+        rows.append((name, deep_size(value, seen=seen)))
+    return sorted((row for row in rows if row[1]), key=lambda row: -row[1])
+
+
+def restarts(script, count):
+    """Runs main() through `count` restarts of the playthrough and records memory at each one.
+
+    Commands go through main.get_player_input() and its prompt_toolkit session,
+    so anything the prompt keeps (history) is measured too.
+
+    Returns:
+        tuple: (list of (restart, retained bytes, history entries), the top growing
+        allocation sites as tracemalloc StatisticDiff objects).
+    """
+    import headless
+    import main
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.input import create_pipe_input
+    from prompt_toolkit.output import DummyOutput
+
+    dialogue = headless.load_local_dialogue()
+    lines = iter([*(list(script) + ["restart"]) * count, "exit"])
+    checkpoints = []
+    snapshots = []
+
+    with create_pipe_input() as pipe:
+        session = PromptSession(input=pipe, output=DummyOutput())
+        get_player_input = main.get_player_input
+
+        def typed_command(on_idle=None):
+            pipe.send_text(next(lines) + "\r")
+            return get_player_input(on_idle)
+
+        def checkpoint():  # main() clears the console at the start of every game
+            history = len(session.history.get_strings())
+            checkpoints.append((len(checkpoints), _traced(), history))
+            if len(checkpoints) in (WARM_UP_RESTARTS + 1, count + 1):
+                snapshots.append(tracemalloc.take_snapshot())
+
+        stubs = {
+            "session": session,
+            "get_player_input": typed_command,
+            "clear_console": checkpoint,
+            "check_libraries": lambda: None,
+            "load_dialogue": lambda: dialogue,
+            "load_cn_tower_art": headless.load_local_art,
+            "get_user_country": lambda: "Canada",
+            "load_age": lambda filename=None: 20,
+            "pause": lambda seconds: None,
+            "ask": lambda prompt="": "1",
+        }
+        saved = {name: getattr(main, name) for name in stubs}
+        vars(main).update(stubs)
+        try:
+            with contextlib.redirect_stdout(headless._NullOutput()):  # Kept output would look like growth
+                main.main()
+        finally:
+            vars(main).update(saved)
+    sites = []
+    if len(snapshots) == 2:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        old, new = (snapshot.filter_traces(ignore) for snapshot in snapshots)
+        sites = [stat for stat in new.compare_to(old, "lineno") if stat.size_diff > 0][:TOP_SITES]
+    return checkpoints, sites
+
+
+def growth_per_restart(checkpoints):
+    """Least-squares slope of retained bytes over restarts, after the warm-up restarts."""
+    points = [(restart, size) for restart, size, _ in checkpoints[WARM_UP_RESTARTS:]]
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def report(scripts, sessions, restart_count):
+    tracemalloc.start(TRACE_FRAMES)
+    print("Shared content (paid once per process)")
+    for name, size in shared_content():
+        print(f"  {name:<34} {_format_bytes(size):>10}")
+
+    for script_name, script in scripts.items():
+        print(f"\nPer session: {script_name!r} played by {sessions} sessions")
+        rows, game = per_session(script, sessions)
+        print(f"  {'turn':>4}  {'command':<22} {'location':<24} {'retained':>10}")
+        for turn, command, location, size in rows:
+            print(f"  {turn:>4}  {command:<22} {location:<24} {_format_bytes(size):>10}")
+        print("  One session's own state at the end:")
+        for name, size in session_fields(game):
+            print(f"    {name:<22} {_format_bytes(size):>10}")
+
+    script_name, script = next(iter(scripts.items()))
+    print(f"\nRestarts: main() playing {script_name!r} then 'restart', {restart_count} times")
+    checkpoints, sites = restarts(script, restart_count)
+    shown = checkpoints[:: max(1, len(checkpoints) // 8)]
+    for restart, size, history in shown + checkpoints[-1:] if shown[-1] is not checkpoints[-1] else shown:
+        print(f"  restart {restart:>4}: {_format_bytes(size):>10} retained, {history:>5} history entries")
+    slope = growth_per_restart(checkpoints)
+    if slope > GROWTH_FLAG_BYTES:
+        print(f"  GROWTH: {_format_bytes(slope)} more retained per restart; it grows without limit. "
+              f"Growing allocation sites:")
+        for stat in sites:
+            frame = stat.traceback[0]
+            print(f"    {_format_bytes(stat.size_diff):>10} in {stat.count_diff:>+6} blocks  "
+                  f"{frame.filename}:{frame.lineno}")
+    else:
+        print(f"  No growth across restarts ({_format_bytes(slope)} per restart).")
+    tracemalloc.stop()
+    return slope <= GROWTH_FLAG_BYTES
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the game's memory per session and across restarts.")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions playing in lockstep (default: 200)")
+    parser.add_argument("--restarts", type=int, default=30, help="restarts of main() (default: 30)")
+    parser.add_argument("--script", help="playthrough to use instead of the built-in ones (one command per line)")
+    options = parser.parse_args()
+    scripts = SCRIPTS
+    if options.script:
+        with open(options.script, "r", encoding="utf-8") as f:
+            scripts = {options.script: [line.strip() for line in f if line.strip()]}
+    sys.exit(0 if report(scripts, options.sessions, options.restarts) else 1)
@@ -0,0 +1,146 @@
+"""Skippable narrative pauses with type-ahead, for the terminal game.
+
+The scenes in display_location pause between lines (Alex Rivers' monologue,
+the elevator ride, edgewalk prep...).  pause() waits like time.sleep() but
+listens to the keyboard while it does:
+
+* any key fast-forwards the rest of the current scene: this pause and every
+  later one until the game asks the player for input again;
+* whole lines typed during a pause (ending in Enter) are queued and handed
+  to the next prompts in order, so a returning player can type the commands
+  they already know and play at their own speed;
+* a half-typed line is kept and pre-filled at the next prompt.
+
+When stdin is not a terminal (piped scripts, tests), pause() is a plain
+sleep and nothing is read ahead.
+"""
+
+import codecs  # Used for decoding keystrokes that arrive split across reads
+import collections  # Used for the queue of typed-ahead lines
+import os  # Used for reading raw keystrokes from the terminal
+import sys  # Used for finding out whether stdin is a terminal
+import time  # Used for the pause deadline and the non-terminal fallback
+
+try:  # POSIX terminals
+    import select  # Used for waiting on a keystroke with a timeout
+    import termios  # Used for restoring the terminal mode after a pause
+    import tty  # Used for reading keystrokes without waiting for Enter
+except ImportError:  # Windows
+    termios = None
+try:
+    import msvcrt  # Used for reading keystrokes on Windows
+except ImportError:
+    msvcrt = None
+
+POLL_INTERVAL = 0.02  # Seconds between keyboard checks on Windows
+
+
+class TypeAhead:
+    """Keystrokes typed during pauses, and whether the current scene is being skipped."""
+
+    def __init__(self):
+        self.lines = collections.deque()  # Complete lines waiting for a prompt
+        self.partial = ""  # Text typed after the last Enter
+        self.skipping = False  # A key was pressed: skip the scene's remaining pauses
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def feed(self, data):
+        """Adds raw keystrokes (bytes or str) to the buffer."""
+        text = self._decoder.decode(data) if isinstance(data, bytes) else data
+        for char in text:
+            if char in "\r\n":
+                if self.partial.strip():
+                    self.lines.append(self.partial.strip())
+                self.partial = ""
+            elif char in "\x7f\b":
+                self.partial = self.partial[:-1]
+            elif char.isprintable():
+                self.partial += char
+        if text:
+            self.skipping = True
+
+    def next_line(self):
+        """Ends the current scene and returns the oldest typed-ahead line, or None."""
+        self.skipping = False
+        return self.lines.popleft() if self.lines else None
+
+    def take_partial(self):
+        """Returns the half-typed text (and forgets it)."""
+        partial, self.partial = self.partial, ""
+        return partial
+
+
+typed = TypeAhead()
+
+
+def _wait_posix(seconds):
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)  # Keys arrive one by one and aren't echoed; Ctrl+C still works
+        new = termios.tcgetattr(fd)
+        new[3] &= ~termios.ECHO
+        termios.tcsetattr(fd, termios.TCSADRAIN, new)
+        deadline = time.monotonic() + seconds
+        while not typed.skipping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                typed.feed(os.read(fd, 1024))
+        # Grab whatever else was typed with the key that cut the pause short
+        while select.select([fd], [], [], 0)[0]:
+            data = os.read(fd, 1024)
+            if not data:
+                break
+            typed.feed(data)
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+def _wait_windows(seconds):
+    deadline = time.monotonic() + seconds
+    while not typed.skipping and time.monotonic() < deadline:
+        if not msvcrt.kbhit():
+            time.sleep(min(POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            continue
+        while msvcrt.kbhit():
+            typed.feed(msvcrt.getwch())
+
+
+def pause(seconds):
+    """Pauses the story for up to `seconds`; a keypress skips the rest of the scene.
+
+    Args:
+        seconds (float): How long the pause lasts if nobody touches the keyboard.
+    """
+    if typed.skipping or seconds <= 0:
+        return
+    try:
+        interactive = sys.stdin.isatty()
+    except (AttributeError, ValueError):
+        interactive = False
+    if interactive and termios is not None:
+        _wait_posix(seconds)
+    elif interactive and msvcrt is not None:
+        _wait_windows(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def ask(prompt=""):
+    """input() that first hands out lines typed during pauses (showing them after the prompt).
+
+    Args:
+        prompt (str, optional): The prompt. Defaults to "".
+
+    Returns:
+        str: The line.
+    """
+    line = typed.next_line()
+    if line is not None:
+        print(f"{prompt}{line}")
+        return line
+    partial = typed.take_partial()
+    return partial + input(prompt + partial)
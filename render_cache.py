@@ -0,0 +1,322 @@
+"""Memoized rendering of display_location.
+
+What display_location prints for a room depends only on the location, the
+few inventory entries that room's branch reads (met_alex, met_Patrick,
+worker_task, ticket...), sweet_mode and the dialogue data.  memoize() reads
+each branch of the `if location == "..."` chain once (with ast) to find
+exactly which inventory keys it reads, and records what a first visit
+printed and paused for.  A revisit with the same fingerprint replays the
+recording: one dict lookup instead of rebuilding and re-translating every
+line.
+
+A room is not cached when its branch does anything else: draws random
+numbers (Alex's shuffled support options), asks for input, changes the
+inventory, fetches content, or calls anything not known to be pure.  Those
+rooms always run for real.
+
+The cache is a bounded LRU with hit/miss counters (stats(), summary()).
+
+Usage:
+    python render_cache.py
+"""
+
+import ast  # Used for finding what each room reads
+import builtins  # Used for telling whether print() has been replaced (e.g. by HeadlessGame)
+import collections  # Used for the LRU order of cached renders
+import functools  # Used for keeping display_location's name and docstring on the wrapper
+import inspect  # Used for reading display_location's source
+import io  # Used for capturing printed text while recording a render
+import textwrap  # Used for parsing the source of an indented function
+import threading  # Used for guarding the cache between server threads
+import time  # Used for the benchmark in the command-line report
+
+DEFAULT_MAX_ENTRIES = 1024
+
+# Calls a cacheable branch may make: they only format, print, pause or read
+PURE_CALLS = frozenset({"print", "pause", "sweet_dialogue", "has_item", "range", "enumerate", "len", "str", "int"})
+_MISSING = object()  # Fingerprint value for an inventory key that isn't there
+
+
+class RoomAnalysis:
+    """What one room's branch reads, and whether its output can be cached.
+
+    Args:
+        reads (tuple): Inventory keys the branch reads.
+        reason (str, optional): Why the room can't be cached (None if it can).
+    """
+
+    def __init__(self, reads, reason=None):
+        self.reads = reads
+        self.reason = reason
+
+    @property
+    def cacheable(self):
+        return self.reason is None
+
+
+def _branches(function_node, variable):
+    """Yields (location, branch body) for the `if variable == "..."` chain in a function."""
+    for statement in function_node.body:
+        branch = statement
+        while isinstance(branch, ast.If):
+            test = branch.test
+            if (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name)
+                    and test.left.id == variable and isinstance(test.ops[0], ast.Eq)
+                    and isinstance(test.comparators[0], ast.Constant)):
+                yield test.comparators[0].value, branch.body
+            if len(branch.orelse) == 1 and isinstance(branch.orelse[0], ast.If):
+                branch = branch.orelse[0]
+            else:
+                break
+
+
+def _constant(node):
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def analyse_branch(body, inventory="inventory"):
+    """Finds the inventory keys a branch reads and anything that makes it uncacheable.
+
+    Args:
+        body (list): The branch's statements.
+        inventory (str, optional): Name of the inventory parameter. Defaults to "inventory".
+
+    Returns:
+        RoomAnalysis: The result.
+    """
+    reads = []
+    understood = set()  # ids of `inventory` Name nodes whose use is accounted for
+    reason = None
+
+    def read(key, name_node):
+        if key is None:
+            return "reads the inventory with a computed key"
+        if key not in reads:
+            reads.append(key)
+        understood.add(id(name_node))
+        return None
+
+    for statement in body:
+        for node in ast.walk(statement):
+            problem = None
+            if isinstance(node, ast.Call):
+                func = node.func
+                if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                        and func.value.id == inventory and func.attr == "get" and node.args):
+                    problem = read(_constant(node.args[0]), func.value)
+                elif (isinstance(func, ast.Name) and func.id == "has_item" and len(node.args) == 2
+                      and isinstance(node.args[0], ast.Name) and node.args[0].id == inventory):
+                    problem = read(_constant(node.args[1]), node.args[0])
+                elif isinstance(func, ast.Name) and func.id in PURE_CALLS:
+                    pass
+                elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "random":
+                    problem = "uses randomness"
+                else:
+                    problem = f"calls {ast.unparse(func)}()"
+            elif (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+                  and isinstance(node.comparators[0], ast.Name) and node.comparators[0].id == inventory):
+                problem = read(_constant(node.left), node.comparators[0])
+            elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == inventory:
+                if isinstance(node.ctx, ast.Load):
+                    problem = read(_constant(node.slice), node.value)
+                else:
+                    problem = "changes the inventory"
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                problem = "changes global state"
+            if problem and reason is None:
+                reason = problem
+    if reason is None:
+        for statement in body:
+            for node in ast.walk(statement):
+                if isinstance(node, ast.Name) and node.id == inventory and id(node) not in understood:
+                    reason = "uses the whole inventory"
+                    break
+    return RoomAnalysis(tuple(reads), reason)
+
+
+def analyse(function):
+    """Analyses every room of display_location (or a function shaped like it).
+
+    Returns:
+        dict: Location -> RoomAnalysis.
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(function)))
+    node = tree.body[0]
+    location, inventory = node.args.args[0].arg, node.args.args[1].arg
+    return {name: analyse_branch(body, inventory) for name, body in _branches(node, location)}
+
+
+class RenderCache:
+    """Bounded LRU of recorded renders, keyed by room fingerprint.
+
+    Args:
+        function (callable): display_location(location, inventory, sweet_mode, dialogue_data).
+        max_entries (int, optional): Renders kept. Defaults to DEFAULT_MAX_ENTRIES.
+    """
+
+    def __init__(self, function, max_entries=DEFAULT_MAX_ENTRIES):
+        self.function = function
+        self.max_entries = max_entries
+        self.rooms = None  # Location -> RoomAnalysis, read on first use
+        self.entries = collections.OrderedDict()  # fingerprint -> (dialogue_data, events, result)
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0  # Renders of rooms that always run for real
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._globals = function.__globals__  # print/pause are looked up here, so patches apply
+
+    def __call__(self, location, inventory, sweet_mode, dialogue_data):
+        if self.rooms is None:
+            self.rooms = analyse(self.function)
+        if not self.enabled:
+            return self.function(location, inventory, sweet_mode, dialogue_data)
+        room = self.rooms.get(location)
+        if room is None or not room.cacheable:
+            self.uncacheable += 1
+            return self.function(location, inventory, sweet_mode, dialogue_data)
+        key = (location, bool(sweet_mode), id(dialogue_data)) + tuple(inventory.get(k, _MISSING) for k in room.reads)
+        try:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+        except TypeError:  # An unhashable inventory value; render it for real
+            self.uncacheable += 1
+            return self.function(location, inventory, sweet_mode, dialogue_data)
+        if entry is not None and entry[0] is dialogue_data:
+            self.hits += 1
+            return self._replay(entry[1], entry[2])
+        self.misses += 1
+        return self._record(key, location, inventory, sweet_mode, dialogue_data)
+
+    def _replay(self, events, result):
+        emit, pause = self._globals.get("print", builtins.print), self._globals["pause"]
+        for event in events:
+            if isinstance(event, str):
+                emit(event, end="")
+            else:
+                pause(event)
+        return result
+
+    def _record(self, key, location, inventory, sweet_mode, dialogue_data):
+        g = self._globals
+        if g.get("print", builtins.print) is not builtins.print:
+            # print() is replaced (output not wanted): nothing to record
+            return self.function(location, inventory, sweet_mode, dialogue_data)
+        events = []
+        pause = g["pause"]
+        before = dict(inventory)
+
+        def recording_print(*args, **kwargs):
+            if kwargs.get("file") is not None:
+                events.append(None)  # Printed somewhere else; can't be replayed
+                return builtins.print(*args, **kwargs)
+            kwargs.pop("flush", None)
+            buffer = io.StringIO()
+            builtins.print(*args, file=buffer, **kwargs)
+            text = buffer.getvalue()
+            if events and isinstance(events[-1], str):
+                events[-1] += text
+            else:
+                events.append(text)
+            builtins.print(text, end="")
+
+        def recording_pause(seconds):
+            events.append(float(seconds))
+            pause(seconds)
+
+        saved_print = g.get("print", _MISSING)
+        g["print"], g["pause"] = recording_print, recording_pause
+        try:
+            result = self.function(location, inventory, sweet_mode, dialogue_data)
+        finally:
+            if saved_print is _MISSING:
+                del g["print"]
+            else:
+                g["print"] = saved_print
+            g["pause"] = pause
+        if None in events or inventory != before:
+            return result  # The analysis missed something; don't cache this render
+        with self._lock:
+            self.entries[key] = (dialogue_data, tuple(events), result)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def replayable(self, location):
+        """Whether showing a location again only prints (its branch has no side effects to repeat)."""
+        if self.rooms is None:
+            self.rooms = analyse(self.function)
+        room = self.rooms.get(location)
+        return room is not None and room.cacheable
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Returns the cache counters as a dictionary."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "uncacheable": self.uncacheable,
+            "evictions": self.evictions,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['entries']} renders cached, {s['hits']} hits, {s['misses']} misses "
+                f"({s['hit_rate']:.0%} hit rate), {s['uncacheable']} uncacheable, {s['evictions']} evictions")
+
+
+def memoize(function=None, max_entries=DEFAULT_MAX_ENTRIES):
+    """Decorator that puts a RenderCache in front of display_location."""
+    if function is None:
+        return lambda f: memoize(f, max_entries)
+    cache = RenderCache(function, max_entries)
+    functools.update_wrapper(cache, function)
+    return cache
+
+
+def _benchmark(rounds=2000):
+    """Times revisits of every cacheable room, cached and uncached, with output discarded."""
+    import contextlib
+    import headless
+    import main
+
+    dialogue = headless.load_local_dialogue()
+    cache = main.display_location
+    rooms = analyse(cache.function)
+    cacheable = sorted(name for name, room in rooms.items() if room.cacheable)
+    print(f"{len(cacheable)} of {len(rooms)} rooms cacheable")
+    for name, room in sorted(rooms.items()):
+        print(f"  {name:<28} {'reads ' + ', '.join(room.reads) if room.cacheable else 'not cached: ' + room.reason}")
+    saved_pause, main.pause = main.pause, lambda seconds: None
+    try:
+        for sweet in (False, True):
+            timings = {}
+            for enabled in (False, True):
+                cache.enabled = enabled
+                cache.clear()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    for _ in range(rounds):
+                        for name in cacheable:
+                            cache(name, {"money": 40}, sweet, dialogue)
+                    timings[enabled] = (time.perf_counter() - started) / (rounds * len(cacheable))
+            print(f"sweet_mode={sweet}: {timings[False] * 1e6:.1f} us per render uncached, "
+                  f"{timings[True] * 1e6:.1f} us cached ({timings[False] / timings[True]:.1f}x)")
+    finally:
+        main.pause = saved_pause
+        cache.enabled = True
+    print(cache.summary())
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,337 @@
+"""Content-addressed, compressed storage for saved games and hibernated sessions.
+
+A saved state (a dict: location, inventory, a whole session snapshot...) is
+split into chunks the way git stores a tree: every dict becomes a tree chunk
+mapping its keys to references, and any value whose JSON is longer than
+INLINE_BYTES becomes a chunk of its own.  Small values stay inline in their
+parent.  A chunk is named by the SHA-256 of its canonical JSON and written
+compressed (zlib or lzma) only if no chunk of that name exists yet.  The same
+inventory saved in ten slots by a thousand players is therefore stored once,
+and disk use grows with unique state rather than with the number of saves.
+
+    <directory>/objects/ab/cdef...     one compressed chunk (a codec byte, then the data)
+    <directory>/slots/<owner>/<slot>   the slot's manifest: the root reference and when it was saved
+
+Slots are grouped by owner (a player or a session) and named freely
+("savegame.json", "autosave", ...).  Overwriting or deleting a slot leaves
+its chunks behind; collect() sweeps chunks no manifest reaches any more.  It
+runs in a background thread (start_collector()), and one collection at a time
+runs across every process sharing the directory.  A chunk is only swept once
+it has gone unreferenced for GRACE_SECONDS: put() refreshes the timestamp of
+each chunk it reuses, so a save that is writing its manifest as the collector
+runs keeps its chunks.
+
+Usage:
+    python save_store.py --stats /tmp/cn_tower_sessions
+    python save_store.py --collect /tmp/cn_tower_sessions
+"""
+
+import argparse  # Used for the command-line options
+import hashlib  # Used for naming chunks by their content
+import json  # Used for the canonical form of chunks and for manifests
+import lzma  # Used for the optional higher-ratio codec
+import os  # Used for chunk and manifest files
+import threading  # Used for the background collector
+import time  # Used for manifest timestamps and the collection grace period
+import urllib.parse  # Used for turning owner and slot names into file names
+import zlib  # Used for the default codec
+
+try:
+    import fcntl  # Used for running one collection at a time across processes
+except ImportError:  # Windows: collections in different processes may overlap, which is harmless
+    fcntl = None
+
+INLINE_BYTES = 48  # Values with longer JSON get a chunk of their own
+GRACE_SECONDS = 60  # Unreferenced chunks younger than this are kept (a save may be writing its manifest)
+GC_INTERVAL = 300  # Seconds between background collections
+CODECS = {
+    "zlib": (b"z", lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (b"x", lzma.compress, lzma.decompress),
+}
+DECOMPRESS = {tag: decompress for tag, _, decompress in CODECS.values()}
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _quote(name):
+    return urllib.parse.quote(str(name), safe="") or "%00"
+
+
+class SaveStore:
+    """Stores saved states as deduplicated, compressed chunks in a folder.
+
+    Args:
+        directory (str): Folder for chunks and manifests (created if needed).
+        codec (str, optional): "zlib" or "lzma" for new chunks. Defaults to "zlib".
+        grace (float, optional): Seconds an unreferenced chunk survives collection. Defaults to GRACE_SECONDS.
+    """
+
+    def __init__(self, directory, codec="zlib", grace=GRACE_SECONDS):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}; choose from {', '.join(CODECS)}.")
+        self.directory = directory
+        self.codec = codec
+        self.grace = grace
+        self.objects = os.path.join(directory, "objects")
+        self.manifests = os.path.join(directory, "slots")
+        self.chunks_written = 0
+        self.chunks_reused = 0
+        self.bytes_written = 0
+        self.collections = 0
+        self._collector = None
+        self._stop = threading.Event()
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.manifests, exist_ok=True)
+
+    # --- chunks ------------------------------------------------------------
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def _write_chunk(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        try:
+            os.utime(path)  # Already stored; now recently used, so a running collection keeps it
+            self.chunks_reused += 1
+            return digest
+        except FileNotFoundError:
+            pass
+        tag, compress, _ = CODECS[self.codec]
+        packed = tag + compress(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(packed)
+        os.replace(temporary, path)  # Atomic, and two writers of one chunk write the same bytes
+        self.chunks_written += 1
+        self.bytes_written += len(packed)
+        return digest
+
+    def _read_chunk(self, digest):
+        with open(self._chunk_path(digest), "rb") as f:
+            packed = f.read()
+        return json.loads(DECOMPRESS[packed[:1]](packed[1:]))
+
+    def _store(self, value):
+        """Writes a value's chunks and returns its reference: ["=", value] inline or ["#", digest]."""
+        if isinstance(value, dict):
+            data = _canonical(value)
+            if len(data) <= INLINE_BYTES:
+                return ["=", value]
+            tree = {str(key): self._store(item) for key, item in value.items()}
+            return ["#", self._write_chunk(_canonical({"tree": tree}))]
+        data = _canonical(value)
+        if len(data) <= INLINE_BYTES:
+            return ["=", value]
+        return ["#", self._write_chunk(_canonical({"blob": value}))]
+
+    def _load(self, reference):
+        kind, value = reference
+        if kind == "=":
+            return value
+        chunk = self._read_chunk(value)
+        if "tree" in chunk:
+            return {key: self._load(item) for key, item in chunk["tree"].items()}
+        return chunk["blob"]
+
+    # --- slots -------------------------------------------------------------
+
+    def _manifest_path(self, owner, slot):
+        return os.path.join(self.manifests, _quote(owner), _quote(slot))
+
+    def put(self, owner, slot, state):
+        """Saves a state in a slot, replacing what the slot held.
+
+        Args:
+            owner (str): Whose slot it is (a player or session id).
+            slot (str): The slot's name.
+            state: Any JSON-compatible value (usually a dict).
+        """
+        manifest = _canonical({"root": self._store(state), "saved": time.time()})
+        path = self._manifest_path(owner, slot)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(manifest)
+        os.replace(temporary, path)
+
+    def get(self, owner, slot):
+        """Returns the state saved in a slot.
+
+        Raises:
+            KeyError: If the slot is empty.
+        """
+        try:
+            with open(self._manifest_path(owner, slot), "rb") as f:
+                manifest = json.loads(f.read())
+        except FileNotFoundError:
+            raise KeyError((owner, slot)) from None
+        return self._load(manifest["root"])
+
+    def slots(self, owner):
+        """Returns the names of an owner's slots, sorted."""
+        try:
+            names = os.listdir(os.path.join(self.manifests, _quote(owner)))
+        except FileNotFoundError:
+            return []
+        return sorted(urllib.parse.unquote(name) for name in names if not name.endswith(".tmp"))
+
+    def owners(self):
+        """Returns every owner with at least one slot, sorted."""
+        return sorted(urllib.parse.unquote(name) for name in os.listdir(self.manifests))
+
+    def delete(self, owner, slot=None):
+        """Empties one of an owner's slots, or all of them if no slot is given.
+
+        Chunks are freed by the next collection.
+        """
+        folder = os.path.join(self.manifests, _quote(owner))
+        names = [_quote(slot)] if slot is not None else os.listdir(folder) if os.path.isdir(folder) else []
+        for name in names:
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(folder)
+        except OSError:  # Still has slots, or already gone
+            pass
+
+    # --- garbage collection --------------------------------------------------
+
+    def _manifest_files(self):
+        for owner in os.listdir(self.manifests):
+            folder = os.path.join(self.manifests, owner)
+            try:
+                names = os.listdir(folder)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(folder, name)
+
+    def _mark(self, reference, live):
+        kind, value = reference
+        if kind != "#" or value in live:
+            return
+        live.add(value)
+        try:
+            chunk = self._read_chunk(value)
+        except FileNotFoundError:
+            return
+        for item in chunk.get("tree", {}).values():
+            self._mark(item, live)
+
+    def collect(self):
+        """Deletes chunks that no slot refers to (mark and sweep).
+
+        Returns:
+            tuple: (chunks deleted, bytes freed), or (0, 0) if another process is collecting.
+        """
+        lock = open(os.path.join(self.directory, "collect.lock"), "a")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0, 0
+            cutoff = time.time() - self.grace  # Chunks touched after this may belong to a save in progress
+            live = set()
+            for path in self._manifest_files():
+                try:
+                    with open(path, "rb") as f:
+                        self._mark(json.loads(f.read())["root"], live)
+                except (FileNotFoundError, ValueError):
+                    continue  # Deleted meanwhile
+            deleted = freed = 0
+            for prefix in os.listdir(self.objects):
+                folder = os.path.join(self.objects, prefix)
+                for name in os.listdir(folder):
+                    path = os.path.join(folder, name)
+                    try:
+                        info = os.stat(path)
+                        if prefix + name not in live and info.st_mtime < cutoff:
+                            os.remove(path)
+                            deleted += 1
+                            freed += info.st_size
+                    except FileNotFoundError:
+                        pass
+            self.collections += 1
+            return deleted, freed
+        finally:
+            lock.close()
+
+    def start_collector(self, interval=GC_INTERVAL):
+        """Runs collect() every `interval` seconds in a daemon thread (once per store)."""
+        if self._collector is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.collect()
+                except OSError as e:
+                    print(f"Save store collection failed: {e}")
+
+        self._collector = threading.Thread(target=run, name="save-store-collector", daemon=True)
+        self._collector.start()
+
+    def stop_collector(self):
+        """Stops the background collector."""
+        if self._collector is not None:
+            self._stop.set()
+            self._collector.join()
+            self._collector = None
+
+    # --- reporting -----------------------------------------------------------
+
+    def usage(self):
+        """Counts what is on disk.
+
+        Returns:
+            dict: slots, chunks, and bytes used by chunks and manifests.
+        """
+        slots = manifest_bytes = chunks = chunk_bytes = 0
+        for path in self._manifest_files():
+            slots += 1
+            manifest_bytes += os.path.getsize(path)
+        for prefix in os.listdir(self.objects):
+            folder = os.path.join(self.objects, prefix)
+            for name in os.listdir(folder):
+                chunks += 1
+                chunk_bytes += os.path.getsize(os.path.join(folder, name))
+        return {"slots": slots, "chunks": chunks, "chunk_bytes": chunk_bytes, "manifest_bytes": manifest_bytes}
+
+    def summary(self):
+        """Describes chunk reuse in this process."""
+        total = self.chunks_written + self.chunks_reused
+        reused = self.chunks_reused / total * 100 if total else 0.0
+        return (f"{self.chunks_written} chunks written ({self.bytes_written / 1024:.1f} KiB), "
+                f"{reused:.0f}% of chunk writes deduplicated, {self.collections} collections")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or collect a save store.")
+    parser.add_argument("directory", help="the store's folder (e.g. the server's --hibernate-dir)")
+    parser.add_argument("--stats", action="store_true", help="show slots, chunks and the space they take")
+    parser.add_argument("--collect", action="store_true", help="delete chunks no slot refers to")
+    parser.add_argument("--grace", type=float, default=GRACE_SECONDS,
+                        help=f"keep unreferenced chunks younger than this many seconds (default: {GRACE_SECONDS})")
+    options = parser.parse_args()
+    store = SaveStore(options.directory, grace=options.grace)
+    if options.collect:
+        deleted, freed = store.collect()
+        print(f"Deleted {deleted} chunks, freed {freed / 1024:.1f} KiB.")
+    if options.stats or not options.collect:
+        logical = 0
+        for owner in store.owners():
+            for slot in store.slots(owner):
+                logical += len(_canonical(store.get(owner, slot)))
+        used = store.usage()
+        stored = used["chunk_bytes"] + used["manifest_bytes"]
+        print(f"{used['slots']} slots in {len(store.owners())} owners: {logical / 1024:.1f} KiB of state "
+              f"stored in {used['chunks']} chunks; {stored / 1024:.1f} KiB on disk with manifests")
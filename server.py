@@ -0,0 +1,924 @@
+"""Hosted CN Tower game server.
+
+Players connect over plain TCP (telnet, nc) and play the same game as
+`python main.py`; each connection is a HeadlessGame session.
+
+In prefork mode the parent loads everything once (imports, dialogue, art,
+banner, the country lookup), warms the game code up and freezes the heap, then
+forks worker processes that share all of it copy-on-write.  Workers accept
+connections from the shared listening socket, each running an asyncio loop
+that serves many sessions.  A worker retires after a configurable number of
+sessions: it stops accepting, tells the parent (which forks a replacement
+straight away), finishes its open sessions and exits.
+
+Only the most recently used sessions stay in memory (--max-hot); idle ones are
+hibernated to a SaveStore (save_store.py) and rehydrated on their next command,
+so memory stays bounded however many players sit at the prompt.  Games players
+save go to the same store, so the state sessions have in common is stored once.
+
+Usage:
+    python server.py --port 7777 --workers 4 --sessions-per-worker 1000 --admin-socket /tmp/cn_tower_admin.sock
+    nc localhost 7777
+    python admin.py --socket /tmp/cn_tower_admin.sock list
+"""
+
+import argparse  # Used for the command-line options
+import asyncio  # Used for serving many sessions per worker
+import collections  # Used for the LRU order of in-memory sessions and per-session turn times
+import contextlib  # Used for editing hibernated sessions in place
+import gc  # Used for freezing the warm heap before forking, so it stays shared
+import secrets  # Used for spectator codes
+import os  # Used for forking workers and the retire pipe
+import select  # Used for waiting on worker notifications in the parent
+import signal  # Used for stopping workers when the parent shuts down
+import socket  # Used for the shared listening socket
+import struct  # Used for packing worker pids into retire notifications
+import tempfile  # Used for the default hibernation folder
+import time  # Used for measuring session startup and rehydration latency
+import traceback  # Used for logging game errors without dropping the worker
+import uuid  # Used for naming sessions
+
+import admin
+import headless
+import location_plugins
+import main
+import save_store
+
+DEFAULT_PORT = 7777
+MIN_AGE = 16
+DEFAULT_HIBERNATE_DIR = os.path.join(tempfile.gettempdir(), "cn_tower_sessions")
+STATS_INTERVAL = 60  # Seconds between stats lines in the server log
+VIEWER_BUFFER_BYTES = 64 * 1024  # Unsent bytes a spectator may lag by before it is dropped
+FANOUT_BATCH = 64  # Spectators sent a frame between yields to the event loop
+SESSION_TURN_TIMES = 100  # Turn times kept per session (for the admin console)
+SESSION_SLOT = "session"  # Save store slot a hibernated session is kept in (saved games use their file names)
+
+
+def percentile(values, fraction):
+    """Returns the value at a fraction (0-1) of the sorted values, or 0.0 if there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class GameContent:
+    """Everything a session needs that is the same for every player.
+
+    Loaded once per server (in the parent, before forking).  The country check
+    runs for the machine hosting the game, like main() does for a local player.
+    With an IP-range table (CN_TOWER_IP_TABLE, see country_index.py), each
+    player's own address is checked too.
+    """
+
+    def __init__(self, dialogue_data, art, banner, country, is_restricted):
+        self.dialogue_data = dialogue_data
+        self.art = art
+        self.banner = banner
+        self.country = country
+        self.is_restricted = is_restricted
+
+    @classmethod
+    def load(cls):
+        """Fetches and prepares the shared content, falling back to the bundled files."""
+        dialogue_data = main.load_dialogue() or headless.load_local_dialogue()
+        art = main.load_cn_tower_art() or headless.load_local_art()
+        try:
+            from art import text2art
+            banner = text2art("CN Tower")
+        except ImportError:
+            banner = "CN Tower\n"
+        country = main.get_user_country()
+        is_restricted = country in main.RESTRICTED_COUNTRIES
+        return cls(dialogue_data, art, banner, country, is_restricted)
+
+    @classmethod
+    def local(cls):
+        """Uses only the bundled files and skips the country check (no network, e.g. for benchmarks)."""
+        return cls(headless.load_local_dialogue(), headless.load_local_art(), "CN Tower\n", None, False)
+
+    def new_game(self, ip=None):
+        """Creates a fresh session that shares this content.
+
+        Args:
+            ip (str, optional): The player's address, checked against the IP-range table if there is one.
+        """
+        return headless.HeadlessGame(dialogue_data=self.dialogue_data, art=self.art,
+                                     is_restricted=self.restricted_for(ip))
+
+    def restricted_for(self, ip):
+        """Whether a player connecting from `ip` gets the restricted game."""
+        if self.is_restricted or not ip:
+            return self.is_restricted
+        try:
+            import country_index  # Needs pytz, which is optional
+        except ImportError:
+            return False
+        return country_index.ip_country(ip) in main.RESTRICTED_COUNTRIES
+
+    def warm_up(self):
+        """Plays a short game and imports every location plugin, so every code path a session hits is loaded."""
+        self.restricted_for("127.0.0.1")  # Loads the country index and IP table once, before forking
+        game = self.new_game()
+        game.start()
+        for command in ("go east", "buy souvenir", "back", "go north", "go west", "buy ticket", "back", "exit"):
+            game.send(command)
+        headless.command_table()
+        location_plugins.preload()  # The whole world, so forked workers share the plugin code too
+
+
+class SessionStore:
+    """Keeps the hottest sessions in memory and hibernates the rest to disk.
+
+    At most `max_hot` sessions are held in memory, in least-recently-used
+    order; getting one more pushes the coldest out to the save store.
+    Sessions idle for longer than `idle_timeout` seconds are hibernated too.
+    get() rehydrates a hibernated session transparently and records how long
+    that took.  Each session's saved games live in the same store, under the
+    session id, and are deleted with the session.
+
+    Args:
+        content (GameContent): Shared content handed to rehydrated sessions.
+        directory (str): Folder for the save store.
+        max_hot (int, optional): Sessions kept in memory. Defaults to 1000.
+        idle_timeout (float, optional): Seconds of inactivity before hibernating. Defaults to 300.
+        saves (SaveStore, optional): The store to use instead of one in `directory`.
+        id_prefix (str, optional): Start of every session id, e.g. the shard that owns them. Defaults to none.
+    """
+
+    def __init__(self, content, directory=DEFAULT_HIBERNATE_DIR, max_hot=1000, idle_timeout=300, saves=None,
+                 id_prefix=""):
+        self.content = content
+        self.id_prefix = id_prefix
+        self.directory = directory
+        self.max_hot = max(1, max_hot)
+        self.idle_timeout = idle_timeout
+        self.saves = saves if saves is not None else save_store.SaveStore(directory)
+        self._hot = collections.OrderedDict()  # session id -> (game, last used)
+        self._cold = set()  # Ids of hibernated sessions
+        self.hibernations = 0
+        self.rehydrate_times = []  # Seconds per rehydration (most recent 10,000)
+
+    def __len__(self):
+        return len(self._hot) + len(self._cold)
+
+    def __contains__(self, session_id):
+        return session_id in self._hot or session_id in self._cold
+
+    def add(self, game):
+        """Stores a new session and returns its id."""
+        session_id = self.id_prefix + uuid.uuid4().hex
+        game.save_store, game.save_owner = self.saves, session_id
+        self._hot[session_id] = (game, time.monotonic())
+        self._evict()
+        return session_id
+
+    def get(self, session_id):
+        """Returns a session, rehydrating it from disk if it was hibernated.
+
+        Raises:
+            KeyError: If there is no such session.
+        """
+        if session_id in self._hot:
+            game, _ = self._hot.pop(session_id)
+        elif session_id in self._cold:
+            started = time.perf_counter()
+            data = self.saves.get(session_id, SESSION_SLOT)
+            self.saves.delete(session_id, SESSION_SLOT)
+            self._cold.discard(session_id)
+            game = headless.HeadlessGame.from_snapshot(
+                data, dialogue_data=self.content.dialogue_data, art=self.content.art,
+                save_store=self.saves, save_owner=session_id)
+            self.rehydrate_times.append(time.perf_counter() - started)
+            del self.rehydrate_times[:-10000]
+        else:
+            raise KeyError(session_id)
+        self._hot[session_id] = (game, time.monotonic())  # Most recently used goes last
+        self._evict(keep=session_id)
+        return game
+
+    def hibernate(self, session_id):
+        """Writes a session to disk and drops it from memory."""
+        game, _ = self._hot.pop(session_id)
+        self.saves.put(session_id, SESSION_SLOT, game.snapshot())
+        self._cold.add(session_id)
+        self.hibernations += 1
+
+    def hibernate_idle(self):
+        """Hibernates every session that has been idle for longer than idle_timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id, (_, last_used) in list(self._hot.items()):
+            if last_used > cutoff:
+                break  # The rest were used more recently
+            self.hibernate(session_id)
+
+    def _evict(self, keep=None):
+        while len(self._hot) > self.max_hot:
+            coldest = next(iter(self._hot))
+            if coldest == keep:
+                break
+            self.hibernate(coldest)
+
+    def ids(self):
+        """Returns the ids of every session, in memory or hibernated."""
+        return list(self._hot) + list(self._cold)
+
+    def is_hibernated(self, session_id):
+        """Returns True if the session is on disk rather than in memory."""
+        return session_id in self._cold
+
+    def peek(self, session_id):
+        """Returns a session for reading without moving it: a hibernated one is read from disk and stays there.
+
+        Raises:
+            KeyError: If there is no such session.
+        """
+        if session_id in self._hot:
+            return self._hot[session_id][0]
+        if session_id in self._cold:
+            return headless.HeadlessGame.from_snapshot(
+                self.saves.get(session_id, SESSION_SLOT), dialogue_data=self.content.dialogue_data,
+                art=self.content.art, save_store=self.saves, save_owner=session_id)
+        raise KeyError(session_id)
+
+    @contextlib.contextmanager
+    def edit(self, session_id):
+        """Yields a session to change without moving it; a hibernated one is written back when done.
+
+        Raises:
+            KeyError: If there is no such session.
+        """
+        game = self.peek(session_id)
+        yield game
+        if session_id in self._cold:
+            self.saves.put(session_id, SESSION_SLOT, game.snapshot())
+
+    def discard(self, session_id):
+        """Forgets a session (in memory or on disk) and its saved games."""
+        self._hot.pop(session_id, None)
+        self._cold.discard(session_id)
+        self.saves.delete(session_id)
+
+    def summary(self):
+        """Describes memory use and rehydration latency."""
+        times = self.rehydrate_times
+        return (f"{len(self._hot)} in memory, {len(self._cold)} hibernated, "
+                f"{self.hibernations} hibernations, {len(times)} rehydrations "
+                f"(p50 {percentile(times, 0.5) * 1000:.3f} ms, p99 {percentile(times, 0.99) * 1000:.3f} ms); "
+                f"save store: {self.saves.summary()}")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`.
+
+    Args:
+        rate (float): Tokens added per second (0 disables the limit).
+        burst (float): Bucket size, i.e. how many actions may happen back to back.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0.0 if one is available now)."""
+        if not self.rate:
+            return 0.0
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Uses up one token (may go negative if called without waiting)."""
+        if self.rate:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+
+
+class AdmissionControl:
+    """Protects a server from clients that flood it.
+
+    Commands are rate limited by a token bucket per connection and another per
+    source IP (shared by all of that IP's connections); a client over its limit
+    simply isn't read from until it has a token again, so TCP pushes back on it.
+    At most `max_active` sessions play at once; further connections wait in a
+    queue of `queue_size` for up to `queue_timeout` seconds and are turned away
+    with an overload message when the queue is full or the wait runs out.
+
+    Args:
+        max_active (int, optional): Concurrent sessions (0 for no cap). Defaults to 1000.
+        queue_size (int, optional): Connections allowed to wait for a slot. Defaults to 100.
+        queue_timeout (float, optional): Seconds a queued connection waits. Defaults to 30.
+        conn_rate (float, optional): Commands per second per connection (0 for no limit). Defaults to 5.
+        conn_burst (float, optional): Commands a connection may send back to back. Defaults to 10.
+        ip_rate (float, optional): Commands per second per source IP (0 for no limit). Defaults to 20.
+        ip_burst (float, optional): Commands an IP may send back to back. Defaults to 40.
+    """
+
+    def __init__(self, max_active=1000, queue_size=100, queue_timeout=30,
+                 conn_rate=5, conn_burst=10, ip_rate=20, ip_burst=40):
+        self.max_active = max_active
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.conn_rate, self.conn_burst = conn_rate, conn_burst
+        self.ip_rate, self.ip_burst = ip_rate, ip_burst
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.throttled = 0  # Commands that had to wait for a token
+        self._slots = None
+        self._ip_buckets = {}  # ip -> TokenBucket
+
+    async def admit(self, write):
+        """Waits for a session slot.
+
+        Args:
+            write (coroutine function): Sends a message to the client.
+
+        Returns:
+            bool: True if admitted (call release() when the session ends), False if turned away.
+        """
+        if not self.max_active:
+            self.active += 1
+            return True
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_active)
+        if self._slots.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                await write("The CN Tower is too busy right now. Please try again later.\n")
+                return False
+            await write(f"The CN Tower is full. You are number {self.waiting + 1} in the queue...\n")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            await write("Sorry, the queue took too long. Please try again later.\n")
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        """Frees the slot of a finished session."""
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def connection_bucket(self):
+        """Creates the command bucket for a new connection."""
+        return TokenBucket(self.conn_rate, self.conn_burst)
+
+    async def throttle(self, bucket, ip):
+        """Waits until both the connection and its IP may send another command."""
+        ip_bucket = self._ip_buckets.get(ip)
+        if ip_bucket is None:
+            ip_bucket = self._ip_buckets[ip] = TokenBucket(self.ip_rate, self.ip_burst)
+        delay = max(bucket.wait_time(), ip_bucket.wait_time())
+        if delay:
+            self.throttled += 1
+            while delay:
+                await asyncio.sleep(delay)
+                delay = max(bucket.wait_time(), ip_bucket.wait_time())
+        bucket.take()
+        ip_bucket.take()
+
+    def forget_idle_ips(self):
+        """Drops buckets of IPs that have refilled completely (they'd be recreated full anyway)."""
+        for ip, bucket in list(self._ip_buckets.items()):
+            bucket._refill(time.monotonic())
+            if bucket.tokens >= bucket.burst:
+                del self._ip_buckets[ip]
+
+    def summary(self):
+        """Describes current load and how often limits kicked in."""
+        return (f"{self.active} active, {self.waiting} queued, {self.rejected} turned away, "
+                f"{self.throttled} commands throttled")
+
+
+class FairScheduler:
+    """Runs game turns one at a time, round-robin across clients.
+
+    Turns are queued per key (the client's IP) and the scheduler takes one turn
+    from each key in turn, yielding to the event loop between turns.  A client
+    with many connections or a deep backlog therefore gets no more turns per
+    round than anybody else, and network I/O keeps flowing in between.
+    """
+
+    def __init__(self):
+        self._queues = collections.OrderedDict()  # key -> deque of (function, future)
+        self._wakeup = None
+        self.turns = 0
+        self.turn_times = []  # Seconds spent running each turn (most recent 10,000)
+
+    def run(self, key, function):
+        """Queues function() as a turn for a client and returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, collections.deque()).append((function, future))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    async def loop(self):
+        """Runs queued turns forever (start it as a task)."""
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, queue = self._queues.popitem(last=False)
+            function, future = queue.popleft()
+            if queue:
+                self._queues[key] = queue  # Back of the line
+            if not future.cancelled():
+                started = time.perf_counter()
+                try:
+                    future.set_result(function())
+                except Exception as e:
+                    future.set_exception(e)
+                self.turns += 1
+                self.turn_times.append(time.perf_counter() - started)
+                del self.turn_times[:-10000]
+            await asyncio.sleep(0)
+
+
+def encode(text):
+    """Encodes game text for the wire (CRLF line endings, UTF-8)."""
+    return text.replace("\n", "\r\n").encode("utf-8")
+
+
+class Broadcast:
+    """One session's output, fanned out to the spectators watching it.
+
+    Each turn is encoded once into an immutable bytes frame, and every
+    spectator's connection is handed that same object; nothing is copied per
+    spectator unless its socket can't take the frame at once, in which case
+    the connection buffers the rest.  Spectators get no queue of their own:
+    one that has more than `max_buffered` bytes waiting (a slow connection) is
+    dropped instead.
+
+    publish() only appends the frame and wakes the broadcast's fan-out task,
+    so it costs the player the same however many people watch.  The task then
+    writes the frame to FANOUT_BATCH spectators at a time, letting other turns
+    run in between, so a popular stream can't hold up anybody's game.
+
+    Args:
+        code (str): What spectators type to watch this session.
+        max_buffered (int, optional): Bytes a spectator may lag by. Defaults to VIEWER_BUFFER_BYTES.
+    """
+
+    def __init__(self, code, max_buffered=VIEWER_BUFFER_BYTES):
+        self.code = code
+        self.max_buffered = max_buffered
+        self.viewers = []  # StreamWriters of the spectators
+        self.latest = None  # Last frame, shown to spectators as they join
+        self.frames = 0
+        self.dropped = 0
+        self.closed = False
+        self._pending = collections.deque()  # Frames not fanned out yet
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._fan_out())
+
+    def publish(self, frame):
+        """Queues a frame (bytes) for every spectator."""
+        self.latest = frame
+        self.frames += 1
+        self._pending.append(frame)
+        self._wakeup.set()
+
+    def add(self, writer):
+        """Starts sending frames to a spectator, beginning with the latest one."""
+        if self.latest is not None:
+            writer.write(self.latest)
+        self.viewers.append(writer)
+
+    def close(self):
+        """Ends the broadcast; spectators get the frames still queued, then are disconnected."""
+        self.closed = True
+        self._wakeup.set()
+
+    async def _fan_out(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                frame = self._pending.popleft()
+                for i, writer in enumerate(list(self.viewers)):
+                    transport = writer.transport
+                    if transport.is_closing():
+                        self.viewers.remove(writer)
+                    elif transport.get_write_buffer_size() > self.max_buffered:
+                        self.viewers.remove(writer)
+                        self.dropped += 1
+                        transport.abort()  # It couldn't read the goodbye either
+                    else:
+                        writer.write(frame)
+                    if i % FANOUT_BATCH == FANOUT_BATCH - 1:
+                        await asyncio.sleep(0)  # Let turns run between batches
+            if self.closed:
+                for writer in self.viewers:
+                    writer.write(encode("\nThe game has ended.\n"))
+                    writer.close()
+                self.viewers = []
+                return
+
+
+class Connection:
+    """A player's connection to a session: where from, and how fast its turns have been."""
+
+    def __init__(self, ip, writer):
+        self.ip = ip
+        self.writer = writer
+        self.connected = time.time()
+        self.last_turn = time.monotonic()
+        self.turn_times = collections.deque(maxlen=SESSION_TURN_TIMES)  # Seconds per turn
+
+
+class GameServer:
+    """Serves game sessions over TCP from one asyncio loop.
+
+    Sessions live in a SessionStore, so idle ones can be hibernated while the
+    connection stays open.  With a watch port, every session is also a
+    Broadcast: spectators connect to that port, type the code the player was
+    given, and see the game as it is played.
+
+    Args:
+        content (GameContent): The shared content.
+        store (SessionStore, optional): Where sessions are kept. Defaults to an in-memory-first store.
+        max_sessions (int, optional): Sessions to serve before retiring. Defaults to no limit.
+        on_retire (callable, optional): Called once when the server stops accepting.
+        admission (AdmissionControl, optional): Session cap and rate limits. Defaults to the standard limits.
+        watch_port (int, optional): Port spectators connect to. Defaults to no spectators.
+        admin_socket (str, optional): Unix socket path for the admin console (admin.py). Defaults to none.
+    """
+
+    def __init__(self, content, store=None, max_sessions=None, on_retire=None, admission=None, watch_port=None,
+                 admin_socket=None):
+        self.content = content
+        self.store = store if store is not None else SessionStore(content)
+        self.admission = admission if admission is not None else AdmissionControl()
+        self.scheduler = FairScheduler()
+        self.max_sessions = max_sessions
+        self.on_retire = on_retire
+        self.sessions_started = 0
+        self.retiring = False
+        self.active = set()
+        self.startup_times = []  # Seconds from accept to the first game prompt
+        self.watch_port = watch_port
+        self.broadcasts = {}  # Spectator code -> Broadcast of a running session
+        self.viewers_dropped = 0  # Spectators of finished broadcasts dropped for lagging
+        self.connections = {}  # Session id -> Connection of the player playing it
+        self.admin_socket = admin_socket
+        self._server = None
+        self._watch_server = None
+        self._admin = None
+        self._done = None
+
+    async def _write(self, writer, text):
+        writer.write(encode(text))
+        await writer.drain()
+
+    async def _read_line(self, reader):
+        data = await reader.readline()
+        if not data:
+            raise EOFError
+        return data.decode("utf-8", "replace").rstrip("\r\n")
+
+    async def _check_age(self, reader, writer):
+        """Asks for the player's age like main() does; returns False if they may not play."""
+        while True:
+            await self._write(writer, f"Enter your age (in {self.content.country or 'Unknown'}): ")
+            line = await self._read_line(reader)
+            try:
+                age = int(line)
+            except ValueError:
+                await self._write(writer, "Invalid input. Please enter a number.\n")
+                continue
+            if age >= MIN_AGE:
+                return True
+            await self._write(writer, f"Sorry, you must be {MIN_AGE} or older to play this game.\n")
+            return False
+
+    def _play(self, session_id, line):
+        """Runs one turn (called by the scheduler) and returns (text, finished)."""
+        started = time.perf_counter()
+        game = self.store.get(session_id)
+        text = game.send(line)
+        connection = self.connections.get(session_id)
+        if connection is not None:
+            connection.turn_times.append(time.perf_counter() - started)
+            connection.last_turn = time.monotonic()
+        if not (game.awaiting_input or game.finished):
+            text += "> "
+        return text, game.finished
+
+    async def handle(self, reader, writer):
+        """Runs one player's session on a connection."""
+        accepted = time.perf_counter()
+        task = asyncio.current_task()
+        self.active.add(task)
+        self.sessions_started += 1
+        if self.max_sessions and self.sessions_started >= self.max_sessions:
+            self.retire()
+        peer = writer.get_extra_info("peername")
+        ip = peer[0] if peer else "?"
+        admitted = False
+        session_id = None
+        broadcast = None
+        try:
+            admitted = await self.admission.admit(lambda text: self._write(writer, text))
+            if not admitted:
+                return
+            game = self.content.new_game(ip)
+            opening = game.start() + "> "
+            await self._write(writer, self.content.banner + opening)
+            self.startup_times.append(time.perf_counter() - accepted)
+            del self.startup_times[:-10000]
+            if not await self._check_age(reader, writer):
+                return
+            session_id = self.store.add(game)
+            del game  # Only the store holds sessions, so it can hibernate them
+            self.connections[session_id] = Connection(ip, writer)
+            if self.watch_port is not None:
+                broadcast = Broadcast(secrets.token_hex(3))
+                self.broadcasts[broadcast.code] = broadcast
+                broadcast.publish(encode(opening))
+                await self._write(writer, f"Streaming? Spectators can watch this game by connecting to port "
+                                          f"{self.watch_port} and entering the code {broadcast.code}.\n")
+            await self._write(writer, "> ")
+            bucket = self.admission.connection_bucket()
+            finished = False
+            while not finished:
+                line = await self._read_line(reader)
+                await self.admission.throttle(bucket, ip)
+                try:
+                    text, finished = await self.scheduler.run(ip, lambda: self._play(session_id, line))
+                except Exception:
+                    traceback.print_exc()
+                    await self._write(writer, "\nThe game hit an error and this session has ended.\n")
+                    return
+                frame = encode(text)
+                writer.write(frame)
+                if broadcast is not None:
+                    broadcast.publish(encode(line + "\n") + frame)  # Spectators see the command too
+                await writer.drain()
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            if broadcast is not None:
+                broadcast.close()
+                self.viewers_dropped += broadcast.dropped
+                del self.broadcasts[broadcast.code]
+            if admitted:
+                self.admission.release()
+            if session_id is not None:
+                self.store.discard(session_id)
+                self.connections.pop(session_id, None)
+            self.active.discard(task)
+            writer.close()
+            if self._server is None and not self.active:
+                self._done.set()
+
+    async def watch(self, reader, writer):
+        """Runs one spectator's connection: asks for a code, then shows that session's turns."""
+        try:
+            await self._write(writer, "Enter the code of the game to watch: ")
+            code = (await self._read_line(reader)).strip().lower()
+            broadcast = self.broadcasts.get(code)
+            if broadcast is None:
+                await self._write(writer, "No game with that code is being played here.\n")
+                return
+            await self._write(writer, f"Watching game {code}. Disconnect to stop watching.\n")
+            broadcast.add(writer)
+            while await reader.read(4096):  # Until the spectator leaves or the broadcast closes the connection
+                pass
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def retire(self):
+        """Stops accepting new connections; open sessions carry on."""
+        self.retiring = True
+        if self._watch_server is not None:
+            self._watch_server.close()  # Spectators already watching carry on too
+            self._watch_server = None
+        if self._admin is not None:
+            self._admin.close()
+            self._admin = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if self.on_retire is not None:
+                self.on_retire()
+        if not self.active and self._done is not None:
+            self._done.set()
+
+    async def serve(self, sock):
+        """Accepts connections on an already-bound listening socket until retired and idle."""
+        self._done = asyncio.Event()
+        self._server = await asyncio.start_server(self.handle, sock=sock)
+        if self.watch_port is not None:
+            self._watch_server = await asyncio.start_server(  # Shared with a replacement during a rolling restart
+                self.watch, sock.getsockname()[0], self.watch_port, reuse_address=True,
+                reuse_port=hasattr(socket, "SO_REUSEPORT"))
+        if self.admin_socket is not None:
+            self._admin = await admin.AdminConsole(self).start(self.admin_socket)
+        if self.retiring:  # Asked to retire while starting up
+            self.retire()
+        background = [asyncio.create_task(self._sweep()), asyncio.create_task(self.scheduler.loop())]
+        try:
+            await self._done.wait()
+        finally:
+            for task in background:
+                task.cancel()
+
+    async def _sweep(self):
+        """Hibernates idle sessions in the background and logs store stats now and then."""
+        interval = max(0.5, min(self.store.idle_timeout / 4, 30))
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            self.store.hibernate_idle()
+            self.admission.forget_idle_ips()
+            if len(self.store) and time.monotonic() - last_report >= STATS_INTERVAL:
+                print(f"[{os.getpid()}] {self.summary()}")
+                last_report = time.monotonic()
+
+    def summary(self):
+        """Describes session startup and turn latency, admission, the session store and the render cache."""
+        times, turns = self.startup_times, self.scheduler.turn_times
+        return (f"{self.sessions_started} sessions, startup p50 {percentile(times, 0.5) * 1000:.3f} ms, "
+                f"max {percentile(times, 1.0) * 1000:.3f} ms; turns p99 {percentile(turns, 0.99) * 1000:.3f} ms; "
+                f"admission: {self.admission.summary()}; sessions: {self.store.summary()}; "
+                f"spectators: {sum(len(b.viewers) for b in self.broadcasts.values())} watching "
+                f"{len(self.broadcasts)} games, {self.viewers_dropped} dropped; "
+                f"render cache: {main.display_location.summary()}")
+
+
+def listen(host, port, backlog=512):
+    """Creates the listening socket shared by every worker."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def _run_worker(content, sock, max_sessions, store_options, admission_options, retire_fd, watch_port=None,
+                admin_socket=None):
+    """Body of a forked worker process; never returns."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl+C
+
+    def notify():
+        os.write(retire_fd, struct.pack("i", os.getpid()))
+
+    store = SessionStore(content, **store_options)
+    store.saves.start_collector()  # Only one worker's collection runs at a time
+    server = GameServer(content, store, max_sessions, on_retire=notify,
+                        admission=AdmissionControl(**admission_options), watch_port=watch_port,
+                        admin_socket=admin_socket)
+    try:
+        asyncio.run(server.serve(sock))
+        print(f"[worker {os.getpid()}] retiring: {server.summary()}")
+    finally:
+        os._exit(0)
+
+
+def run_prefork(host, port, workers, max_sessions, store_options, admission_options, watch_port=None,
+                admin_socket=None, local=False):
+    """Loads content once, then keeps `workers` forked workers serving connections.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        workers (int): Number of worker processes.
+        max_sessions (int): Sessions per worker before it is recycled (0 for no limit).
+        store_options (dict): Keyword arguments for each worker's SessionStore.
+        admission_options (dict): Keyword arguments for each worker's AdmissionControl.
+        watch_port (int, optional): Spectator port of the first worker; worker i uses watch_port + i.
+        admin_socket (str, optional): Admin console socket path; worker i listens on <admin_socket>.<i>.
+        local (bool, optional): Use the bundled content instead of fetching it. Defaults to False.
+    """
+    if not hasattr(os, "fork"):
+        raise SystemExit("Prefork mode needs os.fork (Linux or macOS). Use --workers 0 instead.")
+    started = time.perf_counter()
+    content = GameContent.local() if local else GameContent.load()
+    content.warm_up()
+    sock = listen(host, port)
+    gc.collect()
+    gc.freeze()  # Keeps the warm heap out of later collections, so pages stay shared after fork
+    print(f"Content ready in {time.perf_counter() - started:.2f}s; listening on {host}:{port} "
+          f"with {workers} workers")
+
+    retire_read, retire_write = os.pipe()
+    children = {}  # pid -> worker number (a replacement takes over the number, its spectator port and admin socket)
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            os.close(retire_read)
+            _run_worker(content, sock, max_sessions, store_options, admission_options, retire_write,
+                        watch_port + index if watch_port is not None else None,
+                        admin.worker_socket(admin_socket, index))
+        children[pid] = index
+
+    for index in range(workers):
+        spawn(index)
+    retiring = set()
+    try:
+        while True:
+            ready, _, _ = select.select([retire_read], [], [], 1.0)
+            if ready:
+                data = os.read(retire_read, 4096)
+                for (pid,) in struct.iter_unpack("i", data[:len(data) // 4 * 4]):
+                    if pid in children and pid not in retiring:
+                        retiring.add(pid)
+                        spawn(children[pid])  # Replace it now; the old one finishes its sessions in the background
+            while children:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                index = children.pop(pid, None)
+                if pid in retiring:
+                    retiring.discard(pid)
+                elif index is not None:
+                    spawn(index)  # Crashed or killed; keep the pool full
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def run_single(host, port, store_options, admission_options, watch_port=None, admin_socket=None, local=False):
+    """Serves from this process only (no forking), e.g. for development or Windows."""
+    content = GameContent.local() if local else GameContent.load()
+    content.warm_up()
+    sock = listen(host, port)
+    print(f"Listening on {host}:{port}")
+    store = SessionStore(content, **store_options)
+    store.saves.start_collector()
+    server = GameServer(content, store, admission=AdmissionControl(**admission_options), watch_port=watch_port,
+                        admin_socket=admin_socket)
+    try:
+        asyncio.run(server.serve(sock))
+    except KeyboardInterrupt:
+        print(server.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host the CN Tower game over TCP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--local", action="store_true", help="use the bundled content and skip the network")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 serves from a single process (default: one per core)")
+    parser.add_argument("--sessions-per-worker", type=int, default=1000,
+                        help="sessions a worker serves before it is recycled; 0 for no limit (default: 1000)")
+    parser.add_argument("--max-hot", type=int, default=1000,
+                        help="sessions kept in memory per worker; the rest are hibernated to disk (default: 1000)")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="seconds of inactivity before a session is hibernated (default: 300)")
+    parser.add_argument("--hibernate-dir", default=DEFAULT_HIBERNATE_DIR,
+                        help=f"save store for hibernated sessions and saved games (default: {DEFAULT_HIBERNATE_DIR})")
+    parser.add_argument("--watch-port", type=int,
+                        help="let spectators watch games on this port (worker i uses this port + i)")
+    parser.add_argument("--admin-socket",
+                        help="serve the admin console (admin.py) on this Unix socket (worker i uses <path>.<i>)")
+    parser.add_argument("--max-active", type=int, default=1000,
+                        help="sessions playing at once per worker; 0 for no cap (default: 1000)")
+    parser.add_argument("--queue-size", type=int, default=100,
+                        help="connections that may wait for a free slot (default: 100)")
+    parser.add_argument("--queue-timeout", type=float, default=30, help="seconds a queued connection waits (default: 30)")
+    parser.add_argument("--conn-rate", type=float, default=5,
+                        help="commands per second per connection; 0 for no limit (default: 5)")
+    parser.add_argument("--conn-burst", type=float, default=10, help="commands a connection may send at once (default: 10)")
+    parser.add_argument("--ip-rate", type=float, default=20,
+                        help="commands per second per source IP; 0 for no limit (default: 20)")
+    parser.add_argument("--ip-burst", type=float, default=40, help="commands an IP may send at once (default: 40)")
+    options = parser.parse_args()
+    store_options = {"directory": options.hibernate_dir, "max_hot": options.max_hot,
+                     "idle_timeout": options.idle_timeout}
+    admission_options = {"max_active": options.max_active, "queue_size": options.queue_size,
+                         "queue_timeout": options.queue_timeout, "conn_rate": options.conn_rate,
+                         "conn_burst": options.conn_burst, "ip_rate": options.ip_rate, "ip_burst": options.ip_burst}
+    if options.workers:
+        run_prefork(options.host, options.port, options.workers, options.sessions_per_worker,
+                    store_options, admission_options, options.watch_port, options.admin_socket, options.local)
+    else:
+        run_single(options.host, options.port, store_options, admission_options, options.watch_port,
+                   options.admin_socket, options.local)
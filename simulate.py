@@ -0,0 +1,402 @@
+"""Monte Carlo simulation of CN Tower player populations.
+
+Estimates how often each ending is reached and where the money goes (tickets,
+the $50 bribe in caught_stealing, gift shop spending, ...) for millions of
+simulated players following a command-choice policy.
+
+The game is not re-implemented here.  TransitionTables probes the real
+process_command/display_location through HeadlessGame once per
+(location, flags, command) and records where each command leads, how much money
+it moves, and from what balance it succeeds.  A batch of players is then a set
+of NumPy arrays (location id, flag bitset, money) that all advance together by
+table lookups.
+
+Usage:
+    python simulate.py --players 1000000 --policy curious
+    python simulate.py --policy my_policy.json --naive 5000
+"""
+
+import argparse  # Used for the command-line options
+import collections  # Used for counting sampled outcomes of random turns
+import json  # Used for reading policy files
+import random  # Used for seeding the game's own shuffles while probing
+import time  # Used for throughput numbers
+
+import headless
+
+try:
+    import numpy as np  # Used for advancing every simulated player at once
+except ImportError:
+    raise SystemExit("Missing library: numpy. Please install it (pip install numpy)")
+
+# Commands no simulated player types: they leave the story (or the player's own state)
+META_COMMANDS = {"debug": 0, "save": 0, "load": 0, "restart": 0}
+
+# Built-in command-choice policies: weights per command, per location or "default"
+POLICIES = {
+    "uniform": {"default": dict({"*": 1}, **META_COMMANDS)},
+    "curious": {"default": dict({"*": 1, "exit": 0, "help": 0, "inventory": 0,
+                                 "look around": 0, "look down": 0}, **META_COMMANDS)},
+}
+
+RICH = 10 ** 6  # Balance used to probe what a command does when money is no object
+PROBE_SEEDS = 4  # Probes with different seeds; if they disagree the turn is random
+ANSWERS = 6  # Lines offered to input() prompts inside a turn (Alex's options)
+
+
+def load_policy(name_or_path):
+    """Loads a built-in policy by name, or a JSON policy file.
+
+    A policy maps "default" or a location name to {command: weight}; "*" sets
+    the weight of commands not listed.
+
+    Returns:
+        dict: The policy.
+    """
+    if name_or_path in POLICIES:
+        return POLICIES[name_or_path]
+    with open(name_or_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def policy_weight(policy, location, command):
+    """Looks up how likely a policy is to type a command in a location."""
+    default = policy.get("default", {})
+    for table in (policy.get(location, {}), default):
+        if command in table:
+            return table[command]
+        if "*" in table:
+            return table["*"]
+    return 1
+
+
+class TransitionTables:
+    """Transition tables derived by probing the game logic.
+
+    States are (location, flags) pairs reachable from the start; money is left
+    out of the state and handled by a per-command threshold instead: below it
+    the command takes its "poor" outcome (e.g. "Not enough money.").  A finished
+    game is the absorbing state "exit:<where it ended>".
+
+    Args:
+        policy (dict): The command-choice policy (decides which commands to probe).
+        samples (int, optional): Samples taken for turns with random outcomes. Defaults to 400.
+    """
+
+    def __init__(self, policy, samples=400):
+        self.policy = policy
+        self.samples = samples
+        self.commands_at = headless.command_table()
+        self.atoms = {}  # (inventory key, value) -> bit number
+        self.locations = ["base"]
+        self.location_ids = {"base": 0}
+        self.states = []  # (location id, flags)
+        self.state_ids = {}
+        self.transitions = {}  # (state id, command) -> (threshold, poor outcome, [(p, outcome)])
+        self.commands = []
+        self._build()
+
+    # --- encoding ------------------------------------------------------------
+
+    def _location_id(self, name):
+        if name not in self.location_ids:
+            self.location_ids[name] = len(self.locations)
+            self.locations.append(name)
+        return self.location_ids[name]
+
+    def _flags(self, inventory):
+        flags = 0
+        for key, value in inventory.items():
+            if key == "money":
+                continue
+            atom = (key, json.dumps(value))
+            if atom not in self.atoms:
+                if len(self.atoms) == 63:
+                    raise ValueError("too many distinct inventory flags for a 64-bit bitset")
+                self.atoms[atom] = len(self.atoms)
+            flags |= 1 << self.atoms[atom]
+        return flags
+
+    def _inventory(self, flags, money):
+        inventory = {"money": money}
+        for (key, value), bit in self.atoms.items():
+            if flags >> bit & 1:
+                inventory[key] = json.loads(value)
+        return inventory
+
+    def _state_id(self, location_id, flags):
+        key = (location_id, flags)
+        if key not in self.state_ids:
+            self.state_ids[key] = len(self.states)
+            self.states.append(key)
+        return self.state_ids[key]
+
+    # --- probing -------------------------------------------------------------
+
+    def _probe(self, state, command, money, seed):
+        """Plays one command from a state and returns (next state, money change)."""
+        location_id, flags = self.states[state]
+        location = self.locations[location_id]
+        game = headless.HeadlessGame.at(location, self._inventory(flags, money), art="", capture=False)
+        rng = random.Random(seed)
+        random.seed(seed)
+        answers = [str(rng.randint(1, 5)) for _ in range(ANSWERS)]
+        try:
+            game.step(command, answers)
+        except EOFError:
+            return state, 0  # Needed more lines than a player would type; treat as no-op
+        if game.finished:
+            return self._state_id(self._location_id("exit:" + str(game.ending)), 0), 0
+        next_state = self._state_id(self._location_id(game.location), self._flags(game.inventory))
+        return next_state, game.inventory.get("money", 0) - money
+
+    def _outcomes(self, state, command):
+        """Works out what a command does from a state, including money threshold and randomness."""
+        probes = [self._probe(state, command, RICH, seed) for seed in range(PROBE_SEEDS)]
+        if len(set(probes)) == 1:
+            rich = [(1.0, probes[0])]
+        else:
+            counts = collections.Counter(self._probe(state, command, RICH, seed) for seed in range(self.samples))
+            rich = [(count / self.samples, outcome) for outcome, count in sorted(counts.items())]
+        poor = self._probe(state, command, 0, 0)
+        threshold = 0
+        if len(rich) == 1 and poor != rich[0][1]:
+            low, high = 0, RICH  # Smallest balance that gets the rich outcome
+            while low < high:
+                middle = (low + high) // 2
+                if self._probe(state, command, middle, 0) == rich[0][1]:
+                    high = middle
+                else:
+                    low = middle + 1
+            threshold = low
+        return threshold, poor, rich
+
+    def _build(self):
+        """Explores every (location, flags) state reachable from the start."""
+        start = self._state_id(0, 0)
+        queue = [start]
+        seen = {start}
+        while queue:
+            state = queue.pop()
+            location = self.locations[self.states[state][0]]
+            if location.startswith("exit:"):
+                continue
+            for command in self.commands_at.get(location, ()):
+                if policy_weight(self.policy, location, command) <= 0:
+                    continue
+                if command not in self.commands:
+                    self.commands.append(command)
+                threshold, poor, rich = self._outcomes(state, command)
+                self.transitions[state, command] = (threshold, poor, rich)
+                for _, (next_state, _) in rich + [(1.0, poor)]:
+                    if next_state not in seen:
+                        seen.add(next_state)
+                        queue.append(next_state)
+
+    # --- arrays --------------------------------------------------------------
+
+    def arrays(self):
+        """Packs the tables into flat NumPy arrays for the vectorised engine.
+
+        Rows are indexed by state * C + command.  Cumulative probabilities are
+        stored offset by their row number so one np.searchsorted over the whole
+        table samples every player's row at once.
+
+        Returns:
+            dict: The arrays.
+        """
+        S, C = len(self.states), len(self.commands)
+        K = max([len(rich) for _, _, rich in self.transitions.values()] + [1])
+        command_ids = {command: i for i, command in enumerate(self.commands)}
+        categories = ["none"]
+        category_ids = {"none": 0}
+
+        def category(state, command, delta):
+            if delta == 0:
+                return 0
+            name = f"{self.locations[self.states[state][0]]}: {command}"
+            if name not in category_ids:
+                category_ids[name] = len(categories)
+                categories.append(name)
+            return category_ids[name]
+
+        weights = np.zeros((S, C))
+        next_state = np.repeat(np.arange(S), C * K).reshape(S, C, K)
+        delta = np.zeros((S, C, K), dtype=np.int64)
+        cum = np.ones((S, C, K))
+        cat = np.zeros((S, C, K), dtype=np.int32)
+        threshold = np.zeros((S, C), dtype=np.int64)
+        poor_next = np.repeat(np.arange(S), C).reshape(S, C)
+        poor_delta = np.zeros((S, C), dtype=np.int64)
+        poor_cat = np.zeros((S, C), dtype=np.int32)
+        for (state, command), (limit, poor, rich) in self.transitions.items():
+            c = command_ids[command]
+            location = self.locations[self.states[state][0]]
+            weights[state, c] = policy_weight(self.policy, location, command)
+            threshold[state, c] = limit
+            poor_next[state, c], poor_delta[state, c] = poor
+            poor_cat[state, c] = category(state, command, poor[1])
+            total = 0.0
+            for k, (p, (target, change)) in enumerate(rich):
+                total += p
+                next_state[state, c, k] = target
+                delta[state, c, k] = change
+                cum[state, c, k] = total
+                cat[state, c, k] = category(state, command, change)
+            cum[state, c, len(rich) - 1:] = 1.0
+
+        totals = weights.sum(axis=1)
+        terminal = totals == 0  # Finished games, and states the policy never leaves
+        policy_cum = np.cumsum(weights, axis=1) / np.where(terminal, 1, totals)[:, None]
+        policy_cum[~terminal, -1] = 1.0
+        rows = np.arange(S * C)
+        return {
+            "S": S, "C": C, "K": K,
+            "state_location": np.array([loc for loc, _ in self.states], dtype=np.int16),
+            "state_flags": np.array([flags for _, flags in self.states], dtype=np.int64),
+            "terminal": terminal,
+            "policy_flat": (policy_cum + np.arange(S)[:, None]).ravel(),
+            "outcome_flat": (cum.reshape(S * C, K) + rows[:, None]).ravel(),
+            "next_state": next_state.ravel(), "delta": delta.ravel(), "category": cat.ravel(),
+            "threshold": threshold.ravel(), "poor_next": poor_next.ravel(),
+            "poor_delta": poor_delta.ravel(), "poor_category": poor_cat.ravel(),
+            "categories": categories,
+        }
+
+
+def simulate(tables, players, max_turns=200, seed=0):
+    """Advances a whole population of players together.
+
+    Args:
+        tables (TransitionTables): The derived transition tables.
+        players (int): Number of players.
+        max_turns (int, optional): Turns before an unfinished player is given up on. Defaults to 200.
+        seed (int, optional): Seed for NumPy's generator. Defaults to 0.
+
+    Returns:
+        dict: Ending counts, money flows, turns played and elapsed seconds.
+    """
+    a = tables.arrays()
+    C, K = a["C"], a["K"]
+    rng = np.random.default_rng(seed)
+    L = len(tables.locations)
+    keys = a["state_flags"] * L + a["state_location"]
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    location = np.zeros(players, dtype=np.int16)  # Everybody starts at "base"...
+    flags = np.zeros(players, dtype=np.int64)  # ...with no items...
+    money = np.full(players, 40, dtype=np.int64)  # ...and $40
+    spent = np.zeros(len(a["categories"]))
+    earned = np.zeros(len(a["categories"]))
+    turns = 0
+
+    started = time.perf_counter()
+    for _ in range(max_turns):
+        state = order[np.searchsorted(sorted_keys, flags * L + location)]
+        active = np.nonzero(~a["terminal"][state])[0]
+        if not len(active):
+            break
+        s = state[active]
+        command = np.searchsorted(a["policy_flat"], s + rng.random(len(s)), side="right") - s * C
+        row = s * C + np.minimum(command, C - 1)
+        slot = np.searchsorted(a["outcome_flat"], row + rng.random(len(s)), side="right") - row * K
+        cell = row * K + np.minimum(slot, K - 1)
+        poor = money[active] < a["threshold"][row]
+        target = np.where(poor, a["poor_next"][row], a["next_state"][cell])
+        change = np.where(poor, a["poor_delta"][row], a["delta"][cell])
+        category = np.where(poor, a["poor_category"][row], a["category"][cell])
+        money[active] += change
+        location[active] = a["state_location"][target]
+        flags[active] = a["state_flags"][target]
+        spent += np.bincount(category, weights=np.maximum(-change, 0), minlength=len(spent))
+        earned += np.bincount(category, weights=np.maximum(change, 0), minlength=len(earned))
+        turns += len(active)
+    elapsed = time.perf_counter() - started
+
+    endings = collections.Counter()
+    for location_id, count in zip(*np.unique(location, return_counts=True)):
+        name = tables.locations[location_id]
+        endings[name[5:] if name.startswith("exit:") else "unfinished"] += int(count)
+    flows = {name: (spent[i], earned[i]) for i, name in enumerate(a["categories"]) if spent[i] or earned[i]}
+    return {"endings": endings, "flows": flows, "turns": turns, "seconds": elapsed,
+            "players": players, "final_money": float(money.mean())}
+
+
+def simulate_naive(tables, players, max_turns=200, seed=0):
+    """Plays players one at a time through process_command, for comparison.
+
+    Args:
+        tables (TransitionTables): Supplies the policy and command lists.
+        players (int): Number of players.
+        max_turns (int, optional): Turns before giving up on a player. Defaults to 200.
+        seed (int, optional): Seed for the random generator. Defaults to 0.
+
+    Returns:
+        dict: Ending counts, turns played and elapsed seconds.
+    """
+    rng = random.Random(seed)
+    choices = {}
+    endings = collections.Counter()
+    turns = 0
+    started = time.perf_counter()
+    for _ in range(players):
+        game = headless.HeadlessGame.at("base", {"money": 40}, art="", capture=False)
+        for _ in range(max_turns):
+            if game.location not in choices:
+                commands = [c for c in tables.commands_at.get(game.location, ())
+                            if policy_weight(tables.policy, game.location, c) > 0]
+                choices[game.location] = (commands, [policy_weight(tables.policy, game.location, c) for c in commands])
+            commands, weights = choices[game.location]
+            if not commands:
+                break
+            command = rng.choices(commands, weights)[0]
+            try:
+                game.step(command, [str(rng.randint(1, 5)) for _ in range(ANSWERS)])
+            except EOFError:
+                pass
+            turns += 1
+            if game.finished:
+                break
+        endings[game.ending if game.finished else "unfinished"] += 1
+    return {"endings": endings, "turns": turns, "seconds": time.perf_counter() - started, "players": players}
+
+
+def print_report(result, title):
+    """Prints ending probabilities (with standard errors) and money flows."""
+    players = result["players"]
+    print(f"\n{title}: {players:,} players, {result['turns']:,} turns in {result['seconds']:.2f}s "
+          f"({result['turns'] / max(result['seconds'], 1e-9):,.0f} turns/s)")
+    print("Endings:")
+    for ending, count in result["endings"].most_common():
+        p = count / players
+        print(f"  {ending:<28} {p:8.4%}  ± {np.sqrt(p * (1 - p) / players):.4%}")
+    if "flows" in result:
+        print("Money flows per player (spent / earned):")
+        for name, (spent, earned) in sorted(result["flows"].items(), key=lambda item: -item[1][0]):
+            print(f"  {name:<40} ${spent / players:8.2f} / ${earned / players:8.2f}")
+        print(f"  average money at the end: ${result['final_money']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate populations of CN Tower players.")
+    parser.add_argument("--players", type=int, default=1_000_000, help="players to simulate (default: 1,000,000)")
+    parser.add_argument("--turns", type=int, default=200, help="turn limit per player (default: 200)")
+    parser.add_argument("--policy", default="uniform",
+                        help=f"built-in policy ({', '.join(POLICIES)}) or a JSON policy file")
+    parser.add_argument("--naive", type=int, default=2000,
+                        help="players for the per-player comparison loop (0 to skip, default: 2000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    tables = TransitionTables(load_policy(options.policy))
+    print(f"Derived {len(tables.transitions)} transitions over {len(tables.states)} states "
+          f"and {len(tables.atoms)} flag bits in {time.perf_counter() - started:.2f}s")
+    vectorised = simulate(tables, options.players, options.turns, options.seed)
+    print_report(vectorised, "Vectorised")
+    if options.naive:
+        naive = simulate_naive(tables, options.naive, options.turns, options.seed)
+        print_report(naive, "Per-player loop")
+        speedup = (vectorised["turns"] / vectorised["seconds"]) / (naive["turns"] / naive["seconds"])
+        print(f"\nVectorised engine: {speedup:,.0f}x the per-player loop's turns per second")
@@ -0,0 +1,272 @@
+"""Local stand-in for the servers the game talks to.
+
+Serves the bundled dialogue.json and cn_tower_art.txt and fake geolocation
+APIs (in the response formats of ipapi.co, ipwho.is and freegeoip.app) from
+a local HTTP/1.1 server, and can be told to misbehave per path: respond
+slowly, reset the connection, answer with an error status such as 503 or
+429, or answer 200 with a broken body (`null`, half a JSON object).  StandIn.redirect() points main.py's URLs at it, so the real loading
+code can be exercised without the network.
+
+Usage:
+    python standin.py --check
+    python standin.py --port 8099 --fault /dialogue.json:latency=2 --fault /geo/ipapi:status=429
+"""
+
+import argparse  # Used for the command-line options
+import contextlib  # Used for temporarily redirecting main.py's URLs
+import gzip  # Used for gzip-encoding responses when the client accepts it
+import http.server  # Used for the stand-in server
+import json  # Used for the fake geolocation responses
+import socket  # Used for resetting connections (SO_LINGER with a zero timeout)
+import struct  # Used for packing the SO_LINGER option
+import threading  # Used for running the server in the background
+import time  # Used for simulating slow responses
+
+import headless
+
+GEO_PATHS = {
+    "/geo/ipapi": "country_name",  # ipapi.co
+    "/geo/ipwho": "country",  # ipwho.is
+    "/geo/freegeoip": "country_name",  # freegeoip.app
+}
+
+
+class Fault:
+    """How the stand-in misbehaves on one path.
+
+    Args:
+        latency (float, optional): Seconds to wait before answering. Defaults to 0.
+        status (int, optional): Error status to answer with instead of the content.
+        reset (bool, optional): Reset the connection instead of answering. Defaults to False.
+        times (int, optional): Only affect this many requests, then behave. Defaults to every request.
+        retry_after (int, optional): Retry-After header sent with the error status.
+        body (str, optional): Answer 200 with this body instead of the content.
+    """
+
+    def __init__(self, latency=0.0, status=None, reset=False, times=None, retry_after=None, body=None):
+        self.latency = latency
+        self.status = status
+        self.reset = reset
+        self.times = times
+        self.retry_after = retry_after
+        self.body = body
+
+    @classmethod
+    def parse(cls, spec):
+        """Builds a fault from "latency=2,status=503,times=1"-style text (reset takes no value, body must come last)."""
+        options = {}
+        spec, _, body = spec.partition("body=")
+        if _:
+            options["body"] = body  # May contain commas
+        for part in filter(None, spec.split(",")):
+            name, _, value = part.partition("=")
+            if name == "reset":
+                options["reset"] = True
+            elif name == "latency":
+                options["latency"] = float(value)
+            elif name in ("status", "times", "retry_after"):
+                options[name] = int(value)
+            else:
+                raise ValueError(f"unknown fault option {name!r}")
+        return cls(**options)
+
+    def take(self):
+        """Returns True if this request should misbehave (and counts it)."""
+        if self.times is None:
+            return True
+        if self.times > 0:
+            self.times -= 1
+            return True
+        return False
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.standin.connections += 1
+
+    def do_GET(self):
+        standin = self.server.standin
+        path = self.path.split("?", 1)[0]
+        standin.requests[path] = standin.requests.get(path, 0) + 1
+        fault = standin.faults.get(path)
+        if fault is not None and fault.take():
+            if fault.latency:
+                time.sleep(fault.latency)
+            if fault.reset:
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.close_connection = True
+                return
+            if fault.status is not None:
+                headers = {"Retry-After": str(fault.retry_after)} if fault.retry_after is not None else {}
+                return self._send(fault.status, b'{"error": "simulated"}', "application/json", headers)
+            if fault.body is not None:
+                return self._send(200, fault.body.encode("utf-8"), "application/json")
+        body = standin.body(path)
+        if body is None:
+            return self._send(404, b'{"error": "not found"}', "application/json")
+        content_type = "text/plain; charset=utf-8" if path.endswith(".txt") else "application/json"
+        self._send(200, body, content_type)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, mtime=0)
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients giving up on a slow response is expected here
+
+
+class StandIn:
+    """A local server standing in for GitHub and the geolocation APIs.
+
+    Args:
+        port (int, optional): Port to listen on. Defaults to a free one.
+        country (str, optional): Country the fake geolocation APIs report. Defaults to "Canada".
+        faults (dict, optional): Path -> Fault.
+    """
+
+    def __init__(self, port=0, country="Canada", faults=None):
+        self.country = country
+        self.faults = dict(faults or {})
+        self.requests = {}  # path -> requests received
+        self.connections = 0  # TCP connections accepted (fewer than requests when clients keep alive)
+        self._files = {
+            "/dialogue.json": json.dumps(headless.load_local_dialogue()).encode("utf-8"),
+            "/cn_tower_art.txt": (headless.load_local_art() or "").encode("utf-8"),
+        }
+        self.server = _Server(("127.0.0.1", port), _Handler)
+        self.server.standin = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def body(self, path):
+        """Returns the response body for a path, or None if there is nothing there."""
+        if path in GEO_PATHS:
+            return json.dumps({GEO_PATHS[path]: self.country}).encode("utf-8")
+        return self._files.get(path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def redirect(self, module=None):
+        """Points main.py's dialogue, art and geolocation URLs at this server for a while."""
+        if module is None:
+            import main as module
+        saved = (module.DIALOGUE_URL, module.CN_TOWER_ART_URL, module.GEO_APIS)
+        module.DIALOGUE_URL = self.url("/dialogue.json")
+        module.CN_TOWER_ART_URL = self.url("/cn_tower_art.txt")
+        module.GEO_APIS = [self.url(path) for path in GEO_PATHS]
+        try:
+            yield self
+        finally:
+            module.DIALOGUE_URL, module.CN_TOWER_ART_URL, module.GEO_APIS = saved
+
+
+def check():
+    """Checks HttpClient against each of the stand-in's failure modes; raises AssertionError on a failure."""
+    import http_client
+    import requests
+
+    def attempt(client, standin, path, fault=None):
+        """Returns (status or exception name, requests the server got, new connections)."""
+        if fault is not None:
+            standin.faults[path] = fault
+        requests_before, connections_before = standin.requests.get(path, 0), standin.connections
+        try:
+            response = client.get(standin.url(path))
+            result = response.status_code
+        except requests.exceptions.RequestException as e:
+            result = type(e).__name__
+        standin.faults.pop(path, None)
+        return result, standin.requests.get(path, 0) - requests_before, standin.connections - connections_before
+
+    # (name, path, fault, (result, requests sent, new connections)); None matches anything
+    cases = [
+        ("dialogue, first request", "/dialogue.json", None, (200, 1, 1)),
+        ("dialogue, kept alive", "/dialogue.json", None, (200, 1, 0)),
+        ("art, slow once: retried", "/cn_tower_art.txt", Fault(latency=2, times=1), (200, 2, None)),
+        ("art, always slow: gives up", "/cn_tower_art.txt", Fault(latency=2), ("ReadTimeout", 3, None)),
+        ("geo, reset twice: retried", "/geo/ipapi", Fault(reset=True, times=2), (200, 3, None)),
+        ("geo, 503 once: retried", "/geo/ipwho", Fault(status=503, times=1), (200, 2, None)),
+        ("geo, always 503: gives up", "/geo/ipwho", Fault(status=503), (503, 3, None)),
+        ("geo, 429: not retried", "/geo/freegeoip", Fault(status=429), (429, 1, None)),
+    ]
+    client = http_client.HttpClient(connect_timeout=1, read_timeout=0.5, retries=2, backoff_base=0.05)
+    try:
+        with StandIn() as standin:
+            for name, path, fault, expected in cases:
+                got = attempt(client, standin, path, fault)
+                assert all(e is None or e == g for e, g in zip(expected, got)), f"{name}: expected {expected}, got {got}"
+                print(f"ok  {name}")
+            response = client.get(standin.url("/dialogue.json"))
+            assert response.headers.get("Content-Encoding") == "gzip", "responses aren't gzip-encoded"
+            assert response.json() == headless.load_local_dialogue(), "the dialogue doesn't survive the round trip"
+            print("ok  gzip-encoded dialogue decodes to the bundled one")
+            with standin.redirect():
+                import main
+
+                country = main.get_user_country()
+            assert country == standin.country, f"get_user_country() via the stand-in gave {country!r}"
+            print("ok  main.get_user_country() goes through the stand-in")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve stand-ins for the game's remote content and geolocation APIs.")
+    parser.add_argument("--port", type=int, default=8099, help="port (default: 8099)")
+    parser.add_argument("--country", default="Canada", help="country the geolocation APIs report (default: Canada)")
+    parser.add_argument("--fault", action="append", default=[], metavar="PATH:SPEC",
+                        help="misbehave on a path, e.g. /dialogue.json:latency=2,times=1 or /geo/ipapi:status=429")
+    parser.add_argument("--check", action="store_true", help="check the HTTP client against each failure mode")
+    options = parser.parse_args()
+    if options.check:
+        check()
+    else:
+        faults = {}
+        for spec in options.fault:
+            path, _, fault = spec.partition(":")
+            faults[path] = Fault.parse(fault)
+        standin = StandIn(options.port, options.country, faults)
+        print(f"Serving on {standin.url('/')}: " + ", ".join(["/dialogue.json", "/cn_tower_art.txt", *GEO_PATHS]))
+        try:
+            standin.server.serve_forever()
+        except KeyboardInterrupt:
+            print("Requests:", standin.requests)
@@ -0,0 +1,207 @@
+"""Startup latency of the game against a simulated network.
+
+Starts main() headless in a fresh Python process for each scenario, with
+main.py's dialogue, art and geolocation URLs pointed at a local stand-in
+(standin.py) that misbehaves the way the real network does in the field:
+slow links, 429s, responses that never come, resets and outages.  Each run
+measures the time from launching the process to the first command prompt,
+broken down by phase:
+
+    interpreter   starting Python, up to the first line of the worker
+    imports       import main (requests, art, prompt_toolkit, ...)
+    libraries     check_libraries()
+    dialogue      load_dialogue()
+    banner        the "CN Tower" text2art banner
+    geo           get_user_country(), including the timezone fallback
+    age           load_age() (a saved age, so nobody is asked)
+    first room    clearing the console and displaying the first location
+
+Story pauses and console clearing are stubbed out (they aren't startup cost).
+
+Usage:
+    python startup.py
+    python startup.py --scenario healthy --scenario geo-timeouts --repeat 3
+    python startup.py --list
+"""
+
+import argparse  # Used for the command-line options
+import contextlib  # Used for silencing the game's output in the worker
+import io  # Used for collecting the game's output in the worker
+import json  # Used for passing results from the worker back to the parent
+import os  # Used for the temporary age file
+import socket  # Used for finding a port nobody listens on (the outage scenario)
+import subprocess  # Used for starting each run in a fresh process
+import sys  # Used for the worker's interpreter path and arguments
+import tempfile  # Used for the temporary age file
+import time  # Used for timing the phases
+
+PHASES = ("interpreter", "imports", "libraries", "dialogue", "banner", "geo", "age", "first room")
+
+# Scenario name -> (description, {path or "geo" or "*": fault spec}).  "geo" is every
+# geolocation API and "*" every path; None as the faults means nothing is listening.
+SCENARIOS = {
+    "healthy": ("every endpoint answers at once", {}),
+    "slow-network": ("300 ms on every request", {"*": "latency=0.3"}),
+    "dialogue-503-once": ("GitHub answers 503 once, then recovers", {"/dialogue.json": "status=503,times=1"}),
+    "geo-429": ("every geolocation API rate limits (429, Retry-After: 60)", {"geo": "status=429,retry_after=60"}),
+    "geo-first-down": ("the first geolocation API resets every connection", {"/geo/ipapi": "reset"}),
+    "geo-timeouts": ("every geolocation API takes longer than the read timeout", {"geo": "latency=6"}),
+    "dialogue-timeout": ("GitHub takes longer than the read timeout", {"/dialogue.json": "latency=6"}),
+    "outage": ("nothing is listening (connection refused everywhere)", None),
+}
+
+
+class _FirstPrompt(Exception):
+    """Raised when main() asks for the first command: startup is over."""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker(base_url, launched, age_file):
+    """Runs main() up to the first prompt and returns the phase timings (in this process).
+
+    Args:
+        base_url (str): Stand-in address, e.g. http://127.0.0.1:8099.
+        launched (float): time.time() when the parent started this process.
+        age_file (str): File with a saved age.
+
+    Returns:
+        dict: Phase -> seconds, plus "total" and "country".
+    """
+    entered = time.time()
+    started = time.perf_counter()
+    import main  # The imports phase
+    imported = time.perf_counter()
+    import standin
+
+    main.DIALOGUE_URL = base_url + "/dialogue.json"
+    main.CN_TOWER_ART_URL = base_url + "/cn_tower_art.txt"
+    main.GEO_APIS = [base_url + path for path in standin.GEO_PATHS]
+
+    marks = {}
+    results = {}
+
+    def timed(name, function):
+        def wrapper(*args, **kwargs):
+            marks[name + ".start"] = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                marks[name + ".end"] = time.perf_counter()
+            results[name] = result
+            return result
+        return wrapper
+
+    def first_prompt(on_idle=None):
+        marks["prompt"] = time.perf_counter()
+        raise _FirstPrompt()
+
+    load_age = main.load_age
+    main.check_libraries = timed("libraries", main.check_libraries)
+    main.load_dialogue = timed("dialogue", main.load_dialogue)
+    main.get_user_country = timed("geo", main.get_user_country)
+    main.load_age = timed("age", lambda filename=None: load_age(age_file))
+    main.get_player_input = first_prompt
+    main.clear_console = lambda: None
+    main.pause = lambda seconds: None
+
+    output = io.StringIO()
+    main_started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        try:
+            main.main()
+        except _FirstPrompt:
+            pass
+    if "prompt" not in marks:
+        raise RuntimeError("main() returned before asking for a command:\n" + output.getvalue())
+    timings = {
+        "interpreter": entered - launched,
+        "imports": imported - started,
+        "libraries": marks["libraries.end"] - main_started,
+        "dialogue": marks["dialogue.end"] - marks["dialogue.start"],
+        "banner": marks["geo.start"] - marks["dialogue.end"],
+        "geo": marks["geo.end"] - marks["geo.start"],
+        "age": marks["age.end"] - marks["geo.end"],
+        "first room": marks["prompt"] - marks["age.end"],
+    }
+    timings["total"] = entered - launched + marks["prompt"] - started
+    timings["country"] = results.get("geo")
+    timings["dialogue_loaded"] = bool(results.get("dialogue"))
+    return timings
+
+
+def run_scenario(name):
+    """Runs one scenario in a fresh process against a fresh stand-in.
+
+    Returns:
+        dict: The worker's timings, plus the requests the stand-in received.
+    """
+    import standin
+
+    _, faults = SCENARIOS[name]
+    server = None
+    if faults is None:
+        base_url = f"http://127.0.0.1:{_free_port()}"
+    else:
+        parsed = {}
+        for path, spec in faults.items():
+            paths = {"*": ["/dialogue.json", "/cn_tower_art.txt", *standin.GEO_PATHS],
+                     "geo": list(standin.GEO_PATHS)}.get(path, [path])
+            for each in paths:
+                parsed[each] = standin.Fault.parse(spec)
+        server = standin.StandIn(faults=parsed).start()
+        base_url = server.url("")
+    with tempfile.TemporaryDirectory() as folder:
+        age_file = os.path.join(folder, "age.json")
+        with open(age_file, "w", encoding="utf-8") as f:
+            json.dump({"age": 20}, f)
+        command = [sys.executable, os.path.abspath(__file__), "--worker", base_url, "--age-file", age_file,
+                   "--launched", repr(time.time())]
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, stdin=subprocess.DEVNULL)
+        finally:
+            if server is not None:
+                server.stop()
+    if completed.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed:\n{completed.stderr}")
+    timings = json.loads(completed.stdout.splitlines()[-1])
+    timings["requests"] = sum(server.requests.values()) if server is not None else 0
+    return timings
+
+
+def report(names, repeat=1):
+    """Runs scenarios and prints time to first prompt with its phases (medians over `repeat` runs)."""
+    print(f"{'scenario':<20} {'total':>8} " + " ".join(f"{phase:>11}" for phase in PHASES) + "  requests  country")
+    for name in names:
+        runs = [run_scenario(name) for _ in range(repeat)]
+
+        def middle(key):
+            values = sorted(run[key] for run in runs)
+            return values[len(values) // 2]
+        phases = " ".join(f"{middle(phase) * 1000:>9.0f}ms" for phase in PHASES)
+        country = runs[-1]["country"] or "-"
+        dialogue = "" if runs[-1]["dialogue_loaded"] else " (no dialogue)"
+        print(f"{name:<20} {middle('total') * 1000:>6.0f}ms {phases}  {middle('requests'):>8}  {country}{dialogue}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure time to first prompt against a simulated network.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; medians are shown (default: 1)")
+    parser.add_argument("--list", action="store_true", help="list the scenarios")
+    parser.add_argument("--worker", metavar="BASE_URL", help=argparse.SUPPRESS)
+    parser.add_argument("--age-file", help=argparse.SUPPRESS)
+    parser.add_argument("--launched", type=float, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.worker:
+        print(json.dumps(worker(options.worker, options.launched, options.age_file)))
+    elif options.list:
+        for name, (description, _) in SCENARIOS.items():
+            print(f"{name:<20} {description}")
+    else:
+        report(options.scenario or list(SCENARIOS), options.repeat)
@@ -0,0 +1,468 @@
+"""Sharded game server: one process per core on one port, with SO_REUSEPORT.
+
+A single asyncio process runs one turn at a time (the GIL), so this
+supervisor loads the content once, then forks one shard per core.  Each shard
+is a full GameServer that binds its own listening socket to the shared port
+with SO_REUSEPORT, so the kernel spreads new connections across the shards'
+accept queues instead of waking every worker for every connection, as the
+shared socket of `server.py --workers` does.
+
+Sessions belong to the shard that accepted them: a connection never moves,
+and every session id starts with the shard number ("3-9f1c...").  Hibernated
+sessions and saved games go to one SaveStore (save_store.py) that all shards
+share, so state they have in common is stored once.
+
+Each shard reports its counters over a pipe every METRICS_INTERVAL seconds,
+and the supervisor serves them, totalled and per shard, as JSON on
+http://<host>:<metrics port>/metrics.  Counters of shards that have exited are
+kept in the totals, so they only ever go up.
+
+Signals to the supervisor:
+    SIGHUP          rolling restart: each shard is replaced by a new one, and the old
+                    one drains (stops accepting, finishes its sessions) once the new
+                    one is listening, so the port always has listeners
+    SIGINT/SIGTERM  drain every shard and exit (shards still busy after
+                    --drain-timeout seconds are killed)
+A shard that crashes is replaced straight away.
+
+Closing a draining shard's socket drops connections still waiting in its
+accept queue (Linux 5.14+ can move them to another shard with
+net.ipv4.tcp_migrate_req=1).
+
+Usage:
+    python supervisor.py --port 7777 --shards 4 --metrics-port 7778 --admin-socket /tmp/cn_tower_admin.sock
+    curl localhost:7778/metrics
+    python admin.py --socket /tmp/cn_tower_admin.sock stats
+    kill -HUP <supervisor pid>
+    python supervisor.py --benchmark --max-shards 4 --seconds 5
+"""
+
+import argparse  # Used for the command-line options
+import asyncio  # Used for running each shard and the benchmark clients
+import gc  # Used for freezing the warm heap before forking, so it stays shared
+import http.server  # Used for the metrics endpoint
+import json  # Used for shard metrics, the endpoint and benchmark results
+import os  # Used for forking shards and the metrics pipes
+import select  # Used for waiting on shard metrics and endpoint requests
+import signal  # Used for rolling restarts, draining and stopping
+import socket  # Used for the SO_REUSEPORT listening sockets
+import subprocess  # Used for running the benchmark's supervisors and clients
+import sys  # Used for starting benchmark processes with the same interpreter
+import time  # Used for drain deadlines and benchmark timing
+import urllib.request  # Used for reading the metrics endpoint in the benchmark
+
+import admin
+import server
+
+METRICS_INTERVAL = 1.0  # Seconds between a shard's metric reports
+DRAIN_TIMEOUT = 60  # Seconds a draining shard may take to finish its sessions
+COUNTERS = ("sessions_started", "turns", "rejected", "throttled", "hibernations")  # Summed across all shards ever
+GAUGES = ("connections", "sessions", "hibernated", "broadcasts", "spectators")  # Summed across running shards
+BENCHMARK_COMMANDS = ["go east", "back", "go north", "back", "look around", "help"]
+BENCHMARK_TURNS = 20  # Turns per benchmark session before it exits and reconnects
+
+
+def listen_reuseport(host, port, backlog=512):
+    """Creates a listening socket that other processes may bind to the same port (SO_REUSEPORT)."""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("SO_REUSEPORT is not available here. Use server.py --workers instead.")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def shard_metrics(index, game_server):
+    """Returns one shard's counters and latencies as a dict."""
+    store, scheduler = game_server.store, game_server.scheduler
+    return {
+        "shard": index,
+        "pid": os.getpid(),
+        "draining": game_server.retiring,
+        "sessions_started": game_server.sessions_started,
+        "turns": scheduler.turns,
+        "rejected": game_server.admission.rejected,
+        "throttled": game_server.admission.throttled,
+        "hibernations": store.hibernations,
+        "connections": len(game_server.active),
+        "sessions": len(store),
+        "hibernated": len(store._cold),
+        "broadcasts": len(game_server.broadcasts),
+        "spectators": sum(len(broadcast.viewers) for broadcast in game_server.broadcasts.values()),
+        "turn_p50_ms": server.percentile(scheduler.turn_times, 0.5) * 1000,
+        "turn_p99_ms": server.percentile(scheduler.turn_times, 0.99) * 1000,
+        "startup_p50_ms": server.percentile(game_server.startup_times, 0.5) * 1000,
+    }
+
+
+def _run_shard(content, index, host, port, store_options, admission_options, metrics_fd, watch_port=None,
+               admin_socket=None):
+    """Body of a forked shard process; never returns."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor decides when shards stop
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    sock = listen_reuseport(host, port)
+    store = server.SessionStore(content, id_prefix=f"{index}-", **store_options)
+    store.saves.start_collector()  # Only one shard's collection runs at a time
+    game_server = server.GameServer(content, store, admission=server.AdmissionControl(**admission_options),
+                                    watch_port=watch_port + index if watch_port is not None else None,
+                                    admin_socket=admin.worker_socket(admin_socket, index))
+
+    def report():
+        os.write(metrics_fd, (json.dumps(shard_metrics(index, game_server)) + "\n").encode("utf-8"))
+
+    async def run():
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, game_server.retire)  # Drain
+
+        async def report_forever():
+            while True:
+                report()
+                await asyncio.sleep(METRICS_INTERVAL)
+
+        reporter = asyncio.create_task(report_forever())
+        try:
+            await game_server.serve(sock)
+        finally:
+            reporter.cancel()
+
+    try:
+        asyncio.run(run())
+        report()  # Final counters
+    finally:
+        os._exit(0)
+
+
+class Shard:
+    """The supervisor's view of one shard process."""
+
+    def __init__(self, index, pid, metrics_fd):
+        self.index = index
+        self.pid = pid
+        self.metrics_fd = metrics_fd
+        self.metrics = {}  # Latest report
+        self.ready = False  # Reported at least once, so it is listening
+        self.drain_deadline = None  # Set when draining
+        self.replaces = None  # Shard to drain once this one is ready (rolling restart)
+        self._buffer = b""
+
+    def read_metrics(self):
+        """Reads pending reports from the pipe; returns False at end of file."""
+        data = os.read(self.metrics_fd, 65536)
+        if not data:
+            return False
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            if line:
+                self.metrics = json.loads(line)
+                self.ready = True
+        return True
+
+
+class Supervisor:
+    """Keeps one shard per core serving a port and serves their combined metrics.
+
+    Args:
+        content (GameContent): Shared content (loaded and warmed up before forking).
+        host (str): Address to listen on.
+        port (int): Port every shard listens on.
+        shards (int): Number of shard processes.
+        store_options (dict): Keyword arguments for each shard's SessionStore.
+        admission_options (dict): Keyword arguments for each shard's AdmissionControl.
+        drain_timeout (float, optional): Seconds a draining shard may take. Defaults to DRAIN_TIMEOUT.
+        watch_port (int, optional): Spectator port of shard 0; shard i uses watch_port + i.
+        admin_socket (str, optional): Admin console socket path; shard i listens on <admin_socket>.<i>.
+    """
+
+    def __init__(self, content, host, port, shards, store_options, admission_options, drain_timeout=DRAIN_TIMEOUT,
+                 watch_port=None, admin_socket=None):
+        self.content = content
+        self.host = host
+        self.port = port
+        self.size = shards
+        self.store_options = store_options
+        self.admission_options = admission_options
+        self.drain_timeout = drain_timeout
+        self.watch_port = watch_port
+        self.admin_socket = admin_socket
+        self.shards = {}  # pid -> Shard
+        self.finished = {counter: 0 for counter in COUNTERS}  # Counters of shards that have exited
+        self.restarts = 0
+        self.stopping = False
+        self.restart_requested = False
+        self._metrics_server = None
+
+    def spawn(self, index):
+        """Forks a shard with the given number."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for shard in self.shards.values():
+                os.close(shard.metrics_fd)
+            if self._metrics_server is not None:
+                self._metrics_server.socket.close()
+            _run_shard(self.content, index, self.host, self.port, self.store_options, self.admission_options,
+                       write_fd, self.watch_port, self.admin_socket)
+        os.close(write_fd)
+        shard = Shard(index, pid, read_fd)
+        self.shards[pid] = shard
+        return shard
+
+    def drain(self, shard):
+        """Asks a shard to stop accepting and exit once its sessions are over."""
+        if shard.drain_deadline is None:
+            shard.drain_deadline = time.monotonic() + self.drain_timeout
+            try:
+                os.kill(shard.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def rolling_restart(self):
+        """Replaces every shard: each new shard is started first, the old one drains once it is listening."""
+        for shard in [shard for shard in self.shards.values() if shard.drain_deadline is None]:
+            self.spawn(shard.index).replaces = shard
+        self.restarts += 1
+
+    def metrics(self):
+        """Returns the combined metrics: totals over every shard, and each running shard's latest report."""
+        running = [shard.metrics for shard in self.shards.values() if shard.metrics]
+        totals = {counter: self.finished[counter] + sum(m.get(counter, 0) for m in running) for counter in COUNTERS}
+        totals.update({gauge: sum(m.get(gauge, 0) for m in running) for gauge in GAUGES})
+        totals["turn_p99_ms"] = max((m["turn_p99_ms"] for m in running), default=0.0)  # Worst shard
+        return {
+            "shards": len(self.shards),
+            "draining": sum(shard.drain_deadline is not None for shard in self.shards.values()),
+            "restarts": self.restarts,
+            "totals": totals,
+            "per_shard": sorted(running, key=lambda m: (m["shard"], m["pid"])),
+        }
+
+    def _reap(self):
+        while self.shards:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            shard = self.shards.pop(pid, None)
+            if shard is None:
+                continue
+            try:
+                while shard.read_metrics():  # The final report may still be in the pipe
+                    pass
+            except OSError:
+                pass
+            os.close(shard.metrics_fd)
+            for counter in COUNTERS:
+                self.finished[counter] += shard.metrics.get(counter, 0)
+            if shard.drain_deadline is None and not self.stopping:
+                print(f"Shard {shard.index} (pid {pid}) exited unexpectedly; starting a new one")
+                self.spawn(shard.index)
+
+    def _serve_metrics(self, metrics_port):
+        supervisor = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(supervisor.metrics()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._metrics_server = http.server.HTTPServer((self.host, metrics_port), MetricsHandler)
+        self._metrics_server.timeout = 0  # Handled from the supervisor's select loop, never blocking it
+
+    def run(self, metrics_port=None):
+        """Starts the shards and supervises them until stopped (SIGINT/SIGTERM)."""
+        if metrics_port is not None:
+            self._serve_metrics(metrics_port)
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "restart_requested", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "stopping", True))
+        for index in range(self.size):
+            self.spawn(index)
+        print(f"Listening on {self.host}:{self.port} with {self.size} shards (SO_REUSEPORT)"
+              + (f"; metrics on http://{self.host}:{metrics_port}/metrics" if metrics_port is not None else ""),
+              flush=True)
+        draining_all = False
+        try:
+            while self.shards or not self.stopping:
+                if self.stopping and not draining_all:
+                    for shard in list(self.shards.values()):
+                        self.drain(shard)
+                    draining_all = True
+                if self.restart_requested and not self.stopping:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                readers = {shard.metrics_fd: shard for shard in self.shards.values()}
+                sockets = [self._metrics_server.socket] if self._metrics_server is not None else []
+                try:
+                    ready, _, _ = select.select(list(readers) + sockets, [], [], 0.5)
+                except InterruptedError:
+                    ready = []
+                for item in ready:
+                    if item in readers:
+                        try:
+                            readers[item].read_metrics()
+                        except OSError:
+                            pass
+                    else:
+                        self._metrics_server.handle_request()
+                for shard in list(self.shards.values()):
+                    if shard.replaces is not None and shard.ready:
+                        self.drain(shard.replaces)
+                        shard.replaces = None
+                    if shard.drain_deadline is not None and time.monotonic() > shard.drain_deadline:
+                        os.kill(shard.pid, signal.SIGKILL)  # Reaped below like any exit
+                        shard.drain_deadline = float("inf")
+                self._reap()
+        finally:
+            for shard in self.shards.values():
+                try:
+                    os.kill(shard.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            if self._metrics_server is not None:
+                self._metrics_server.server_close()
+        print(json.dumps(self.metrics()["totals"]), flush=True)
+
+
+def run_supervisor(host, port, shards, metrics_port, store_options, admission_options, drain_timeout, local=False,
+                   watch_port=None, admin_socket=None):
+    """Loads the content once, warms it up and runs a Supervisor."""
+    if not hasattr(os, "fork"):
+        raise SystemExit("The supervisor needs os.fork (Linux or macOS). Use server.py --workers 0 instead.")
+    content = server.GameContent.local() if local else server.GameContent.load()
+    content.warm_up()
+    gc.collect()
+    gc.freeze()  # Keeps the warm heap out of later collections, so pages stay shared after fork
+    Supervisor(content, host, port, shards, store_options, admission_options, drain_timeout,
+               watch_port, admin_socket).run(metrics_port)
+
+
+# --- benchmark --------------------------------------------------------------------
+
+async def _client_sessions(port, deadline, counts):
+    """Plays short sessions back to back until the deadline, counting sessions and turns."""
+    import loadtest
+
+    while time.monotonic() < deadline:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            await loadtest.read_until(reader, b": ")
+            writer.write(b"20\n")
+            await loadtest.read_until(reader, b"> ")
+            for turn in range(BENCHMARK_TURNS):
+                writer.write(BENCHMARK_COMMANDS[turn % len(BENCHMARK_COMMANDS)].encode() + b"\n")
+                await loadtest.read_until(reader, b"> ")
+                counts["turns"] += 1
+            writer.write(b"exit\n")
+            await reader.read()  # Until the server closes the finished session
+            counts["sessions"] += 1
+        finally:
+            writer.close()
+
+
+def load_client(port, connections, seconds):
+    """Runs `connections` benchmark clients in this process; returns sessions and turns completed."""
+    counts = {"sessions": 0, "turns": 0}
+    deadline = time.monotonic() + seconds
+
+    async def run():
+        await asyncio.gather(*(_client_sessions(port, deadline, counts) for _ in range(connections)))
+
+    asyncio.run(run())
+    return counts
+
+
+def benchmark(max_shards, seconds, connections, client_processes):
+    """Measures sessions and turns per second with 1 to `max_shards` shards and prints the scaling."""
+    import loadtest
+
+    print(f"{os.cpu_count()} CPUs; {client_processes} client processes x {connections} connections, "
+          f"{BENCHMARK_TURNS} turns per session, {seconds:.0f}s per run")
+    print(f"{'shards':>6} {'sessions/s':>11} {'turns/s':>10} {'speedup':>8} {'efficiency':>11}  per shard turns")
+    base = None
+    for shards in range(1, max_shards + 1):
+        port, metrics_port = loadtest.free_port(), loadtest.free_port()
+        command = [sys.executable, "-u", os.path.abspath(__file__), "--local", "--port", str(port),
+                   "--shards", str(shards), "--metrics-port", str(metrics_port),
+                   "--max-active", "0", "--conn-rate", "0", "--ip-rate", "0"]
+        supervisor = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            while "Listening" not in supervisor.stdout.readline():
+                if supervisor.poll() is not None:
+                    raise SystemExit("The supervisor failed to start.")
+            time.sleep(0.5)  # Every shard has bound its socket
+            started = time.perf_counter()
+            clients = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--load-client", str(port),
+                                         "--connections", str(connections), "--seconds", str(seconds)],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                       for _ in range(client_processes)]
+            results = [json.loads(client.communicate()[0].splitlines()[-1]) for client in clients]
+            elapsed = time.perf_counter() - started
+            time.sleep(METRICS_INTERVAL * 1.5)  # Let every shard report its final counts
+            with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics", timeout=5) as response:
+                metrics = json.loads(response.read())
+        finally:
+            supervisor.send_signal(signal.SIGINT)
+            supervisor.communicate(timeout=DRAIN_TIMEOUT)
+        sessions = sum(result["sessions"] for result in results) / elapsed
+        turns = sum(result["turns"] for result in results) / elapsed
+        base = base or turns
+        split = "/".join(str(m["turns"]) for m in metrics["per_shard"])
+        print(f"{shards:>6} {sessions:>11.1f} {turns:>10.0f} {turns / base:>7.2f}x {turns / base / shards:>10.0%}  {split}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one game-server shard per core on one port (SO_REUSEPORT).")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT, help=f"port (default: {server.DEFAULT_PORT})")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="shard processes (default: one per core)")
+    parser.add_argument("--metrics-port", type=int, help="serve combined metrics on this port at /metrics")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help=f"seconds a draining shard may take before it is killed (default: {DRAIN_TIMEOUT})")
+    parser.add_argument("--watch-port", type=int, help="spectator port of shard 0 (shard i uses this port + i)")
+    parser.add_argument("--admin-socket", help="admin console socket (shard i uses <path>.<i>); see admin.py")
+    parser.add_argument("--local", action="store_true", help="use the bundled content and skip the network")
+    parser.add_argument("--max-hot", type=int, default=1000, help="sessions kept in memory per shard (default: 1000)")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="seconds of inactivity before a session is hibernated (default: 300)")
+    parser.add_argument("--hibernate-dir", default=server.DEFAULT_HIBERNATE_DIR,
+                        help=f"save store shared by the shards (default: {server.DEFAULT_HIBERNATE_DIR})")
+    parser.add_argument("--max-active", type=int, default=1000, help="sessions playing at once per shard (default: 1000)")
+    parser.add_argument("--conn-rate", type=float, default=5, help="commands per second per connection (default: 5)")
+    parser.add_argument("--ip-rate", type=float, default=20, help="commands per second per source IP (default: 20)")
+    parser.add_argument("--benchmark", action="store_true", help="measure scaling from 1 to --max-shards shards")
+    parser.add_argument("--max-shards", type=int, default=os.cpu_count() or 1, help="largest benchmark run (default: cores)")
+    parser.add_argument("--seconds", type=float, default=5, help="length of each benchmark run (default: 5)")
+    parser.add_argument("--connections", type=int, default=16, help="connections per client process (default: 16)")
+    parser.add_argument("--client-processes", type=int, help="benchmark client processes (default: --max-shards)")
+    parser.add_argument("--load-client", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.load_client:
+        print(json.dumps(load_client(options.load_client, options.connections, options.seconds)))
+    elif options.benchmark:
+        benchmark(options.max_shards, options.seconds, options.connections,
+                  options.client_processes or options.max_shards)
+    else:
+        store_options = {"directory": options.hibernate_dir, "max_hot": options.max_hot,
+                         "idle_timeout": options.idle_timeout}
+        admission_options = {"max_active": options.max_active, "conn_rate": options.conn_rate,
+                             "ip_rate": options.ip_rate}
+        run_supervisor(options.host, options.port, options.shards, options.metrics_port, store_options,
+                       admission_options, options.drain_timeout, options.local, options.watch_port,
+                       options.admin_socket)
@@ -0,0 +1,332 @@
+"""Full-screen terminal interface for the CN Tower game, built on prompt_toolkit.
+
+The plain game (`python main.py`) prints the whole room description again
+after every command and shows the inventory as a raw dict.  This interface
+runs the same game through HeadlessGame and splits the screen into:
+
+    story pane      what happened, a page at a time (PageUp/PageDown go back);
+                    a room's description is only added again when it changes
+    side panel      location, money, items and sweet+ mode, always visible
+    hints bar       the next step toward a good ending (hints.py), F2 hides it
+    command line    where commands are typed, with history (Up/Down)
+
+prompt_toolkit compares each new screen with the last one and only writes the
+cells that differ.  The story pane is paged rather than scrolled: a turn's text
+is written below the last one while it fits, and otherwise starts a fresh page,
+so the lines already on screen never move (scrolling would shift, and so
+rewrite, every line of the pane each turn).  A turn therefore sends its new
+story lines and whatever changed in the panel, not the whole screen.  The panel
+and hint text are rebuilt only when the game state changes, and the story keeps
+its last STORY_LINES lines, so a redraw costs the same however long the game
+has run.
+
+`--measure` plays a scripted game through the interface on a virtual terminal
+and compares the bytes written per turn with repainting the whole screen and
+with what the plain game prints.
+
+Usage:
+    python tui.py
+    python tui.py --no-hints
+    python tui.py --measure --size 120x40
+"""
+
+import argparse  # Used for the command-line options
+import asyncio  # Used for driving the interface in --measure
+import json  # Used for the save files (the same format as main.py's)
+
+from prompt_toolkit.application import Application  # Used for the full-screen application
+from prompt_toolkit.key_binding import KeyBindings  # Used for scrolling, hints and quitting
+from prompt_toolkit.layout import HSplit, Layout, VSplit, Window  # Used for the screen layout
+from prompt_toolkit.layout.controls import FormattedTextControl  # Used for the panes
+from prompt_toolkit.styles import Style  # Used for the panel labels and the hints bar
+from prompt_toolkit.widgets import Frame, TextArea  # Used for the panel border and the command line
+
+import headless
+import hints
+import main
+from server import MIN_AGE, GameContent
+
+STORY_LINES = 2000  # Story lines kept (older ones scroll away for good)
+PANEL_WIDTH = 30
+STYLE = Style.from_dict({"label": "bold", "hint": "reverse"})
+MEASURE_COMMANDS = ["inventory", "go east", "buy souvenir", "inventory", "back", "go north", "look around",
+                    "help", "go west", "buy ticket", "back", "hint"]
+
+
+class SaveFiles:
+    """Saves games to JSON files like main.py does, for HeadlessGame's save_store.
+
+    The interface runs the game with its output captured, so main.save_game()
+    can't be used directly; this writes the same files ("savegame.json",
+    "savegame_<slot>.json"), so games saved in either interface load in the other.
+    """
+
+    def put(self, owner, filename, data):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def get(self, owner, filename):
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise KeyError(filename) from None
+
+
+def describe_item(name, value):
+    """Formats one inventory entry for the side panel, e.g. "Souvenir" or "Ticket: vip"."""
+    label = name.replace("_", " ").capitalize()
+    return label if value is True else f"{label}: {value}"
+
+
+class GameScreen:
+    """The full-screen interface for one game.
+
+    Args:
+        game (HeadlessGame): The game to play (not started yet).
+        show_hints (bool, optional): Whether the hints bar starts visible. Defaults to True.
+    """
+
+    def __init__(self, game, show_hints=True):
+        self.game = game
+        self.show_hints = show_hints
+        self.lines = []  # Story lines, at most STORY_LINES
+        self.top = 0  # First story line on screen
+        self.room = None  # Room description last added to the story
+        self._page = ""
+        self._state = None  # Game state the panel and hint were built for
+        self._panel = []
+        self._hint = ""
+        self.command = TextArea(height=1, prompt="> ", multiline=False, wrap_lines=False,
+                                accept_handler=self._accept)
+        self.story_window = Window(FormattedTextControl(lambda: self._page), wrap_lines=True)
+        panel = Frame(Window(FormattedTextControl(lambda: self._panel), wrap_lines=True), title="Inventory")
+        hint_bar = Window(FormattedTextControl(self._hint_fragments), height=1, style="class:hint")
+        self.app = Application(
+            layout=Layout(HSplit([VSplit([self.story_window, HSplit([panel], width=PANEL_WIDTH)]),
+                                  hint_bar, self.command]), focused_element=self.command),
+            key_bindings=self._bindings(), style=STYLE, full_screen=True)
+        self.add(self.game.start())
+
+    # --- story ---------------------------------------------------------------
+
+    def add(self, text):
+        """Adds a turn's text to the story, leaving out the room description if it hasn't changed."""
+        room = self.game.room
+        if not self.game.awaiting_input and room and text.endswith(room):
+            if room == self.room:
+                text = text[:-len(room)]
+            self.room = room
+        new = text.rstrip("\n").split("\n") if text.strip() else []
+        if new:
+            first_new = len(self.lines)
+            self.lines.extend(new)
+            dropped = max(0, len(self.lines) - STORY_LINES)
+            del self.lines[:dropped]
+            first_new -= dropped
+            self.top = max(0, self.top - dropped)
+            if self._rows(self.top, len(self.lines)) > self._size()[1]:
+                self.top = max(first_new, self._page_before(len(self.lines)))  # A fresh page for this turn
+            self._show()
+        self._refresh_panel()
+
+    def _size(self):
+        info = self.story_window.render_info
+        if info is not None:
+            return info.window_width, info.window_height
+        size = self.app.output.get_size() if hasattr(self, "app") else None
+        if size is None:
+            return 80 - PANEL_WIDTH, 20
+        return size.columns - PANEL_WIDTH, size.rows - 2  # Less the hints bar and the command line
+
+    def _rows(self, start, end):
+        """Screen rows story lines start..end take up once wrapped."""
+        width = self._size()[0]
+        return sum(max(1, -(-len(line) // width)) for line in self.lines[start:end])
+
+    def _page_before(self, end):
+        """The first line of the page that ends just before line `end`."""
+        height = self._size()[1]
+        start = end
+        while start > 0 and self._rows(start - 1, end) <= height:
+            start -= 1
+        return start
+
+    def _show(self):
+        self._page = "\n".join(self.lines[self.top:self.top + self._size()[1]])
+
+    def _accept(self, buffer):
+        line = buffer.text
+        self.add(f"> {line}\n" + self.game.send(line))
+        if self.game.finished:
+            self.app.exit()
+        return False  # Clear the command line (its history keeps the line)
+
+    # --- panel and hints -----------------------------------------------------
+
+    def _refresh_panel(self):
+        state = (self.game.location, tuple(sorted(self.game.inventory.items(), key=str)), self.game.sweet_mode)
+        if state == self._state:
+            return  # Nothing changed, so the panel and hint stay as they were
+        self._state = state
+        inventory = self.game.inventory
+        rows = [("class:label", "Location\n"), ("", self.game.location.replace("_", " ").title() + "\n\n"),
+                ("class:label", "Money\n"), ("", f"${inventory.get('money', 0)}\n\n"), ("class:label", "Items\n")]
+        items = [describe_item(name, value) for name, value in inventory.items() if name != "money"]
+        rows += [("", f"  {item}\n") for item in items] or [("", "  (none)\n")]
+        if self.game.sweet_mode:
+            rows.append(("class:label", "\nSweet+ mode on\n"))
+        self._panel = rows
+        self._hint = hints.hint(self.game.location, inventory)
+
+    def _hint_fragments(self):
+        keys = "PgUp/PgDn scroll  F2 hints  Ctrl+D quit"
+        if not self.show_hints:
+            return [("", f" {keys} ")]
+        return [("", f" {self._hint}  |  {keys} ")]
+
+    # --- keys ------------------------------------------------------------------
+
+    def _bindings(self):
+        bindings = KeyBindings()
+
+        @bindings.add("pageup")
+        def _(event):
+            self.top = self._page_before(self.top)
+            self._show()
+
+        @bindings.add("pagedown")
+        def _(event):
+            height = self._size()[1]
+            end = self.top
+            while end < len(self.lines) and self._rows(self.top, end + 1) <= height:
+                end += 1
+            self.top = min(end, self._page_before(len(self.lines)))
+            self._show()
+
+        @bindings.add("f2")
+        def _(event):
+            self.show_hints = not self.show_hints
+
+        @bindings.add("c-c")
+        @bindings.add("c-d")
+        def _(event):
+            event.app.exit()
+
+        return bindings
+
+    def run(self):
+        self.app.run()
+
+
+def ask_age(country):
+    """Checks the player's age like main() does, before the screen is taken over.
+
+    Returns:
+        bool: True if the player may play.
+    """
+    age = main.load_age()
+    if age is not None:
+        return age >= MIN_AGE
+    while True:
+        try:
+            age = int(input(f"Enter your age (in {country or 'Unknown'}): "))
+        except ValueError:
+            print("Invalid input. Please enter a number.")
+            continue
+        except EOFError:
+            return False
+        if age < MIN_AGE:
+            print(f"Sorry, you must be {MIN_AGE} or older to play this game.")
+            return False
+        main.save_age(age)
+        return True
+
+
+def measure(commands=MEASURE_COMMANDS, columns=80, rows=24):
+    """Plays commands through the interface on a virtual terminal and counts the bytes each turn writes.
+
+    Args:
+        commands (list, optional): The commands to play. Defaults to MEASURE_COMMANDS.
+        columns (int, optional): Terminal width. Defaults to 80.
+        rows (int, optional): Terminal height. Defaults to 24.
+
+    Returns:
+        list: (command, bytes the interface wrote, bytes a full repaint writes, bytes the plain game prints)
+            per turn.
+    """
+    from prompt_toolkit.application import create_app_session
+    from prompt_toolkit.data_structures import Size
+    from prompt_toolkit.input import create_pipe_input
+    from prompt_toolkit.output.vt100 import Vt100_Output
+
+    class Terminal:
+        encoding = "utf-8"
+
+        def __init__(self):
+            self.written = 0
+
+        def write(self, text):
+            self.written += len(text.encode("utf-8"))
+
+        def flush(self):
+            pass
+
+        def isatty(self):
+            return True
+
+        def fileno(self):
+            raise OSError("virtual terminal")
+
+    terminal = Terminal()
+    content = GameContent.local()
+    plain = content.new_game()
+    plain.start()
+    results = []
+
+    async def play():
+        with create_pipe_input() as pipe:
+            output = Vt100_Output(terminal, lambda: Size(rows=rows, columns=columns), enable_cpr=False)
+            with create_app_session(input=pipe, output=output):
+                screen = GameScreen(content.new_game())
+                task = asyncio.ensure_future(screen.app.run_async())
+                await asyncio.sleep(0.2)
+                for command in commands:
+                    before = terminal.written
+                    pipe.send_text(command + "\r")
+                    await asyncio.sleep(0.2)  # Lets the turn and the redraw finish
+                    written = terminal.written - before
+                    before = terminal.written
+                    screen.app.renderer.clear()  # The same screen again, drawn from scratch
+                    screen.app.invalidate()
+                    await asyncio.sleep(0.2)
+                    printed = len(("> " + command + "\n" + plain.send(command)).encode("utf-8"))
+                    results.append((command, written, terminal.written - before, printed))
+                screen.app.exit()
+                await task
+
+    asyncio.run(play())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play the CN Tower game in a full-screen terminal interface.")
+    parser.add_argument("--no-hints", action="store_true", help="start with the hints bar hidden (F2 shows it)")
+    parser.add_argument("--measure", action="store_true",
+                        help="compare terminal output per turn with full repaints and the plain game")
+    parser.add_argument("--size", default="80x24", help="virtual terminal for --measure, COLUMNSxROWS (default: 80x24)")
+    options = parser.parse_args()
+    if options.measure:
+        columns, rows = (int(n) for n in options.size.lower().split("x"))
+        turns = measure(columns=columns, rows=rows)
+        print(f"{'bytes written':<14} {'interface':>10} {'full repaint':>13} {'plain game':>11}")
+        for command, written, full, printed in turns + [("total", *map(sum, list(zip(*turns))[1:]))]:
+            print(f"{command:<14} {written:>10} {full:>13} {printed:>11}")
+    else:
+        main.check_libraries()
+        content = GameContent.load()
+        if ask_age(content.country):
+            game = headless.HeadlessGame(dialogue_data=content.dialogue_data, art=content.art,
+                                         is_restricted=content.is_restricted, save_store=SaveFiles())
+            GameScreen(game, show_hints=not options.no_hints).run()
+            print("Thanks for playing!")